@@ -100,7 +100,12 @@ def initialize_session_state(user_id: str):
         st.session_state[knowledge_warehouses_key] = {}
         # Load all knowledge warehouses of login user
         for kw_path in get_knowledge_warehouses_paths(user_id):
-            kw = KnowledgeWarehouse.load(kw_path)
+            try:
+                kw = KnowledgeWarehouse.load(kw_path)
+            except ValueError as e:
+                # 旧形式（pickle）で保存された KnowledgeWarehouse などは、他の KnowledgeWarehouse の読み込みを妨げない
+                st.error(f"Can't load knowledge warehouse {kw_path}: {e}")
+                continue
             st.session_state[knowledge_warehouses_key][kw.kw_id] = kw
 
     # initialize selected knowledge warehouse
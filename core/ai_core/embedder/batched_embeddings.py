@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import random
+import time
+
+from typing import Awaitable, Callable, List
+
+import tiktoken
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("ai_core")
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embeddings のラッパー。入力テキストをトークン数の上限でバッチに分割し、同時実行数を制限してバッチ単位でリクエストします。
+    失敗したバッチは指数バックオフで再試行します。
+    バッチのトークン上限は、観測したレイテンシが `target_latency` に近づくように動的に調整されます。
+
+    プロパティ:
+    - embeddings (Embeddings): ラップする Embeddings。
+    - batch_tokens (int): 現在のバッチあたりのトークン上限。
+
+    引数:
+    - embeddings (Embeddings): ラップする Embeddings。
+    - batch_tokens (int): バッチあたりのトークン上限の初期値。
+    - min_batch_tokens (int): トークン上限の最小値。
+    - max_batch_tokens (int): トークン上限の最大値。
+    - max_concurrency (int): 同時に実行するバッチリクエストの最大数。
+    - max_retries (int): バッチごとの最大再試行回数。
+    - backoff (float): 再試行の待機時間の基準値（秒）。
+    - target_latency (float): 1 バッチあたりの目標レイテンシ（秒）。
+    - encoding_name (str): トークン数の見積もりに使用する tiktoken のエンコーディング名。
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_tokens: int = 8192,
+        min_batch_tokens: int = 512,
+        max_batch_tokens: int = 65536,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        target_latency: float = 2.0,
+        encoding_name: str = "cl100k_base",
+    ) -> None:
+        self.embeddings = embeddings
+        self.batch_tokens = batch_tokens
+        self.min_batch_tokens = min_batch_tokens
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.target_latency = target_latency
+        self._enc = tiktoken.get_encoding(encoding_name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results: List[List[float]] = []
+        counts = self._count_tokens(texts)
+        start = 0
+        while start < len(texts):
+            end = self._next_batch_end(counts, start)
+            results.extend(self._embed_batch(texts[start:end]))
+            start = end
+        return results
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        results: List[List[List[float]]] = []
+        counts = self._count_tokens(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = []
+
+        async def run(idx: int, batch: List[str]) -> None:
+            try:
+                results[idx] = await self._aembed_batch(batch)
+            finally:
+                semaphore.release()
+
+        start = 0
+        while start < len(texts):
+            # 空きができてからバッチを切り出すことで、直前までのレイテンシに応じたバッチサイズを使う
+            await semaphore.acquire()
+            end = self._next_batch_end(counts, start)
+            results.append([])
+            tasks.append(asyncio.create_task(run(len(results) - 1, texts[start:end])))
+            start = end
+
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+        return [vector for batch in results for vector in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._with_retries(
+            lambda: self.embeddings.embed_query(text), adapt=False
+        )
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self._awith_retries(
+            lambda: self.embeddings.aembed_query(text), adapt=False
+        )
+
+    def _count_tokens(self, texts: List[str]) -> List[int]:
+        return [len(tokens) for tokens in self._enc.encode_ordinary_batch(texts)]
+
+    def _next_batch_end(self, counts: List[int], start: int) -> int:
+        # 1 つのテキストが上限を超える場合でも、少なくとも 1 件はバッチに含める
+        end = start + 1
+        total = counts[start]
+        while end < len(counts) and total + counts[end] <= self.batch_tokens:
+            total += counts[end]
+            end += 1
+        return end
+
+    def _observe(self, latency: float, success: bool) -> None:
+        if not success:
+            self.batch_tokens = max(self.min_batch_tokens, self.batch_tokens // 2)
+        elif latency < self.target_latency / 2:
+            self.batch_tokens = min(self.max_batch_tokens, int(self.batch_tokens * 1.5))
+        elif latency > self.target_latency:
+            self.batch_tokens = max(self.min_batch_tokens, int(self.batch_tokens * 0.7))
+
+    def _delay(self, attempt: int) -> float:
+        return self.backoff * (2**attempt) * (1 + random.random())
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        return self._with_retries(lambda: self.embeddings.embed_documents(batch))
+
+    async def _aembed_batch(self, batch: List[str]) -> List[List[float]]:
+        return await self._awith_retries(
+            lambda: self.embeddings.aembed_documents(batch)
+        )
+
+    def _with_retries(self, fn: Callable[[], list], adapt: bool = True) -> list:
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                if adapt:
+                    self._observe(0.0, success=False)
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Embedding request failed ({e}), retrying")
+                time.sleep(self._delay(attempt))
+                continue
+            if adapt:
+                self._observe(time.perf_counter() - start, success=True)
+            return result
+
+    async def _awith_retries(
+        self, fn: Callable[[], Awaitable[list]], adapt: bool = True
+    ) -> list:
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                result = await fn()
+            except Exception as e:
+                if adapt:
+                    self._observe(0.0, success=False)
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Embedding request failed ({e}), retrying")
+                await asyncio.sleep(self._delay(attempt))
+                continue
+            if adapt:
+                self._observe(time.perf_counter() - start, success=True)
+            return result
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from collections import OrderedDict
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+from pydantic import BaseModel
+
+logger = logging.getLogger("ai_core")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """キャッシュキー用にクエリを正規化します（NFKC 正規化と空白の統一）。"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class QueryEmbeddingCacheMetrics(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+    size: int = 0
+    hit_rate: float = 0.0
+    avg_miss_latency: float = 0.0
+    saved_seconds: float = 0.0
+
+
+class QueryEmbeddingCache:
+    """
+    クエリの embedding をプロセス内に保持する LRU + TTL キャッシュ。
+    キーは (モデル, 正規化されたクエリ) の組で、同じモデルを使うすべての KnowledgeWarehouse で共有されます。
+
+    引数:
+    - max_size (int): 保持するエントリの最大数。
+    - ttl (float): エントリの有効期間（秒）。
+    """
+
+    _default: "QueryEmbeddingCache | None" = None
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, str], tuple[float, List[float]]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self._metrics = QueryEmbeddingCacheMetrics()
+        self._miss_seconds = 0.0
+
+    @classmethod
+    def default(cls) -> "QueryEmbeddingCache":
+        if cls._default is None:
+            cls._default = cls(
+                max_size=int(os.getenv("AI_QUERY_EMBEDDING_CACHE_SIZE", 10000)),
+                ttl=float(os.getenv("AI_QUERY_EMBEDDING_CACHE_TTL", 3600)),
+            )
+        return cls._default
+
+    def get(self, key: tuple[str, str]) -> List[float] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, embedding = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return embedding
+
+    def put(self, key: tuple[str, str], embedding: List[float]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._metrics.evictions += 1
+
+    def record_hit(self, coalesced: bool = False) -> None:
+        with self._lock:
+            self._metrics.hits += 1
+            if coalesced:
+                self._metrics.coalesced += 1
+
+    def record_miss(self, latency: float) -> None:
+        with self._lock:
+            self._metrics.misses += 1
+            self._miss_seconds += latency
+
+    def metrics(self) -> QueryEmbeddingCacheMetrics:
+        """
+        キャッシュのヒット率と、ヒットによって節約された推定時間（ヒット数 × ミス時の平均レイテンシ）を返します。
+        """
+        with self._lock:
+            m = self._metrics.model_copy()
+            m.size = len(self._entries)
+            total = m.hits + m.misses
+            m.hit_rate = m.hits / total if total else 0.0
+            m.avg_miss_latency = self._miss_seconds / m.misses if m.misses else 0.0
+            m.saved_seconds = m.hits * m.avg_miss_latency
+            return m
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    クエリの embedding を QueryEmbeddingCache にキャッシュする Embeddings のラッパー。
+    同じクエリに対する同時リクエストは、実行中の 1 回の embedding 呼び出しにまとめられます。
+    ドキュメントの embedding はキャッシュせずにそのまま委譲します。
+
+    引数:
+    - embeddings (Embeddings): ラップする Embeddings。
+    - model_key (str): キャッシュキーに使用するモデルの識別子。
+    - cache (QueryEmbeddingCache | None): 使用するキャッシュ。None の場合はプロセス共有のキャッシュを使用します。
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_key: str,
+        cache: QueryEmbeddingCache | None = None,
+    ) -> None:
+        self.embeddings = embeddings
+        self.model_key = model_key
+        self.cache = cache or QueryEmbeddingCache.default()
+        self._in_flight: dict[tuple[str, str], asyncio.Task] = {}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = (self.model_key, normalize_query(text))
+        embedding = self.cache.get(key)
+        if embedding is not None:
+            self.cache.record_hit()
+            return embedding
+
+        start = time.perf_counter()
+        embedding = self.embeddings.embed_query(text)
+        self.cache.record_miss(time.perf_counter() - start)
+        self.cache.put(key, embedding)
+        return embedding
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = (self.model_key, normalize_query(text))
+        embedding = self.cache.get(key)
+        if embedding is not None:
+            self.cache.record_hit()
+            return embedding
+
+        task = self._in_flight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            # 同じクエリの embedding が実行中の場合は、その結果を待つ
+            embedding = await asyncio.shield(task)
+            self.cache.record_hit(coalesced=True)
+            return embedding
+
+        # embedding は独立したタスクで実行し、呼び出し元（要求したリクエストを含む）がキャンセルされても
+        # 同じクエリを待っている他のリクエストには影響しないようにする
+        task = asyncio.ensure_future(self._aembed_and_cache(key, text))
+        # 待機しているリクエストがない場合に例外が未回収として警告されないようにする
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def _aembed_and_cache(self, key: tuple[str, str], text: str) -> List[float]:
+        start = time.perf_counter()
+        try:
+            embedding = await self.embeddings.aembed_query(text)
+        finally:
+            if self._in_flight.get(key) is asyncio.current_task():
+                del self._in_flight[key]
+
+        self.cache.record_miss(time.perf_counter() - start)
+        self.cache.put(key, embedding)
+        return embedding
@@ -1,12 +1,18 @@
 import logging
 
 from abc import ABC, abstractmethod
-from typing import Self
+from typing import Any, Self
+
+import numpy as np
 
 from langchain_core.embeddings import Embeddings
 
+from core.ai_core.embedder.cached_embeddings import CachedQueryEmbeddings
 from core.ai_core.embedder.embedder_config import EmbedderType
-from core.ai_core.knowledge_warehouse.serialization import EmbedderConfig
+from core.ai_core.knowledge_warehouse.serialization import (
+    EmbedderConfig,
+    EmbedderFingerprint,
+)
 from core.ai_core.llm.llm_config import LLMName
 
 logger = logging.getLogger("ai_core")
@@ -15,7 +21,9 @@ logger = logging.getLogger("ai_core")
 class EmbedderBase(ABC):
     supported_embedder: list[EmbedderType]
     embedder: Embeddings | None
-    llm_name: LLMName | None
+    llm_name: LLMName | str | None
+    config: dict[str, Any] | None = None
+    _fingerprint: EmbedderFingerprint | None = None
 
     def __init__(self, embedder_type: EmbedderType) -> None:
         self.embedder_type = embedder_type
@@ -27,7 +35,8 @@ class EmbedderBase(ABC):
     def build(self, llm_name: LLMName | None) -> Self:
         logger.debug(f"Building embedder {self.embedder_type}")
         self.llm_name = llm_name
-        self.embedder = self.build_impl(llm_name)
+        self._fingerprint = None
+        self.embedder = self._with_query_cache(self.build_impl(llm_name))
         return self
 
     @abstractmethod
@@ -46,9 +55,49 @@ class EmbedderBase(ABC):
     def load(self, config: EmbedderConfig) -> Self:
         logger.debug(f"Loading embedder {self.embedder_type}")
         self.llm_name = config.llm_name
-        self.embedder = self.load_impl(self.llm_name)
+        self.config = config.config
+        self._fingerprint = None
+        self.embedder = self._with_query_cache(self.load_impl(self.llm_name))
         return self
 
     @abstractmethod
     def load_impl(self, llm_name: LLMName) -> Embeddings:
         raise NotImplementedError
+
+    def _with_query_cache(self, embedder: Embeddings) -> Embeddings:
+        # 検索時のクエリ embedding をモデル単位でキャッシュする
+        if isinstance(embedder, CachedQueryEmbeddings):
+            return embedder
+        return CachedQueryEmbeddings(
+            embedder, model_key=f"{self.embedder_type.value}:{self.llm_name}"
+        )
+
+    def unwrapped_embedder(self) -> Embeddings | None:
+        """キャッシュやバッチ処理のラッパーを取り除いた、実際の Embeddings を返します。"""
+        embedder = self.embedder
+        while isinstance(getattr(embedder, "embeddings", None), Embeddings):
+            embedder = embedder.embeddings
+        return embedder
+
+    def fingerprint(self) -> EmbedderFingerprint:
+        """
+        埋め込みモデルのフィンガープリント（種類、モデル名、次元数、正規化の有無）を返します。
+        次元数と正規化の有無は、短いテキストを 1 回 embedding して確認します（結果はキャッシュされます）。
+        """
+        self.check_build()
+        if self._fingerprint is None:
+            vector = np.asarray(
+                self.embedder.embed_documents(["embedder fingerprint"])[0],
+                dtype=np.float32,
+            )
+            self._fingerprint = EmbedderFingerprint(
+                embedder_type=self.embedder_type,
+                model=str(
+                    self.llm_name.value
+                    if isinstance(self.llm_name, LLMName)
+                    else self.llm_name
+                ),
+                dimension=len(vector),
+                normalized=bool(abs(float(np.linalg.norm(vector)) - 1.0) < 1e-3),
+            )
+        return self._fingerprint
@@ -13,11 +13,15 @@ class EmbedderBuilder:
 
     @classmethod
     def build_default_embedder(cls) -> EmbedderBase:
-        return cls.build_embedder(default_embedder_type(), DEFAULT_LLM_NAME)
+        embedder_type = default_embedder_type()
+        if embedder_type == EmbedderType.OllamaEmbeddings:
+            return cls.build_embedder(embedder_type, DEFAULT_LLM_NAME)
+        # Ollama 以外はそれぞれのデフォルトモデルを使用する
+        return cls.build_embedder(embedder_type, None)
 
     @classmethod
     def build_embedder(
-        cls, embedder_type: EmbedderType, llm_name: LLMName
+        cls, embedder_type: EmbedderType, llm_name: LLMName | str | None
     ) -> EmbedderBase:
         embedder_cls = get_embedder_class(embedder_type)
         return embedder_cls().build(llm_name)
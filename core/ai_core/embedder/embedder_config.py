@@ -1,9 +1,15 @@
+import os
+
 from enum import Enum
 
 
 class EmbedderType(str, Enum):
     OllamaEmbeddings = "OllamaEmbeddings"
+    OnnxEmbeddings = "OnnxEmbeddings"
 
 
 def default_embedder_type() -> EmbedderType:
-    return EmbedderType.OllamaEmbeddings
+    # Ollama を使用できない環境では AI_EMBEDDER_TYPE=OnnxEmbeddings を指定する
+    return EmbedderType(
+        os.getenv("AI_EMBEDDER_TYPE", EmbedderType.OllamaEmbeddings.value)
+    )
@@ -17,6 +17,7 @@ EmbedderMapping: TypeAlias = dict[EmbedderType | str, str]
 
 known_embedders: EmbedderMapping = {
     EmbedderType.OllamaEmbeddings: "core.ai_core.embedder.impl.ollama_embeddings.OllamaEmbedder",
+    EmbedderType.OnnxEmbeddings: "core.ai_core.embedder.impl.onnx_embeddings.OnnxEmbedder",
 }
 
 
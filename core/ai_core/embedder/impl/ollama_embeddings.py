@@ -1,8 +1,10 @@
 import logging
+import os
 
 from langchain_core.embeddings import Embeddings
 from langchain_ollama import OllamaEmbeddings
 
+from core.ai_core.embedder.batched_embeddings import BatchedEmbeddings
 from core.ai_core.embedder.embedder_base import EmbedderBase
 from core.ai_core.embedder.embedder_builder import EmbedderType
 from core.ai_core.knowledge_warehouse.serialization import EmbedderConfig
@@ -19,14 +21,18 @@ class OllamaEmbedder(EmbedderBase):
         logger.debug(
             f"Loaded {EmbedderType.OllamaEmbeddings}.{llm_name} as default Embedder LLM for knowledge warehouse"
         )
-        embedder = OllamaEmbeddings(model=llm_name)
+        # リクエストをトークン数で分割したバッチ単位で、同時実行数を制限して送信する
+        embedder = BatchedEmbeddings(
+            OllamaEmbeddings(model=llm_name),
+            batch_tokens=int(os.getenv("AI_EMBED_BATCH_TOKENS", 8192)),
+            max_concurrency=int(os.getenv("AI_EMBED_MAX_CONCURRENCY", 4)),
+        )
         return embedder
 
     def save_impl(self) -> EmbedderConfig:
-        if isinstance(self.embedder, OllamaEmbeddings):
-            return EmbedderConfig(
-                llm_name=self.llm_name, config=self.embedder.model_dump()
-            )
+        embedder = self.unwrapped_embedder()
+        if isinstance(embedder, OllamaEmbeddings):
+            return EmbedderConfig(llm_name=self.llm_name, config=embedder.model_dump())
         else:
             raise Exception(f"Can't serialize other embedder {self.embedder} for now")
 
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+
+from core.ai_core.embedder.embedder_base import EmbedderBase
+from core.ai_core.embedder.embedder_config import EmbedderType
+from core.ai_core.knowledge_warehouse.serialization import EmbedderConfig
+from core.ai_core.llm.llm_config import LLMName
+from core.ai_core.utils.onnx_utils import (
+    create_session,
+    encode_inputs,
+    find_model_file,
+    load_tokenizer,
+    resolve_model_dir,
+)
+
+logger = logging.getLogger("ai_core")
+
+DEFAULT_ONNX_EMBEDDING_MODEL = "intfloat/multilingual-e5-small"
+
+
+class _OnnxModel:
+    # 読み込んだモデルとスレッドプールはプロセス内で共有する
+    # （KnowledgeWarehouse ごとに作成すると、読み込んだ数だけ CPU を奪い合うため）
+    _cache: Dict[Tuple[str, bool, int, int], "_OnnxModel"] = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, model_name: str, quantize: bool, max_length: int, num_workers: int):
+        model_dir = resolve_model_dir(model_name)
+        # CPU コアをワーカー間で分け合う
+        threads_per_session = max(1, (os.cpu_count() or 1) // num_workers)
+        self.session = create_session(
+            find_model_file(model_dir, quantize), threads_per_session
+        )
+        self.tokenizer = load_tokenizer(model_dir, max_length)
+        self.executor = ThreadPoolExecutor(
+            max_workers=num_workers, thread_name_prefix="onnx-embed"
+        )
+
+    @classmethod
+    def get(
+        cls, model_name: str, quantize: bool, max_length: int, num_workers: int
+    ) -> "_OnnxModel":
+        key = (model_name, quantize, max_length, num_workers)
+        with cls._cache_lock:
+            if key not in cls._cache:
+                logger.debug(f"Loading ONNX embedding model {model_name}")
+                cls._cache[key] = cls(model_name, quantize, max_length, num_workers)
+            return cls._cache[key]
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    ONNX Runtime で文埋め込みモデルをプロセス内の CPU 上で実行する Embeddings。
+    テキストは長さ順に並べ替えてバッチ化され（パディングを最小化するため）、スレッドプールで並列に推論されます。
+    同じモデル・設定の ONNX セッション、トークナイザー、スレッドプールはプロセス内で共有されます。
+
+    引数:
+    - model_name (str): モデルのディレクトリパスまたは Hugging Face Hub のリポジトリ ID。
+    - quantize (bool): int8 量子化したモデルを使用するかどうか。
+    - max_length (int): 1 テキストあたりの最大トークン数。
+    - batch_size (int): 1 回の推論で処理するテキスト数。
+    - num_workers (int): 推論を行うスレッド数。
+    - normalize (bool): 埋め込みを L2 正規化するかどうか。
+    - query_prefix (str): クエリの先頭に付与する文字列（e5 系モデルの "query: " など）。
+    - document_prefix (str): ドキュメントの先頭に付与する文字列（e5 系モデルの "passage: " など）。
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_ONNX_EMBEDDING_MODEL,
+        quantize: bool = True,
+        max_length: int = 512,
+        batch_size: int = 32,
+        num_workers: int = 2,
+        normalize: bool = True,
+        query_prefix: str = "",
+        document_prefix: str = "",
+    ) -> None:
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.normalize = normalize
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+
+        model = _OnnxModel.get(model_name, quantize, max_length, num_workers)
+        self._session = model.session
+        self._tokenizer = model.tokenizer
+        self._executor = model.executor
+
+    def model_dump(self) -> dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "quantize": self.quantize,
+            "max_length": self.max_length,
+            "batch_size": self.batch_size,
+            "num_workers": self.num_workers,
+            "normalize": self.normalize,
+            "query_prefix": self.query_prefix,
+            "document_prefix": self.document_prefix,
+        }
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [self.document_prefix + t for t in texts]
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [
+            order[i : i + self.batch_size] for i in range(0, len(order), self.batch_size)
+        ]
+
+        vectors: list[np.ndarray | None] = [None] * len(texts)
+        results = self._executor.map(
+            lambda batch: self._embed([texts[i] for i in batch]), batches
+        )
+        for batch, embeddings in zip(batches, results, strict=False):
+            for i, embedding in zip(batch, embeddings, strict=False):
+                vectors[i] = embedding
+        return [v.tolist() for v in vectors]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([self.query_prefix + text])[0].tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        embedding = await loop.run_in_executor(
+            self._executor, self._embed, [self.query_prefix + text]
+        )
+        return embedding[0].tolist()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        inputs = encode_inputs(self._tokenizer, self._session, texts)
+        output = self._session.run(None, inputs)[0]
+
+        if output.ndim == 3:
+            # トークンごとの出力の場合は attention mask で平均プーリングする
+            mask = inputs["attention_mask"][..., None].astype(output.dtype)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.normalize:
+            output = output / np.clip(
+                np.linalg.norm(output, axis=1, keepdims=True), 1e-12, None
+            )
+        return output.astype(np.float32)
+
+
+class OnnxEmbedder(EmbedderBase):
+    def __init__(self) -> None:
+        super().__init__(EmbedderType.OnnxEmbeddings)
+
+    def build_impl(
+        self, llm_name: LLMName | str | None, **kwargs: Any
+    ) -> Embeddings:
+        model_name = llm_name or DEFAULT_ONNX_EMBEDDING_MODEL
+        self.llm_name = model_name
+        if "e5" in str(model_name).lower():
+            # e5 系のモデルはクエリとドキュメントを接頭辞で区別して学習されている
+            kwargs.setdefault("query_prefix", "query: ")
+            kwargs.setdefault("document_prefix", "passage: ")
+        logger.debug(
+            f"Loaded {EmbedderType.OnnxEmbeddings}.{model_name} as Embedder for knowledge warehouse"
+        )
+        return OnnxEmbeddings(model_name=model_name, **kwargs)
+
+    def save_impl(self) -> EmbedderConfig:
+        embedder = self.unwrapped_embedder()
+        if isinstance(embedder, OnnxEmbeddings):
+            return EmbedderConfig(
+                embedder_type=EmbedderType.OnnxEmbeddings,
+                llm_name=self.llm_name,
+                config=embedder.model_dump(),
+            )
+        else:
+            raise Exception(f"Can't serialize other embedder {self.embedder} for now")
+
+    def load_impl(self, llm_name: LLMName | str) -> Embeddings:
+        kwargs = dict(self.config or {})
+        kwargs.pop("model_name", None)
+        return self.build_impl(llm_name, **kwargs)
@@ -134,10 +134,12 @@ class AIFile:
 
     @property
     def metadata(self) -> dict[str, Any]:
+        # UUID・Path は文字列にする（ドキュメントストアへの保存後も同じ型で比較・フィルタできるように）
         return {
-            "aifile_id": self.file_id,
-            "aifile_path": self.path,
+            "aifile_id": str(self.file_id),
+            "aifile_path": str(self.path),
             "original_file_name": self.original_filename,
+            "file_extension": getattr(self.file_extension, "value", self.file_extension),
             "file_sha1": self.file_sha1,
             "file_size": self.file_size,
             **self.additional_metadata,
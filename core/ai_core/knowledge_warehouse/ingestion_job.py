@@ -0,0 +1,86 @@
+import asyncio
+import logging
+
+from collections import OrderedDict
+from typing import AsyncGenerator, Any, TypeAlias, Union
+
+from core.ai_core.knowledge_warehouse.models.ingestion_status import (
+    IngestionStatus,
+    Status,
+)
+from core.ai_core.knowledge_warehouse.models.migration_status import MigrationStatus
+
+JobStatus: TypeAlias = Union[IngestionStatus, MigrationStatus]
+
+logger = logging.getLogger("ai_core")
+
+
+class IngestionJob:
+    """
+    バックグラウンドで実行される取り込みジョブ（ファイルの追加、embedding モデルの移行）。
+    ステータスのストリームを消費し、最新のステータスを保持します。
+
+    プロパティ:
+    - job_id (str): ジョブの識別子。
+    - status (JobStatus): 最新のステータス。
+    - task (asyncio.Task | None): ジョブを実行しているタスク。
+    """
+
+    def __init__(self, status: JobStatus):
+        self.job_id = status.job_id
+        self.status = status
+        self.task: asyncio.Task | None = None
+
+    async def run(self, stream: AsyncGenerator[JobStatus, Any]) -> JobStatus:
+        try:
+            async for status in stream:
+                self.status = status
+        except Exception as e:
+            logger.error(f"Ingestion job {self.job_id} failed: {e}")
+            self.status.status = Status.ERROR
+            self.status.error = self.status.error or str(e)
+        return self.status
+
+    @property
+    def done(self) -> bool:
+        return self.status.status in (Status.COMPLETED, Status.ERROR)
+
+
+class IngestionJobRegistry:
+    """
+    プロセス内の取り込みジョブをジョブ ID で管理するレジストリ。
+    UI はコネクションを保持せずに `get_status` でステータスをポーリングできます。
+    終了したジョブは `max_finished_jobs` 件まで保持されます。
+    """
+
+    _jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+    max_finished_jobs: int = 100
+
+    @classmethod
+    def start(
+        cls, status: JobStatus, stream: AsyncGenerator[JobStatus, Any]
+    ) -> IngestionJob:
+        """
+        ステータスのストリームを消費するタスクを作成し、ジョブとして登録します。
+        実行中のイベントループ内で呼び出す必要があります。
+        """
+        job = IngestionJob(status)
+        job.task = asyncio.create_task(job.run(stream))
+        cls._jobs[job.job_id] = job
+        cls._evict()
+        return job
+
+    @classmethod
+    def get(cls, job_id: str) -> IngestionJob | None:
+        return cls._jobs.get(job_id)
+
+    @classmethod
+    def get_status(cls, job_id: str) -> JobStatus | None:
+        job = cls._jobs.get(job_id)
+        return job.status if job else None
+
+    @classmethod
+    def _evict(cls) -> None:
+        finished = [job_id for job_id, job in cls._jobs.items() if job.done]
+        for job_id in finished[: max(0, len(finished) - cls.max_finished_jobs)]:
+            del cls._jobs[job_id]
@@ -1,11 +1,13 @@
 import asyncio
+import hashlib
 import logging
 import os
 import shutil
+import stopwatch
 
 from pathlib import Path
 from pprint import PrettyPrinter
-from typing import Any, AsyncGenerator, Callable, Dict, Self, Type, Union
+from typing import Any, AsyncGenerator, Callable, Dict, Self, Sequence, Type, Union
 from rich.console import Console
 from rich.panel import Panel
 from rich.tree import Tree
@@ -14,15 +16,33 @@ from dataclasses import dataclass
 
 from langchain_core.documents import Document
 from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.vectorstores import VectorStore
 
 from core.ai_core.embedder.embedder_base import EmbedderBase
 from core.ai_core.files import AIFile
 from core.ai_core.files.file import load_aifile
-from core.ai_core.knowledge_warehouse.serialization import KWSerialized
+from core.ai_core.knowledge_warehouse.ingestion_job import (
+    IngestionJobRegistry,
+    JobStatus,
+)
+from core.ai_core.knowledge_warehouse.models.ingestion_status import (
+    FileIngestionStatus,
+    FileStage,
+    IngestionStatus,
+    Status,
+)
+from core.ai_core.knowledge_warehouse.models.migration_status import MigrationStatus
+from core.ai_core.knowledge_warehouse.serialization import (
+    EmbedderFingerprint,
+    KWSerialized,
+)
 from core.ai_core.llm.llm_endpoint import LLMEndpoint, LLMInfo, default_rag_llm
+from core.ai_core.processor.parsed_document_cache import ParsedDocumentCache
 from core.ai_core.processor.processor_registry import get_processor_class
+from core.ai_core.processor.splitter import SplitterConfig
 from core.ai_core.rag.config.ai_rag_config import RetrievalConfig
 from core.ai_core.rag.ai_rag_langgraph import AiQARAGLangGraph
+from core.ai_core.rag.answer_cache import SemanticAnswerCache
 from core.ai_core.rag.entities.chat import ChatHistoryInfo, ChatHistory
 from core.ai_core.rag.entities.models import (
     SearchResult,
@@ -30,11 +50,15 @@ from core.ai_core.rag.entities.models import (
     ParsedRAGChunkResponse,
     ParsedRAGResponse,
 )
+from core.ai_core.rag.question_classifier import depends_on_history
 from core.ai_core.storage.storage_base import StorageBase, StorageInfo
 from core.ai_core.storage.storage_builder import StorageBuilder
 from core.ai_core.embedder.embedder_builder import EmbedderBuilder
+from core.ai_core.vectordb.federated_store import FederatedVectorStore
+from core.ai_core.vectordb.impl.faiss_store import FaissStore
 from core.ai_core.vectordb.vectordb_base import VectordbBase
 from core.ai_core.vectordb.vectordb_builder import VectordbBuilder
+from core.ai_core.vectordb.vectordb_config import VectordbType, VectorIndexConfig
 
 logger = logging.getLogger("ai_core")
 
@@ -124,6 +148,7 @@ class KnowledgeWarehouse:
     - llm (LLMEndpoint): 回答を生成するために使用する言語モデル。
     - vector_db (VectordbBase): 処理されたファイルを保存する vector store。
     - embedder (EmbedderBase): 処理されたファイルのインデックスを作成するために使用する Embeddings。
+    - index_config (VectorIndexConfig | None): vector db を作成する際のインデックス設定（次元削減など）。
     """
 
     def __init__(
@@ -136,6 +161,7 @@ class KnowledgeWarehouse:
         embedder: EmbedderBase | None = None,
         storage: StorageBase | None = None,
         kw_path: str | Path | None = None,
+        index_config: VectorIndexConfig | None = None,
     ):
         self.kw_id = kw_id
         self.name = name
@@ -149,10 +175,30 @@ class KnowledgeWarehouse:
         self.llm = llm
         self.vector_db = vector_db
         self.embedder = embedder
+        # vector db を新規に作成する際のインデックス設定（次元削減など）
+        self.index_config = (
+            vector_db.index_config if vector_db is not None else index_config
+        )
 
         # Path to the folder where the KW is saved
         self.kw_path = kw_path
 
+        # 質問ごとに作り直さないように、検索設定で指定された LLM と federated search の vector store を保持する
+        # （コンパイル済みのグラフは LLM 設定と vector store ごとに再利用される）
+        self._llm_endpoints: Dict[str, LLMEndpoint] = {}
+        self._federated_stores: Dict[tuple, FederatedVectorStore] = {}
+        # 現在の vector store（置き換えを検出するために保持する）
+        self._vector_store = vector_db.vector_db if vector_db is not None else None
+
+        # インデックスのバージョン（回答キャッシュのキーに使用する）。保存されたバージョンは同じ保存から読み込んだ
+        # インスタンス間で共有され、保存後の変更（ファイルの追加・削除など）はインスタンスごとのバージョンで区別する
+        self._index_version: str | None = None
+        self._unsaved_index_version: str | None = None
+        # 保存時に記録する embedder のフィンガープリント（None の場合は保存時に 1 回 embedding して求める）
+        self._embedder_fingerprint: EmbedderFingerprint | None = None
+        # チャンクの追加・削除と、vector db の置き換え（再処理・embedder の移行）を直列化する
+        self._write_lock = asyncio.Lock()
+
     def __repr__(self) -> str:
         pp = PrettyPrinter(width=80, depth=None, compact=False, sort_dicts=False)
         return pp.pformat(self.info())
@@ -166,11 +212,22 @@ class KnowledgeWarehouse:
         console.print(panel)
 
     @classmethod
-    def load(cls, folder_path: str | Path) -> Self:
+    def load(
+        cls,
+        folder_path: str | Path,
+        verify_embedder: bool = True,
+        embedder: EmbedderBase | None = None,
+        allow_dangerous_deserialization: bool | None = None,
+    ) -> Self:
         """
         フォルダパスから KnowledgeWarehouse を読み込む。
         引数:
         - folder_path (str | Path): KnowledgeWarehouse を含むフォルダへのパス。
+        - verify_embedder (bool): 保存時のフィンガープリント（モデル・次元数）が vector db のインデックスと一致するか確認するかどうか。
+        - embedder (EmbedderBase | None): 保存時の設定とは別の embedder を使用する場合に指定します。
+          指定した場合は 1 回 embedding して、保存時のフィンガープリントと一致するか確認します。
+        - allow_dangerous_deserialization (bool | None): 旧形式（pickle）のドキュメントストアの読み込みを許可するかどうか。
+          None の場合は環境変数 `AI_ALLOW_LEGACY_PICKLE` に従います。変換には migrate_legacy_docstore を使用してください。
 
         戻り値:
         - KnowledgeWarehouse: フォルダパスから読み込まれた KnowledgeWarehouse。
@@ -194,14 +251,24 @@ class KnowledgeWarehouse:
         storage = StorageBuilder.load_storage(kw_serialized.storage_config)
 
         # Load Embedder
-        embedder = EmbedderBuilder.load_embedder(kw_serialized.embedding_config)
+        fingerprint = kw_serialized.embedder_fingerprint
+        if embedder is None:
+            embedder = EmbedderBuilder.load_embedder(kw_serialized.embedding_config)
+        else:
+            if verify_embedder and fingerprint is not None:
+                cls._verify_embedder(embedder, fingerprint)
+            fingerprint = None
 
         # Load vector db
         vector_db = VectordbBuilder.load_vectordb(
-            kw_serialized.vectordb_config, embedder.embedder
+            kw_serialized.vectordb_config,
+            embedder.embedder,
+            allow_dangerous_deserialization=allow_dangerous_deserialization,
         )
+        if verify_embedder and kw_serialized.embedder_fingerprint is not None:
+            cls._verify_index(vector_db, kw_serialized.embedder_fingerprint)
 
-        return cls(
+        kw = cls(
             kw_id=kw_serialized.kw_id,
             name=kw_serialized.kw_name,
             embedder=embedder,
@@ -210,6 +277,47 @@ class KnowledgeWarehouse:
             vector_db=vector_db,
             kw_path=folder_path,
         )
+        # 保存時の設定から作成した embedder は、保存時のフィンガープリントをそのまま使用する
+        kw._embedder_fingerprint = fingerprint
+        kw._index_version = kw_serialized.index_version
+        return kw
+
+    @classmethod
+    async def amigrate_legacy_docstore(cls, folder_path: str | Path) -> bool:
+        """
+        旧形式（pickle）のドキュメントストアで保存された KnowledgeWarehouse を読み込み、SQLite のドキュメントストアで同じフォルダに保存し直します。
+        pickle の読み込みは任意のコードを実行できるため、信頼できるフォルダに対してのみ実行してください。
+        変換後は pickle を読み込まずに load できます（元の index.pkl は保存時に削除されます）。
+
+        引数:
+        - folder_path (str | Path): KnowledgeWarehouse を含むフォルダへのパス（kw_<ID>）。
+
+        戻り値:
+        - bool: 変換した場合は True。すでに SQLite のドキュメントストアで保存されている場合は False。
+        """
+        folder_path = Path(folder_path)
+        with open(folder_path / "config.json", "r") as f:
+            kw_serialized = KWSerialized.model_validate_json(f.read())
+        vectordb_path = kw_serialized.vectordb_config.vectordb_folder_path
+        if not FaissStore.has_legacy_docstore(vectordb_path):
+            return False
+        # save は <親フォルダ>/kw_<ID> に保存するため、同じフォルダに上書きされることを確認する
+        if folder_path.name != f"kw_{kw_serialized.kw_id}":
+            raise ValueError(
+                f"{folder_path} is not named kw_{kw_serialized.kw_id}, can't save it in place"
+            )
+
+        logger.warning(f"Converting the pickled docstore in {vectordb_path} to SQLite")
+        kw = await asyncio.to_thread(
+            cls.load, folder_path, allow_dangerous_deserialization=True
+        )
+        await kw.save(folder_path.parent)
+        logger.info(f"Converted knowledge warehouse {kw.kw_id} to a SQLite docstore")
+        return True
+
+    @classmethod
+    def migrate_legacy_docstore(cls, folder_path: str | Path) -> bool:
+        return asyncio.run(cls.amigrate_legacy_docstore(folder_path))
 
     async def save(self, folder_path: str | Path):
         """
@@ -239,10 +347,18 @@ class KnowledgeWarehouse:
 
         # Save serialized embedder
         embedder_config = self.embedder.save()
+        if self._embedder_fingerprint is None:
+            self._embedder_fingerprint = await asyncio.to_thread(self.embedder.fingerprint)
+        embedder_fingerprint = self._embedder_fingerprint
 
         # Save serialized storage
         storage_config = StorageBuilder.save_storage(self.storage)
 
+        # 変更を保存したインデックスは、変更時のバージョンを保存されたバージョンとする
+        if self._unsaved_index_version is not None:
+            self._index_version = self._unsaved_index_version
+            self._unsaved_index_version = None
+
         kw_serialized = KWSerialized(
             kw_id=self.kw_id,
             kw_name=self.name,
@@ -250,16 +366,63 @@ class KnowledgeWarehouse:
             llm_config=self.llm.get_config(),
             vectordb_config=vectordb_config,
             embedding_config=embedder_config,
+            embedder_fingerprint=embedder_fingerprint,
             storage_config=storage_config,
+            index_version=self._index_version,
         )
 
         with open(os.path.join(kw_path, "config.json"), "w") as f:
             f.write(kw_serialized.model_dump_json())
         return kw_path
 
+    @staticmethod
+    def _verify_embedder(
+        embedder: EmbedderBase, expected: EmbedderFingerprint
+    ) -> None:
+        try:
+            actual = embedder.fingerprint()
+        except Exception as e:
+            # embedding サーバーに接続できない場合でも読み込みは続行する
+            logger.warning(f"Can't verify embedder fingerprint: {e}")
+            return
+
+        if not expected.is_compatible(actual):
+            raise ValueError(
+                f"Embedder {actual} doesn't match the embedder the knowledge warehouse "
+                f"was built with ({expected}). Use migrate_embedder to re-embed it."
+            )
+
+    @staticmethod
+    def _verify_index(vector_db: VectordbBase, expected: EmbedderFingerprint) -> None:
+        # embedding せずに、フィンガープリントの次元数とインデックス・次元削減の次元数を比較する
+        reducer = vector_db.reducer
+        if reducer is not None and reducer.mean is not None and len(reducer.mean) != expected.dimension:
+            raise ValueError(
+                f"Dimension reducer expects {len(reducer.mean)} dims but the embedder "
+                f"{expected.model} has {expected.dimension} dims"
+            )
+        dimension = getattr(vector_db.vector_db, "dimension", None)
+        if dimension is None:
+            return
+        expected_dimension = (
+            vector_db.index_config.reduction.dimension
+            if reducer is not None
+            else expected.dimension
+        )
+        if dimension != expected_dimension:
+            raise ValueError(
+                f"Vector index has {dimension} dims but {expected_dimension} were expected "
+                f"for the embedder {expected.model}. Use migrate_embedder to re-embed it."
+            )
+
     async def delete(self) -> None:
         """Delete the entire knowledge warehouse including all files and vectors."""
         try:
+            # Release the parsed documents cached for the files
+            if self.storage:
+                for file in await self.storage.get_files():
+                    await asyncio.to_thread(ParsedDocumentCache.default().release, file)
+
             # Delete the storage directory if it exists
             if self.storage and self.storage.get_directory_path():
                 storage_root = self.storage.get_directory_path()
@@ -268,7 +431,7 @@ class KnowledgeWarehouse:
                     shutil.rmtree(kw_storage_file_path)
 
             # Delete vector store if it exists
-            self.vector_db.vector_db.delete(self.vector_db.get_all_ids())
+            await self.vector_db.adelete(self.vector_db.get_all_ids())
 
             # Delete all files under self.kw_path
             if os.path.exists(self.kw_path):
@@ -318,6 +481,8 @@ class KnowledgeWarehouse:
         embedder: EmbedderBase | None = None,
         skip_file_error: bool = False,
         processor_kwargs: dict[str, Any] | None = None,
+        on_status: Callable[[IngestionStatus], Any] | None = None,
+        index_config: VectorIndexConfig | None = None,
     ):
         """
         ファイルパスのリストから KnowledgeWarehouse を作成する。
@@ -330,6 +495,8 @@ class KnowledgeWarehouse:
         - embedder (Embeddings | None): 処理されたファイルのインデックスを作成するために使用する Embeddings。
         - skip_file_error (bool): 処理できないファイルをスキップするかどうか。
         - processor_kwargs (dict[str, Any] | None): プロセッサへの追加の引数。
+        - on_status (Callable[[IngestionStatus], Any] | None): 取り込みのステータスが更新されるたびに呼び出されるコールバック。
+        - index_config (VectorIndexConfig | None): vector db のインデックス設定（次元削減など）。
 
         戻り値:
         - KnowledgeWarehouse: ファイルパスから作成された KnowledgeWarehouse。
@@ -346,26 +513,24 @@ class KnowledgeWarehouse:
         if embedder is None:
             embedder = EmbedderBuilder.build_default_embedder()
 
-        kw_id = uuid4()
-
-        # Add files to storage and vector db
-        vector_db = await cls._add_file_to_storage_and_vectordb(
-            kw_id=kw_id,
-            file_paths=file_paths,
+        kw = cls(
+            kw_id=uuid4(),
+            name=name,
             storage=storage,
+            llm=llm,
             embedder=embedder,
+            index_config=index_config,
+        )
+
+        # Add files to storage and vector db
+        await kw.aadd_files(
+            file_paths,
             skip_file_error=skip_file_error,
             processor_kwargs=processor_kwargs,
+            on_status=on_status,
         )
 
-        return cls(
-            kw_id=kw_id,
-            name=name,
-            storage=storage,
-            llm=llm,
-            embedder=embedder,
-            vector_db=vector_db,
-        )
+        return kw
 
     @classmethod
     def from_files(
@@ -429,6 +594,119 @@ class KnowledgeWarehouse:
 
         return [SearchResult(chunk=d, distance=s) for d, s in result]
 
+    @staticmethod
+    def federated_vector_store(
+        warehouses: Sequence["KnowledgeWarehouse"],
+    ) -> FederatedVectorStore:
+        """
+        複数の KnowledgeWarehouse の vector store をまとめて検索する FederatedVectorStore を作成する。
+        引数:
+        - warehouses (Sequence[KnowledgeWarehouse]): 検索する KnowledgeWarehouse のリスト。
+
+        戻り値:
+        - FederatedVectorStore: 各 KnowledgeWarehouse の vector store を並列に検索する vector store。
+        """
+        missing = [kw.name for kw in warehouses if not kw.vector_db]
+        if missing:
+            raise ValueError(f"No vector db configured for Knowledge Warehouses: {missing}")
+        return FederatedVectorStore([kw.vector_db.vector_db for kw in warehouses])
+
+    @property
+    def _answer_cache_key(self) -> tuple:
+        return self.kw_id, self._index_version, self._unsaved_index_version
+
+    def _on_index_changed(self) -> None:
+        # 変更前のインデックスで生成された回答は再利用しない
+        SemanticAnswerCache.default().invalidate(self._answer_cache_key)
+        self._unsaved_index_version = uuid4().hex
+
+        # vector store が置き換えられた場合（再処理・embedder の移行・次元削減の学習）は、
+        # 古い vector store を参照するグラフと FederatedVectorStore を破棄してメモリを解放する
+        current = self.vector_db.vector_db if self.vector_db else None
+        if self._vector_store is not None and current is not self._vector_store:
+            AiQARAGLangGraph.evict_compiled_graphs(self._vector_store)
+            self._federated_stores.clear()
+        self._vector_store = current
+
+    async def _answer_cache_scope(
+        self,
+        question: str,
+        retrieval_config: RetrievalConfig,
+        rag_pipeline: type,
+        vector_store: VectorStore,
+        list_files: list[AIKnowledge],
+        chat_history: ChatHistory,
+        federated_with: Sequence["KnowledgeWarehouse"] | None,
+    ) -> tuple[tuple, list[float]] | None:
+        # 履歴に依存する質問の回答は会話ごとに異なるため、キャッシュしない
+        if retrieval_config.answer_cache_threshold is None or (
+            len(chat_history) and depends_on_history(question)
+        ):
+            return None
+        if vector_store.embeddings is None:
+            return None
+        scope = (
+            tuple(kw._answer_cache_key for kw in [self, *(federated_with or [])]),
+            rag_pipeline.__qualname__,
+            hashlib.sha256(retrieval_config.model_dump_json().encode("utf-8")).hexdigest(),
+            tuple(str(file.id) for file in list_files),
+        )
+        # 質問の embedding はクエリの embedding キャッシュに保存され、検索時にも再利用される
+        return scope, await vector_store.embeddings.aembed_query(question)
+
+    def _llm_endpoint_for(self, retrieval_config: RetrievalConfig) -> LLMEndpoint:
+        key = retrieval_config.llm_config.model_dump_json()
+        if key not in self._llm_endpoints:
+            self._llm_endpoints[key] = LLMEndpoint.from_config(
+                config=retrieval_config.llm_config
+            )
+        return self._llm_endpoints[key]
+
+    def _federated_store_for(
+        self, federated_with: Sequence["KnowledgeWarehouse"]
+    ) -> FederatedVectorStore:
+        warehouses = [self, *federated_with]
+        # vector store が再読み込みされた場合は ID が変わるため、新しい FederatedVectorStore を作成する
+        key = tuple(id(kw.vector_db.vector_db) if kw.vector_db else None for kw in warehouses)
+        if key not in self._federated_stores:
+            self._federated_stores.clear()
+            self._federated_stores[key] = self.federated_vector_store(warehouses)
+        return self._federated_stores[key]
+
+    @classmethod
+    async def afederated_search(
+        cls,
+        warehouses: Sequence["KnowledgeWarehouse"],
+        query: str,
+        n_results: int = 5,
+        search_filter: Callable | Dict[str, Any] | None = None,
+        fetch_n_neighbors: int = 20,
+    ) -> list[SearchResult]:
+        """
+        複数の KnowledgeWarehouse を並列に検索し、1 つのランキングにまとめた結果を返す。
+        引数:
+        - warehouses (Sequence[KnowledgeWarehouse]): 検索する KnowledgeWarehouse のリスト。
+        - query (str): 検索するクエリ。
+        - n_results (int): 返す結果の数。
+        - search_filter (Callable | Dict[str, Any] | None): 各 KnowledgeWarehouse の検索に適用するフィルタ。
+        - fetch_n_neighbors (int): 取得する近傍の数。
+
+        戻り値:
+        - list[SearchResult]: 関連度の高い順に並べたチャンクのリスト（distance は各 KnowledgeWarehouse での距離）。
+
+        例:
+        ```python
+        results = await KnowledgeWarehouse.afederated_search([kw1, kw2], "What is your name?")
+        ```
+        """
+        result = await cls.federated_vector_store(
+            warehouses
+        ).asimilarity_search_with_score(
+            query, k=n_results, filter=search_filter, fetch_k=fetch_n_neighbors
+        )
+
+        return [SearchResult(chunk=d, distance=s) for d, s in result]
+
     async def ask_streaming(
         self,
         question: str,
@@ -436,6 +714,7 @@ class KnowledgeWarehouse:
         rag_pipeline: Type[Union[AiQARAGLangGraph]] | None = None,
         list_files: list[AIKnowledge] | None = None,
         chat_history: ChatHistory | None = None,
+        federated_with: Sequence["KnowledgeWarehouse"] | None = None,
     ) -> AsyncGenerator[ParsedRAGChunkResponse, ParsedRAGChunkResponse]:
         """
         KnowledgeWarehouse に質問をして、ストリーム形式で生成された回答を取得する。
@@ -445,6 +724,7 @@ class KnowledgeWarehouse:
         - rag_pipeline (Type[Union[AiQARAGLangGraph]] | None): 使用する RAG パイプライン。
         - list_files (list[AiKnowledge] | None): RAG パイプラインに含めるファイルのリスト。
         - chat_history (ChatHistory | None): 使用するチャット履歴。
+        - federated_with (Sequence[KnowledgeWarehouse] | None): 合わせて検索する他の KnowledgeWarehouse。
 
         戻り値:
         - AsyncGenerator[ParsedRAGChunkResponse, ParsedRAGChunkResponse]: ストリーム形式で生成された回答。
@@ -461,32 +741,67 @@ class KnowledgeWarehouse:
         # 別の LLM モデルを渡した場合、KnowledgeWarehouse のモデルが上書きされます。
         if retrieval_config:
             if retrieval_config.llm_config != self.llm.get_config():
-                llm = LLMEndpoint.from_config(config=retrieval_config.llm_config)
+                llm = self._llm_endpoint_for(retrieval_config)
         else:
             retrieval_config = RetrievalConfig(llm_config=self.llm.get_config())
 
         if rag_pipeline is None:
             rag_pipeline = AiQARAGLangGraph
 
+        vector_store = (
+            self._federated_store_for(federated_with)
+            if federated_with
+            else self.vector_db.vector_db
+        )
         rag_instance = rag_pipeline(
             retrieval_config=retrieval_config,
             llm=llm,
-            vector_store=self.vector_db.vector_db,
+            vector_store=vector_store,
         )
 
         chat_history = self.default_chat if chat_history is None else chat_history
         list_files = [] if list_files is None else list_files
 
+        answer_cache = SemanticAnswerCache.default()
+        cache_scope = await self._answer_cache_scope(
+            question,
+            retrieval_config,
+            rag_pipeline,
+            vector_store,
+            list_files,
+            chat_history,
+            federated_with,
+        )
+        cached = None
+        if cache_scope is not None:
+            scope, embedding = cache_scope
+            cached = answer_cache.get(
+                scope, question, embedding, retrieval_config.answer_cache_threshold
+            )
+
+        if cached is not None:
+            responses = SemanticAnswerCache.areplay(cached)
+        else:
+            responses = rag_instance.answer_astream(
+                question=question, history=chat_history, list_files=list_files
+            )
+
         full_answer = ""
 
-        async for response in rag_instance.answer_astream(
-            question=question, history=chat_history, list_files=list_files
-        ):
+        async for response in responses:
             # Format output
             if not response.last_chunk:
                 yield response
             full_answer += response.answer
 
+        if cached is None and cache_scope is not None and full_answer:
+            answer_cache.put(
+                scope,
+                question,
+                embedding,
+                ParsedRAGResponse(answer=full_answer, metadata=response.metadata),
+            )
+
         chat_history.append(HumanMessage(content=question))
         chat_history.append(AIMessage(content=full_answer))
         yield response
@@ -498,6 +813,7 @@ class KnowledgeWarehouse:
         rag_pipeline: Type[Union[AiQARAGLangGraph]] | None = None,
         list_files: list[AIKnowledge] | None = None,
         chat_history: ChatHistory | None = None,
+        federated_with: Sequence["KnowledgeWarehouse"] | None = None,
     ) -> ParsedRAGResponse:
         """
         ask_streamingの同期化バージョン.
@@ -507,6 +823,7 @@ class KnowledgeWarehouse:
         - rag_pipeline (Type[Union[AiQARAGLangGraph]] | None): 使用する RAG パイプライン。
         - list_files (list[AiKnowledge] | None): RAG パイプラインに含めるファイルのリスト。
         - chat_history (ChatHistory | None): 使用するチャット履歴。
+        - federated_with (Sequence[KnowledgeWarehouse] | None): 合わせて検索する他の KnowledgeWarehouse。
 
         戻り値:
         - ParsedRAGResponse: 生成された回答。
@@ -520,6 +837,7 @@ class KnowledgeWarehouse:
             rag_pipeline=rag_pipeline,
             list_files=list_files,
             chat_history=chat_history,
+            federated_with=federated_with,
         ):
             full_answer += response.answer
             if response.last_chunk:
@@ -534,6 +852,7 @@ class KnowledgeWarehouse:
         rag_pipeline: Type[Union[AiQARAGLangGraph]] | None = None,
         list_files: list[AIKnowledge] | None = None,
         chat_history: ChatHistory | None = None,
+        federated_with: Sequence["KnowledgeWarehouse"] | None = None,
     ) -> ParsedRAGResponse:
         """
         ask_streamingの完全同期化バージョン.
@@ -543,6 +862,7 @@ class KnowledgeWarehouse:
         - rag_pipeline (Type[Union[AiQARAGLangGraph]] | None): 使用する RAG パイプライン。
         - list_files (list[AiKnowledge] | None): RAG パイプラインに含めるファイルのリスト。
         - chat_history (ChatHistory | None): 使用するチャット履歴。
+        - federated_with (Sequence[KnowledgeWarehouse] | None): 合わせて検索する他の KnowledgeWarehouse。
 
         戻り値:
         - ParsedRAGResponse: 生成された回答。
@@ -555,72 +875,215 @@ class KnowledgeWarehouse:
                 rag_pipeline=rag_pipeline,
                 list_files=list_files,
                 chat_history=chat_history,
+                federated_with=federated_with,
             )
         )
 
     @classmethod
-    async def _add_file_to_storage_and_vectordb(
+    async def _add_docs_to_vectordb(
         cls,
-        kw_id: UUID,
+        vector_db: VectordbBase | None,
+        docs: list[Document],
+        embedder: EmbedderBase,
+        vectordb_type: VectordbType | None = None,
+        index_config: VectorIndexConfig | None = None,
+    ) -> tuple[VectordbBase, list[str]]:
+        if vector_db is None:
+            if vectordb_type is None:
+                vector_db = await VectordbBuilder.build_default_vectordb(
+                    docs, embedder.embedder, index_config
+                )
+            else:
+                vector_db = await VectordbBuilder.build_vectordb(
+                    vectordb_type, docs, embedder.embedder, index_config
+                )
+            ids = vector_db.get_all_ids()
+        else:
+            ids = await vector_db.aadd_documents(docs)
+        return vector_db, ids
+
+    async def astream_add_files(
+        self,
         file_paths: list[str | Path],
-        storage: StorageBase,
-        vector_db: VectordbBase | None = None,
-        embedder: EmbedderBase | None = None,
         skip_file_error: bool = False,
         processor_kwargs: dict[str, Any] | None = None,
-    ) -> VectordbBase | None:
+        status: IngestionStatus | None = None,
+    ) -> AsyncGenerator[IngestionStatus, Any]:
+        """
+        ファイルを KnowledgeWarehouse に追加し、取り込みの進捗（IngestionStatus）をストリーム形式で返します。
+        次のファイルのパースは、現在のファイルの embedding と並行して行われます。
 
-        processor_kwargs = processor_kwargs or {}
+        引数:
+        - file_paths (list[str | Path]): 追加するファイルパスのリスト。
+        - skip_file_error (bool): 処理できないファイルをスキップするかどうか。
+        - processor_kwargs (dict[str, Any] | None): プロセッサへの追加の引数。
+        - status (IngestionStatus | None): 更新するステータス。None の場合は新しいジョブ ID で作成します。
 
-        for path in file_paths:
-            file = await load_aifile(kw_id, path)
-            await storage.upload_file(file)
+        戻り値:
+        - AsyncGenerator[IngestionStatus, Any]: ファイルのステージが変わるたびに更新されたステータス。
 
-            logger.debug(f"uploaded {file} to {storage}")
+        例:
+        ```python
+        async for status in kw.astream_add_files(["file1.pdf", "file2.pdf"]):
+            print(f"{status.progress:.0%} {status.chunks_per_sec:.1f} chunks/s")
+        ```
+        """
+        processor_kwargs = processor_kwargs or {}
 
-            try:
-                # Parse files
-                docs = await process_file(
-                    file=file,
-                    **processor_kwargs,
-                )
-            except Exception as e:
-                if skip_file_error:
-                    logger.warning(f"error processing {file}: {e}")
-                    continue
-                else:
-                    raise e
+        if status is None:
+            status = IngestionStatus(job_id=str(uuid4()))
+        status.kw_id = str(self.kw_id)
+        status.status = Status.PROCESSING
+        status.files = [FileIngestionStatus(file_path=str(p)) for p in file_paths]
 
-            # Building KnowledgeWarehouse's vectordb
-            if vector_db is None:
-                vector_db = await VectordbBuilder.build_default_vectordb(
-                    docs, embedder.embedder
-                )
-                ids = vector_db.get_all_ids()
-            else:
-                ids = await vector_db.vector_db.aadd_documents(docs)
+        logger.info(f"Starting ingestion job {status.job_id} for {len(file_paths)} files")
+        sw = stopwatch.Stopwatch()
+        sw.start()
 
-            file.vectordb_ids = ids
+        def update() -> IngestionStatus:
+            status.refresh(sw.duration)
+            return status
 
-            logger.debug(f"added {len(docs)} chunks to vectordb")
+        async def parse(idx: int) -> tuple[AIFile, list[Document]]:
+            status.files[idx].stage = FileStage.PARSING
+            file = await load_aifile(self.kw_id, file_paths[idx])
+            await self.storage.upload_file(file)
+            logger.debug(f"uploaded {file} to {self.storage}")
+            docs = await process_file(file=file, **processor_kwargs)
+            status.files[idx].stage = FileStage.PARSED
+            return file, docs
 
-        return vector_db
+        yield update()
+
+        pending = asyncio.create_task(parse(0)) if file_paths else None
+        try:
+            for idx, file_status in enumerate(status.files):
+                try:
+                    try:
+                        file, docs = await pending
+                    finally:
+                        # 現在のファイルを embedding している間に次のファイルをパースする
+                        pending = (
+                            asyncio.create_task(parse(idx + 1))
+                            if idx + 1 < len(file_paths)
+                            else None
+                        )
+
+                    file_status.stage = FileStage.EMBEDDING
+                    file_status.chunks = len(docs)
+                    yield update()
+
+                    # Building KnowledgeWarehouse's vectordb
+                    async with self._write_lock:
+                        self.vector_db, ids = await self._add_docs_to_vectordb(
+                            self.vector_db,
+                            docs,
+                            self.embedder,
+                            index_config=self.index_config,
+                        )
+                        file.vectordb_ids = ids
+                        self._on_index_changed()
+                    file_status.stage = FileStage.INDEXED
+                    logger.debug(f"added {len(docs)} chunks to vectordb")
+                except Exception as e:
+                    file_status.stage = FileStage.ERROR
+                    file_status.error = str(e)
+                    if not skip_file_error:
+                        status.status = Status.ERROR
+                        status.error = str(e)
+                        status.duration = sw.duration
+                        yield update()
+                        raise e
+                    logger.warning(f"error processing {file_status.file_path}: {e}")
+                yield update()
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+        sw.stop()
+        status.status = Status.COMPLETED
+        status.duration = sw.duration
+        yield update()
+        logger.info(
+            f"Ingestion job {status.job_id} completed in {status.duration:.2f} seconds "
+            f"({status.chunks_indexed} chunks, {status.files_failed} failed files)"
+        )
 
     async def aadd_files(
         self,
         file_paths: list[str | Path],
         skip_file_error: bool = False,
         processor_kwargs: dict[str, Any] | None = None,
-    ) -> None:
-        await self._add_file_to_storage_and_vectordb(
-            kw_id=self.kw_id,
-            file_paths=file_paths,
-            storage=self.storage,
-            vector_db=self.vector_db,
-            embedder=self.embedder,
+        on_status: Callable[[IngestionStatus], Any] | None = None,
+    ) -> IngestionStatus:
+        """
+        ファイルを KnowledgeWarehouse に追加します。
+
+        引数:
+        - file_paths (list[str | Path]): 追加するファイルパスのリスト。
+        - skip_file_error (bool): 処理できないファイルをスキップするかどうか。
+        - processor_kwargs (dict[str, Any] | None): プロセッサへの追加の引数。
+        - on_status (Callable[[IngestionStatus], Any] | None): ステータスが更新されるたびに呼び出されるコールバック。
+
+        戻り値:
+        - IngestionStatus: 最終的な取り込みステータス。
+        """
+        status = None
+        async for status in self.astream_add_files(
+            file_paths,
             skip_file_error=skip_file_error,
             processor_kwargs=processor_kwargs,
+        ):
+            if on_status:
+                on_status(status)
+        return status
+
+    def start_add_files(
+        self,
+        file_paths: list[str | Path],
+        skip_file_error: bool = False,
+        processor_kwargs: dict[str, Any] | None = None,
+    ) -> str:
+        """
+        ファイルの追加をバックグラウンドジョブとして開始し、ジョブ ID を返します。
+        進捗は `KnowledgeWarehouse.get_ingestion_status(job_id)` でポーリングできます。
+        実行中のイベントループ内で呼び出す必要があります。
+
+        引数:
+        - file_paths (list[str | Path]): 追加するファイルパスのリスト。
+        - skip_file_error (bool): 処理できないファイルをスキップするかどうか。
+        - processor_kwargs (dict[str, Any] | None): プロセッサへの追加の引数。
+
+        戻り値:
+        - str: ジョブ ID。
+
+        例:
+        ```python
+        job_id = kw.start_add_files(["file1.pdf", "file2.pdf"])
+        status = KnowledgeWarehouse.get_ingestion_status(job_id)
+        ```
+        """
+        status = IngestionStatus(job_id=str(uuid4()), kw_id=str(self.kw_id))
+        job = IngestionJobRegistry.start(
+            status,
+            self.astream_add_files(
+                file_paths,
+                skip_file_error=skip_file_error,
+                processor_kwargs=processor_kwargs,
+                status=status,
+            ),
         )
+        return job.job_id
+
+    @staticmethod
+    def get_ingestion_status(job_id: str) -> JobStatus | None:
+        """
+        ジョブ ID から取り込みジョブ（ファイルの追加、embedding モデルの移行）のステータスを取得します。
+
+        戻り値:
+        - JobStatus | None: ジョブのステータス。ジョブが存在しない場合は None。
+        """
+        return IngestionJobRegistry.get_status(job_id)
 
     async def delete_file(self, file: AIFile) -> None:
         # Remove file from storage
@@ -629,8 +1092,228 @@ class KnowledgeWarehouse:
             f"removed file {file.original_filename} from {self.name}'s storage"
         )
 
+        # Remove the parsed documents from the cache unless another file still uses them
+        await asyncio.to_thread(ParsedDocumentCache.default().release, file)
+
         # Remove file from vector db
-        self.vector_db.vector_db.delete(file.vectordb_ids)
+        async with self._write_lock:
+            await self.vector_db.adelete(file.vectordb_ids)
+            self._on_index_changed()
         logger.debug(
             f"removed file {file.original_filename} from {self.name}'s vector db"
         )
+
+    async def reprocess(
+        self,
+        splitter_config: SplitterConfig | None = None,
+        skip_file_error: bool = False,
+        processor_kwargs: dict[str, Any] | None = None,
+    ) -> None:
+        """
+        ストレージ内のすべてのファイルを再チャンク化・再 embedding し、vector db を再構築します。
+        ローダーの出力は ParsedDocumentCache から読み込まれるため、キャッシュ済みのファイルは再パースされません。
+        再構築が完了するまで、ファイルの追加・削除は待機します。
+
+        引数:
+        - splitter_config (SplitterConfig | None): 新しい分割設定。None の場合はプロセッサのデフォルト設定を使用します。
+        - skip_file_error (bool): 処理できないファイルをスキップするかどうか。
+        - processor_kwargs (dict[str, Any] | None): プロセッサへの追加の引数。
+
+        例:
+        ```python
+        await kw.reprocess(splitter_config=SplitterConfig(chunk_size=800, chunk_overlap=80))
+        await kw.save("path/to/KnowledgeWarehouse")
+        ```
+        """
+        processor_kwargs = dict(processor_kwargs or {})
+        if splitter_config is not None:
+            processor_kwargs["splitter_config"] = splitter_config
+
+        # 再構築中に追加・削除されたチャンクが失われないよう、完了まで追加・削除を待たせる
+        async with self._write_lock:
+            vectordb_type = self.vector_db.vectordb_type if self.vector_db else None
+
+            vector_db = None
+            files_ids: list[tuple[AIFile, list[str]]] = []
+            for file in await self.storage.get_files():
+                try:
+                    docs = await process_file(file=file, **processor_kwargs)
+                except Exception as e:
+                    if skip_file_error:
+                        logger.warning(f"error reprocessing {file}: {e}")
+                        # スキップしたファイルのチャンクは再構築後の vector db には存在しない
+                        files_ids.append((file, []))
+                        continue
+                    else:
+                        raise e
+
+                vector_db, ids = await self._add_docs_to_vectordb(
+                    vector_db, docs, self.embedder, vectordb_type, self.index_config
+                )
+                files_ids.append((file, ids))
+
+                logger.debug(f"re-added {len(docs)} chunks of {file} to vectordb")
+
+            if vector_db is None:
+                # 再構築できたファイルがない場合（ストレージが空、またはすべてのファイルが失敗）は既存の vector db を維持する
+                logger.warning(
+                    f"No files of {self.name} could be reprocessed, keeping the existing vector db"
+                )
+                return
+
+            # 再構築が完了してから置き換える（途中で失敗した場合は既存の vector db を維持する）
+            for file, ids in files_ids:
+                file.vectordb_ids = ids
+            self.vector_db = vector_db
+            self._on_index_changed()
+
+    async def astream_migrate_embedder(
+        self,
+        embedder: EmbedderBase,
+        batch_size: int = 64,
+        pause: float = 0.1,
+        status: MigrationStatus | None = None,
+    ) -> AsyncGenerator[MigrationStatus, Any]:
+        """
+        vector db のすべてのチャンクを新しい embedder で再 embedding し、完了後に embedder と vector db を切り替えます。
+        再 embedding は別の（シャドウ）vector db に対してバッチ単位で行われ、その間は既存の vector db で検索を続けられます。
+        チャンクはパースし直さず、既存の vector db からチャンク ID を保ったまま読み出されます。
+        移行中に追加・削除されたチャンクは、切り替えの直前に反映されます（最後の反映から切り替えまでの間、ファイルの追加・削除は待機します）。
+
+        引数:
+        - embedder (EmbedderBase): 移行先の embedder。
+        - batch_size (int): 1 バッチで再 embedding するチャンク数。
+        - pause (float): バッチ間の待機時間（秒）。対話的な検索のクエリ embedding を妨げないように使用します。
+        - status (MigrationStatus | None): 更新するステータス。None の場合は新しいジョブ ID で作成します。
+
+        戻り値:
+        - AsyncGenerator[MigrationStatus, Any]: バッチごとに更新されたステータス。
+
+        例:
+        ```python
+        new_embedder = EmbedderBuilder.build_embedder(EmbedderType.OnnxEmbeddings, None)
+        async for status in kw.astream_migrate_embedder(new_embedder):
+            print(f"{status.progress:.0%}")
+        await kw.save("path/to/KnowledgeWarehouse")
+        ```
+        """
+        if status is None:
+            status = MigrationStatus(job_id=str(uuid4()))
+        status.kw_id = str(self.kw_id)
+        status.status = Status.PROCESSING
+        status.source = await asyncio.to_thread(self.embedder.fingerprint)
+        status.target = await asyncio.to_thread(embedder.fingerprint)
+
+        logger.info(
+            f"Starting embedder migration job {status.job_id} "
+            f"from {status.source.model} to {status.target.model}"
+        )
+        sw = stopwatch.Stopwatch()
+        sw.start()
+
+        vectordb_type = self.vector_db.vectordb_type
+        index_config = self.vector_db.index_config
+        shadow_db: VectordbBase | None = None
+        migrated: set[str] = set()
+
+        # 最後の差分の反映から切り替えまではロックを保持し、その間の追加・削除を待たせる
+        locked = False
+        try:
+            try:
+                while True:
+                    current_ids = self.vector_db.get_all_ids()
+                    pending_ids = [i for i in current_ids if i not in migrated]
+                    if not pending_ids:
+                        if locked:
+                            break
+                        await self._write_lock.acquire()
+                        locked = True
+                        continue
+                    status.chunks_total = len(migrated) + len(pending_ids)
+
+                    start = 0
+                    while start < len(pending_ids):
+                        size = batch_size
+                        if shadow_db is None and index_config.reduction is not None:
+                            # 次元削減の学習に十分なサンプルで最初のバッチを作成する
+                            size = max(batch_size, index_config.reduction.sample_size)
+                        batch_ids = pending_ids[start : start + size]
+                        start += size
+
+                        docs = self.vector_db.get_documents(batch_ids)
+                        if docs:
+                            shadow_db, _ = await self._add_docs_to_vectordb(
+                                shadow_db, docs, embedder, vectordb_type, index_config
+                            )
+                        migrated.update(batch_ids)
+                        status.chunks_migrated = len(migrated)
+                        status.refresh(sw.duration)
+                        if not locked:
+                            # ロック中は呼び出し側に制御を返さない（呼び出し側の追加・削除とのデッドロックを避ける）
+                            yield status
+                            # 対話的な検索に embedding サーバーと CPU を譲る
+                            await asyncio.sleep(pause)
+
+                # 移行中に削除されたチャンクをシャドウ側からも削除する
+                removed = migrated - set(self.vector_db.get_all_ids())
+                if shadow_db is not None and removed:
+                    await shadow_db.adelete(list(removed))
+            except Exception as e:
+                if locked:
+                    self._write_lock.release()
+                    locked = False
+                status.status = Status.ERROR
+                status.error = str(e)
+                status.duration = sw.duration
+                yield status
+                raise e
+
+            # 切り替えは await を挟まずに行い、検索からは常にどちらか一方の組み合わせだけが見えるようにする
+            if shadow_db is not None:
+                self.embedder = embedder
+                self._embedder_fingerprint = status.target
+                self.vector_db = shadow_db
+                self._on_index_changed()
+        finally:
+            if locked:
+                self._write_lock.release()
+
+        sw.stop()
+        status.status = Status.COMPLETED
+        status.duration = sw.duration
+        status.refresh(sw.duration)
+        yield status
+        logger.info(
+            f"Embedder migration job {status.job_id} completed in {status.duration:.2f} seconds "
+            f"({status.chunks_migrated} chunks)"
+        )
+
+    async def migrate_embedder(
+        self, embedder: EmbedderBase, batch_size: int = 64, pause: float = 0.1
+    ) -> MigrationStatus:
+        """
+        astream_migrate_embedder を最後まで実行し、最終的なステータスを返します。
+        """
+        status = None
+        async for status in self.astream_migrate_embedder(
+            embedder, batch_size=batch_size, pause=pause
+        ):
+            pass
+        return status
+
+    def start_embedder_migration(
+        self, embedder: EmbedderBase, batch_size: int = 64, pause: float = 0.1
+    ) -> str:
+        """
+        embedder の移行をバックグラウンドジョブとして開始し、ジョブ ID を返します。
+        進捗は `KnowledgeWarehouse.get_ingestion_status(job_id)` でポーリングできます。
+        移行の完了後、新しい embedder を永続化するには `save` を呼び出してください。
+        """
+        status = MigrationStatus(job_id=str(uuid4()), kw_id=str(self.kw_id))
+        job = IngestionJobRegistry.start(
+            status,
+            self.astream_migrate_embedder(
+                embedder, batch_size=batch_size, pause=pause, status=status
+            ),
+        )
+        return job.job_id
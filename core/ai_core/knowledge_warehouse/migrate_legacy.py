@@ -0,0 +1,71 @@
+import argparse
+import logging
+import os
+import sys
+
+from pathlib import Path
+from typing import Iterator
+
+from core.ai_core.knowledge_warehouse.knowledge_warehouse import KnowledgeWarehouse
+
+logger = logging.getLogger("ai_core")
+
+
+def find_knowledge_warehouses(path: str | Path) -> Iterator[Path]:
+    """path 以下の KnowledgeWarehouse のフォルダ（config.json を含むフォルダ）を返します。"""
+    path = Path(path)
+    if (path / "config.json").exists():
+        yield path
+        return
+    for root, dirs, files in os.walk(path):
+        if "config.json" in files:
+            dirs.clear()
+            yield Path(root)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    旧形式（pickle）のドキュメントストアで保存された KnowledgeWarehouse を SQLite のドキュメントストアに変換します。
+    フォルダを指定しない場合は環境変数 `LOCAL_KNOWLEDGE_WAREHOUSE_PATH` 以下のすべての KnowledgeWarehouse を変換します。
+
+    例:
+    ```
+    python -m core.ai_core.knowledge_warehouse.migrate_legacy "/path/to/knowledge warehouse"
+    ```
+    """
+    parser = argparse.ArgumentParser(
+        description="Convert knowledge warehouses saved with a pickled docstore to SQLite. "
+        "Only run it on folders you trust: loading a pickle can execute arbitrary code."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=[os.getenv("LOCAL_KNOWLEDGE_WAREHOUSE_PATH")],
+        help="knowledge warehouse folders or folders containing them "
+        "(default: $LOCAL_KNOWLEDGE_WAREHOUSE_PATH)",
+    )
+    args = parser.parse_args(argv)
+    if not all(args.paths):
+        parser.error("no folder given and LOCAL_KNOWLEDGE_WAREHOUSE_PATH is not set")
+
+    failed = 0
+    for path in args.paths:
+        for kw_path in find_knowledge_warehouses(path):
+            try:
+                if KnowledgeWarehouse.migrate_legacy_docstore(kw_path):
+                    print(f"converted {kw_path}")
+                else:
+                    print(f"skipped {kw_path} (already uses SQLite)")
+            except Exception as e:
+                failed += 1
+                logger.error(f"Failed to convert {kw_path}: {e}")
+                print(f"failed {kw_path}: {e}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
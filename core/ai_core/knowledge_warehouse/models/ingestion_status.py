@@ -0,0 +1,91 @@
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class Status(str, Enum):
+    QUEUED = "QUEUED"
+    PROCESSING = "PROCESSING"
+    COMPLETED = "COMPLETED"
+    ERROR = "ERROR"
+
+
+class FileStage(str, Enum):
+    QUEUED = "QUEUED"
+    PARSING = "PARSING"
+    PARSED = "PARSED"
+    EMBEDDING = "EMBEDDING"
+    INDEXED = "INDEXED"
+    ERROR = "ERROR"
+
+
+class FileIngestionStatus(BaseModel):
+    file_path: str
+    stage: FileStage = FileStage.QUEUED
+    chunks: int = 0
+    error: Optional[str] = None
+
+
+class IngestionStatus(BaseModel):
+    job_id: str
+    kw_id: Optional[str] = None
+    status: Status = Status.QUEUED
+    progress: float = 0.0
+    files: list[FileIngestionStatus] = []
+    files_total: int = 0
+    files_queued: int = 0
+    files_parsed: int = 0
+    files_indexed: int = 0
+    files_failed: int = 0
+    chunks_indexed: int = 0
+    chunks_per_sec: float = 0.0
+    eta: Optional[float] = None
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+    def refresh(self, elapsed: float) -> None:
+        """
+        ファイルごとのステージから集計値・処理速度・残り時間（秒）を再計算します。
+
+        引数:
+        - elapsed (float): ジョブ開始からの経過時間（秒）。
+        """
+        stages = [f.stage for f in self.files]
+        self.files_total = len(self.files)
+        self.files_queued = stages.count(FileStage.QUEUED)
+        self.files_failed = stages.count(FileStage.ERROR)
+        self.files_indexed = stages.count(FileStage.INDEXED)
+        # embedding とインデックスへの追加は 1 つの処理のため、embedding 済みのファイル数は別に数えない
+        # 各カウントは累積（インデックス済みのファイルはパース済みにも含まれる）
+        self.files_parsed = (
+            self.files_indexed
+            + stages.count(FileStage.PARSED)
+            + stages.count(FileStage.EMBEDDING)
+        )
+        self.chunks_indexed = sum(
+            f.chunks for f in self.files if f.stage == FileStage.INDEXED
+        )
+
+        done = self.files_indexed + self.files_failed
+        self.progress = done / self.files_total if self.files_total else 1.0
+        self.chunks_per_sec = self.chunks_indexed / elapsed if elapsed > 0 else 0.0
+
+        if done == 0 or elapsed <= 0:
+            self.eta = None
+        else:
+            # パース済みファイルの平均チャンク数から、残りのチャンク数を推定する
+            in_flight = (FileStage.PARSED, FileStage.EMBEDDING)
+            parsed = [
+                f for f in self.files if f.stage in in_flight + (FileStage.INDEXED,)
+            ]
+            avg_chunks = sum(f.chunks for f in parsed) / len(parsed) if parsed else 0
+            remaining_chunks = sum(
+                f.chunks if f.stage in in_flight else avg_chunks
+                for f in self.files
+                if f.stage not in (FileStage.INDEXED, FileStage.ERROR)
+            )
+            if self.chunks_per_sec > 0:
+                self.eta = remaining_chunks / self.chunks_per_sec
+            else:
+                self.eta = elapsed / done * (self.files_total - done)
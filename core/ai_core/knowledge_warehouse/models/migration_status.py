@@ -0,0 +1,37 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+from core.ai_core.knowledge_warehouse.models.ingestion_status import Status
+from core.ai_core.knowledge_warehouse.serialization import EmbedderFingerprint
+
+
+class MigrationStatus(BaseModel):
+    job_id: str
+    kw_id: Optional[str] = None
+    status: Status = Status.QUEUED
+    progress: float = 0.0
+    source: Optional[EmbedderFingerprint] = None
+    target: Optional[EmbedderFingerprint] = None
+    chunks_total: int = 0
+    chunks_migrated: int = 0
+    chunks_per_sec: float = 0.0
+    eta: Optional[float] = None
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+    def refresh(self, elapsed: float) -> None:
+        """
+        移行済みのチャンク数から進捗・処理速度・残り時間（秒）を再計算します。
+
+        引数:
+        - elapsed (float): ジョブ開始からの経過時間（秒）。
+        """
+        self.progress = (
+            self.chunks_migrated / self.chunks_total if self.chunks_total else 1.0
+        )
+        self.chunks_per_sec = self.chunks_migrated / elapsed if elapsed > 0 else 0.0
+        if self.chunks_per_sec > 0:
+            self.eta = (self.chunks_total - self.chunks_migrated) / self.chunks_per_sec
+        else:
+            self.eta = None
@@ -3,25 +3,42 @@ from typing import Dict, Any, Union, TypeAlias, Literal
 from uuid import UUID
 from pydantic import BaseModel, Field
 
-from core.ai_core.embedder.embedder_config import default_embedder_type, EmbedderType
+from core.ai_core.embedder.embedder_config import EmbedderType
 from core.ai_core.files.file import AIFileSerialized
 from core.ai_core.llm.llm_config import LLMEndpointConfig, LLMName
 from core.ai_core.rag.entities.chat import ChatMessage
 from core.ai_core.storage.storage_config import StorageType
-from core.ai_core.vectordb.vectordb_config import VectordbType
+from core.ai_core.vectordb.vectordb_config import VectordbType, VectorIndexConfig
 
 
 class EmbedderConfig(BaseModel):
-    embedder_type: Literal[EmbedderType.OllamaEmbeddings] = default_embedder_type()
-    llm_name: LLMName
+    embedder_type: Literal[
+        EmbedderType.OllamaEmbeddings, EmbedderType.OnnxEmbeddings
+    ] = EmbedderType.OllamaEmbeddings
+    llm_name: LLMName | str
     config: Dict[str, Any]
 
 
+class EmbedderFingerprint(BaseModel):
+    embedder_type: EmbedderType
+    model: str
+    dimension: int
+    normalized: bool
+
+    def is_compatible(self, other: "EmbedderFingerprint") -> bool:
+        return (
+            self.embedder_type == other.embedder_type
+            and self.model == other.model
+            and self.dimension == other.dimension
+        )
+
+
 class FAISSConfig(BaseModel):
     vectordb_type: Literal[VectordbType.FaissCPU, VectordbType.FaissGPU] = (
         VectordbType.FaissCPU
     )
     vectordb_folder_path: str
+    index_config: VectorIndexConfig = VectorIndexConfig()
 
 
 VectordbConfig: TypeAlias = Union[FAISSConfig]
@@ -51,3 +68,6 @@ class KWSerialized(BaseModel):
     storage_config: StorageConfig = Field(..., discriminator="storage_type")
     llm_config: LLMEndpointConfig
     embedding_config: EmbedderConfig
+    embedder_fingerprint: EmbedderFingerprint | None = None
+    # 保存されたインデックスの状態を表すバージョン（同じ保存から読み込んだインスタンス間で回答キャッシュを共有する）
+    index_version: str | None = None
@@ -1,3 +1,5 @@
+import asyncio
+import logging
 import tiktoken
 
 from typing import Any, List, Type, TypeVar
@@ -19,11 +21,24 @@ from langchain_community.document_loaders import (
 )
 from langchain_core.documents import Document
 from langchain_community.document_loaders.base import BaseLoader
-from langchain_text_splitters import TextSplitter, RecursiveCharacterTextSplitter
+from langchain_text_splitters import TextSplitter
 
 from core.ai_core.files.file import FileExtension, AIFile
+from core.ai_core.processor.markitdown_loader import (
+    MARKITDOWN_EXTENSIONS,
+    MarkItDownLoader,
+)
+from core.ai_core.processor.parsed_document_cache import ParsedDocumentCache
 from core.ai_core.processor.processor_base import ProcessorBase
-from core.ai_core.processor.splitter import SplitterConfig
+from core.ai_core.processor.splitter import (
+    SplitterConfig,
+    SplitterMode,
+    TikTokenSplitter,
+    build_splitter,
+)
+from core.ai_core.processor.structure_splitter import MarkdownStructureSplitter
+
+logger = logging.getLogger("ai_core")
 
 P = TypeVar("P", bound=BaseLoader)
 
@@ -40,34 +55,83 @@ def _build_processor(
             self,
             splitter: TextSplitter | None = None,
             splitter_config: SplitterConfig = SplitterConfig(),
+            parsed_cache: ParsedDocumentCache | None = None,
+            use_parsed_cache: bool = True,
             **loader_kwargs: dict[str, Any],
         ) -> None:
             self.loader_cls = load_cls
             self.loader_kwargs = loader_kwargs
 
+            # ローダーの出力キャッシュ（再チャンク化の際にパースを省略するため）
+            if use_parsed_cache:
+                self.parsed_cache = parsed_cache or ParsedDocumentCache.default()
+            else:
+                self.parsed_cache = None
+
             self.splitter_config = splitter_config
 
             if splitter:
                 self.text_splitter = splitter
             else:
-                self.text_splitter = (
-                    RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-                        chunk_size=splitter_config.chunk_size,
-                        chunk_overlap=splitter_config.chunk_overlap,
-                    )
+                self.text_splitter = build_splitter(splitter_config)
+
+        def _loader_for(self, file: AIFile) -> tuple[Type[BaseLoader], dict[str, Any]]:
+            # 構造を考慮した分割では、見出しや表を保持できる Markdown 変換を優先する
+            if (
+                self.splitter_config.mode == SplitterMode.structure
+                and file.file_extension in MARKITDOWN_EXTENSIONS
+            ):
+                return MarkItDownLoader, {}
+            return self.loader_cls, self.loader_kwargs
+
+        async def load_documents(self, file: AIFile) -> list[Document]:
+            loader_cls, loader_kwargs = self._loader_for(file)
+            loader_name = loader_cls.__name__
+
+            if self.parsed_cache:
+                # ファイルの削除時にキャッシュエントリを削除できるよう、参照を記録する
+                await asyncio.to_thread(self.parsed_cache.retain, file)
+                documents = await asyncio.to_thread(
+                    self.parsed_cache.get,
+                    file.file_sha1,
+                    loader_name,
+                    loader_kwargs,
                 )
+                if documents is not None:
+                    logger.debug(f"Loaded parsed documents of {file} from cache")
+                    return documents
 
-        async def process_file_impl(self, file: AIFile) -> list[Document]:
-            if hasattr(self.loader_cls, "__init__"):
-                loader = self.loader_cls(file_path=str(file.path), **self.loader_kwargs)
+            if hasattr(loader_cls, "__init__"):
+                loader = loader_cls(file_path=str(file.path), **loader_kwargs)
             else:
-                loader = self.loader_cls()
+                loader = loader_cls()
 
             documents = await loader.aload()
+
+            if self.parsed_cache:
+                await asyncio.to_thread(
+                    self.parsed_cache.put,
+                    file.file_sha1,
+                    loader_name,
+                    documents,
+                    loader_kwargs,
+                )
+
+            return documents
+
+        async def process_file_impl(self, file: AIFile) -> list[Document]:
+            documents = await self.load_documents(file)
             docs = self.text_splitter.split_documents(documents)
 
-            for doc in docs:
-                doc.metadata = {"chunk_size": len(enc.encode(doc.page_content))}
+            # TikTokenSplitter / MarkdownStructureSplitter は分割時にトークン数を付与済みのため、再エンコードは不要
+            if not isinstance(
+                self.text_splitter, (TikTokenSplitter, MarkdownStructureSplitter)
+            ):
+                for doc in docs:
+                    doc.metadata = {
+                        **doc.metadata,
+                        "chunk_size": len(enc.encode_ordinary(doc.page_content)),
+                    }
 
             return docs
 
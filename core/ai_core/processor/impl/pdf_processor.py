@@ -0,0 +1,244 @@
+import asyncio
+import importlib.util
+import logging
+import os
+
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
+
+from core.ai_core.files.file import FileExtension, AIFile
+from core.ai_core.processor.parsed_document_cache import ParsedDocumentCache
+from core.ai_core.processor.processor_base import ProcessorBase
+from core.ai_core.processor.splitter import SplitterConfig, build_splitter
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+logger = logging.getLogger("ai_core")
+
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_size: int | None = None
+
+
+def _get_process_pool(max_workers: int | None) -> ProcessPoolExecutor:
+    # ワーカープロセスの起動コストを避けるため、プロセスプールはプロセス内で共有する
+    global _process_pool, _process_pool_size
+    if _process_pool is None or _process_pool_size != max_workers:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False)
+        _process_pool = ProcessPoolExecutor(max_workers=max_workers)
+        _process_pool_size = max_workers
+    return _process_pool
+
+
+def _count_pages(path: str) -> int:
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    from pdfminer.pdfpage import PDFPage
+
+    with open(path, "rb") as f:
+        return sum(1 for _ in PDFPage.get_pages(f))
+
+
+def _ocr_available() -> bool:
+    return importlib.util.find_spec("pytesseract") is not None
+
+
+def _ocr_page(page: Any, ocr_languages: str, ocr_scale: float) -> str:
+    import pytesseract
+
+    image = page.render(scale=ocr_scale).to_pil()
+    return pytesseract.image_to_string(image, lang=ocr_languages)
+
+
+def _extract_pages(
+    path: str,
+    page_indices: list[int],
+    *,
+    ocr: bool,
+    ocr_languages: str,
+    ocr_scale: float,
+    min_text_chars: int,
+) -> list[tuple[int, str, str]]:
+    """
+    ワーカープロセスで実行され、指定されたページのテキストを抽出します。
+
+    戻り値:
+    - list[tuple[int, str, str]]: (ページ番号（0 始まり）, テキスト, 抽出方法) のリスト。
+      抽出方法は "text"、"ocr"、または OCR が必要だが pytesseract がないためテキストレイヤーのみを使用した "ocr_skipped"。
+    """
+    results = []
+
+    if pdfium is None:
+        from pdfminer.high_level import extract_text
+
+        for idx in page_indices:
+            text = extract_text(path, page_numbers=[idx])
+            results.append((idx, text, "text"))
+        return results
+
+    ocr_available = ocr and _ocr_available()
+    pdf = pdfium.PdfDocument(path)
+    try:
+        for idx in page_indices:
+            page = pdf[idx]
+            try:
+                text_page = page.get_textpage()
+                text = text_page.get_text_range()
+                text_page.close()
+
+                method = "text"
+                # テキストレイヤーを持たないページのみ OCR にフォールバックする
+                if ocr and len(text.strip()) < min_text_chars:
+                    if ocr_available:
+                        # OCR で何も読み取れない場合は元の短いテキストを残す
+                        text = _ocr_page(page, ocr_languages, ocr_scale) or text
+                        method = "ocr"
+                    else:
+                        method = "ocr_skipped"
+                results.append((idx, text, method))
+            finally:
+                page.close()
+    finally:
+        pdf.close()
+    return results
+
+
+class NativePDFProcessor(ProcessorBase):
+    """
+    pypdfium2（未インストールの場合は pdfminer）でページ単位にテキストを抽出する PDF プロセッサ。
+    ページはプロセスプールで並列に処理され、テキストレイヤーを持たないページのみ OCR（pytesseract）にフォールバックします。
+    pytesseract がインストールされていない場合はテキストレイヤーのテキストをそのまま使用し、その抽出結果はキャッシュしません。
+    各ページは `page`（1 始まり）と `extraction`（"text" または "ocr"）メタデータを持つ Document として分割されます。
+
+    引数:
+    - splitter (TextSplitter | None): 使用するスプリッター。None の場合は splitter_config の mode に応じたスプリッターを使用します。
+    - splitter_config (SplitterConfig): スプリッターの設定。
+    - parsed_cache (ParsedDocumentCache | None): 抽出結果のキャッシュ。
+    - use_parsed_cache (bool): 抽出結果のキャッシュを使用するかどうか。
+    - max_workers (int | None): ワーカープロセス数。デフォルトは CPU 数。
+    - pages_per_task (int): 1 つのワーカータスクで処理するページ数。
+    - ocr (bool): テキストレイヤーのないページに OCR を行うかどうか。
+    - ocr_languages (str): tesseract の言語指定。
+    - ocr_scale (float): OCR 用にページをレンダリングする際の倍率。
+    - min_text_chars (int): この文字数未満のページをテキストレイヤーなしとみなします。
+    """
+
+    supported_extensions = [FileExtension.pdf]
+
+    def __init__(
+        self,
+        splitter: TextSplitter | None = None,
+        splitter_config: SplitterConfig = SplitterConfig(),
+        parsed_cache: ParsedDocumentCache | None = None,
+        use_parsed_cache: bool = True,
+        max_workers: int | None = None,
+        pages_per_task: int = 16,
+        ocr: bool = True,
+        ocr_languages: str = "jpn+eng",
+        ocr_scale: float = 300 / 72,
+        min_text_chars: int = 10,
+    ) -> None:
+        self.splitter_config = splitter_config
+        self.text_splitter = splitter or build_splitter(splitter_config)
+
+        if use_parsed_cache:
+            self.parsed_cache = parsed_cache or ParsedDocumentCache.default()
+        else:
+            self.parsed_cache = None
+
+        self.max_workers = max_workers or os.cpu_count()
+        self.pages_per_task = pages_per_task
+        self.extract_kwargs = {
+            "ocr": ocr,
+            "ocr_languages": ocr_languages,
+            "ocr_scale": ocr_scale,
+            "min_text_chars": min_text_chars,
+        }
+
+    async def load_documents(self, file: AIFile) -> list[Document]:
+        loader_name = type(self).__name__
+
+        if self.parsed_cache:
+            # ファイルの削除時にキャッシュエントリを削除できるよう、参照を記録する
+            await asyncio.to_thread(self.parsed_cache.retain, file)
+            documents = await asyncio.to_thread(
+                self.parsed_cache.get, file.file_sha1, loader_name, self.extract_kwargs
+            )
+            if documents is not None:
+                logger.debug(f"Loaded parsed pages of {file} from cache")
+                return documents
+
+        path = str(file.path)
+        n_pages = await asyncio.to_thread(_count_pages, path)
+
+        loop = asyncio.get_running_loop()
+        pool = _get_process_pool(self.max_workers)
+        extract = partial(_extract_pages, path, **self.extract_kwargs)
+        futures = [
+            loop.run_in_executor(
+                pool,
+                extract,
+                list(range(start, min(start + self.pages_per_task, n_pages))),
+            )
+            for start in range(0, n_pages, self.pages_per_task)
+        ]
+        pages = [page for result in await asyncio.gather(*futures) for page in result]
+
+        documents = [
+            Document(
+                page_content=text,
+                metadata={
+                    "source": path,
+                    "page": idx + 1,
+                    "extraction": "text" if method == "ocr_skipped" else method,
+                },
+            )
+            for idx, text, method in sorted(pages)
+            if text.strip()
+        ]
+        logger.debug(
+            f"Extracted {len(documents)}/{n_pages} pages of {file} "
+            f"({sum(1 for _, _, m in pages if m == 'ocr')} pages with OCR)"
+        )
+
+        ocr_skipped = sum(1 for _, _, m in pages if m == "ocr_skipped")
+        if ocr_skipped:
+            logger.warning(
+                f"pytesseract is not installed, skipped OCR for {ocr_skipped} pages of {file} "
+                "without a text layer"
+            )
+
+        # OCR を行わなかったページを含む結果は、pytesseract のインストール後に抽出し直せるようキャッシュしない
+        if self.parsed_cache and not ocr_skipped:
+            await asyncio.to_thread(
+                self.parsed_cache.put,
+                file.file_sha1,
+                loader_name,
+                documents,
+                self.extract_kwargs,
+            )
+
+        return documents
+
+    async def process_file_impl(self, file: AIFile) -> list[Document]:
+        documents = await self.load_documents(file)
+        return self.text_splitter.split_documents(documents)
+
+    @property
+    def processor_metadata(self) -> dict[str, Any]:
+        return {
+            "processor_cls": type(self).__name__,
+            "splitter": self.splitter_config.model_dump(),
+        }
@@ -0,0 +1,46 @@
+from pathlib import Path
+from typing import Iterator
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders.base import BaseLoader
+
+from core.ai_core.files.file import FileExtension
+
+# 見出し・リスト・表を Markdown として保持したまま変換できる拡張子
+MARKITDOWN_EXTENSIONS = [
+    FileExtension.docx,
+    FileExtension.pptx,
+    FileExtension.xlsx,
+    FileExtension.html,
+    FileExtension.md,
+    FileExtension.mdx,
+    FileExtension.markdown,
+]
+
+
+class MarkItDownLoader(BaseLoader):
+    """
+    `core/utils/markitdown.py` のコンバーターでファイルを Markdown に変換するローダー。
+    構造を考慮した分割（`SplitterMode.structure`）で、見出しや表の情報を失わずにドキュメントを読み込むために使用します。
+
+    引数:
+    - file_path (str | Path): 読み込むファイルのパス。
+    """
+
+    def __init__(self, file_path: str | Path) -> None:
+        self.file_path = str(file_path)
+
+    def lazy_load(self) -> Iterator[Document]:
+        # markitdown は多くの依存ライブラリを読み込むため、使用時にのみインポートする
+        from core.utils.markitdown import MarkItDown
+
+        extension = Path(self.file_path).suffix.lower()
+        # .mdx などはプレーンテキストとして扱う
+        if extension in (FileExtension.mdx, FileExtension.markdown):
+            extension = FileExtension.md.value
+
+        result = MarkItDown().convert(self.file_path, file_extension=extension)
+        metadata = {"source": self.file_path}
+        if result.title:
+            metadata["title"] = result.title
+        yield Document(page_content=result.text_content, metadata=metadata)
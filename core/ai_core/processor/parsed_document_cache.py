@@ -0,0 +1,198 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from pathlib import Path
+from typing import Any
+
+from langchain_core.documents import Document
+
+from core.ai_core.files.file import AIFile
+
+logger = logging.getLogger("ai_core")
+
+
+class ParsedDocumentCache:
+    """
+    ローダーの出力（分割前の Document のリスト）をディスクに保存するキャッシュ。
+    エントリはファイルの SHA-1、ローダークラス、ローダー引数の組み合わせごとに、gzip 圧縮された JSON Lines 形式で保存されます。
+    チャンクサイズの調整や embedding のやり直しの際に、ファイルの再パースを省略するために使用します。
+    エントリを参照している KnowledgeWarehouse のファイルは retain / release で記録され、
+    最後のファイルが削除されるとエントリも削除されます。また、書き込みのたびに最終使用日時が古いエントリから
+    max_age を過ぎたもの、合計サイズが max_bytes を超えた分が削除されます。
+
+    プロパティ:
+    - dir_path (Path): キャッシュファイルを保存するディレクトリパス。
+
+    引数:
+    - dir_path (Path | str | None): キャッシュディレクトリ。デフォルトは環境変数 `AI_PARSED_DOCUMENT_CACHE` または `~/.cache/ai/parsed`。
+    - max_bytes (int | None): キャッシュの合計サイズの上限。デフォルトは環境変数 `AI_PARSED_DOCUMENT_CACHE_MAX_MB`（1024 MB）。
+    - max_age (float | None): 使用されていないエントリを保持する秒数。デフォルトは環境変数 `AI_PARSED_DOCUMENT_CACHE_MAX_AGE_DAYS`（30 日）。
+    """
+
+    _default: "ParsedDocumentCache | None" = None
+
+    # エントリを参照しているファイルを記録するディレクトリ
+    REFS_DIR = "refs"
+
+    def __init__(
+        self,
+        dir_path: Path | str | None = None,
+        max_bytes: int | None = None,
+        max_age: float | None = None,
+    ):
+        if dir_path is None:
+            dir_path = os.getenv("AI_PARSED_DOCUMENT_CACHE", "~/.cache/ai/parsed")
+        self.dir_path = Path(dir_path).expanduser()
+        os.makedirs(self.dir_path, exist_ok=True)
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else int(float(os.getenv("AI_PARSED_DOCUMENT_CACHE_MAX_MB", 1024)) * 1024 * 1024)
+        )
+        self.max_age = (
+            max_age
+            if max_age is not None
+            else float(os.getenv("AI_PARSED_DOCUMENT_CACHE_MAX_AGE_DAYS", 30)) * 86400
+        )
+
+    @classmethod
+    def default(cls) -> "ParsedDocumentCache":
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def cache_path(
+        self,
+        file_sha1: str,
+        loader_name: str,
+        loader_kwargs: dict[str, Any] | None = None,
+    ) -> Path:
+        kwargs_digest = hashlib.sha1(
+            json.dumps(loader_kwargs or {}, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:12]
+        return self.dir_path / loader_name / f"{file_sha1}_{kwargs_digest}.jsonl.gz"
+
+    def get(
+        self,
+        file_sha1: str,
+        loader_name: str,
+        loader_kwargs: dict[str, Any] | None = None,
+    ) -> list[Document] | None:
+        """
+        キャッシュからローダーの出力を読み込みます。
+
+        戻り値:
+        - list[Document] | None: キャッシュされた Document のリスト。キャッシュが存在しない、または壊れている場合は None。
+        """
+        path = self.cache_path(file_sha1, loader_name, loader_kwargs)
+        if not path.exists():
+            return None
+
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                documents = [
+                    Document(page_content=row["page_content"], metadata=row["metadata"])
+                    for row in map(json.loads, f)
+                ]
+            # 最終使用日時を更新する（古いエントリから削除するため）
+            os.utime(path)
+            return documents
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring broken parsed document cache {path}: {e}")
+            return None
+
+    def put(
+        self,
+        file_sha1: str,
+        loader_name: str,
+        documents: list[Document],
+        loader_kwargs: dict[str, Any] | None = None,
+    ) -> None:
+        """
+        ローダーの出力をキャッシュに書き込みます。書き込みは一時ファイル経由でアトミックに行われます。
+        """
+        path = self.cache_path(file_sha1, loader_name, loader_kwargs)
+        os.makedirs(path.parent, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                for doc in documents:
+                    f.write(
+                        json.dumps(
+                            {"page_content": doc.page_content, "metadata": doc.metadata},
+                            ensure_ascii=False,
+                            default=str,
+                        )
+                    )
+                    f.write("\n")
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.prune()
+
+    def prune(self) -> int:
+        """
+        max_age を過ぎたエントリと、合計サイズが max_bytes を超えた分のエントリを最終使用日時が古い順に削除します。
+
+        戻り値:
+        - int: 削除したエントリの数。
+        """
+        entries = []
+        for path in self.dir_path.glob("*/*.jsonl.gz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        expires = time.time() - self.max_age
+        removed = 0
+        for mtime, size, path in entries:
+            if mtime >= expires and total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        if removed:
+            logger.debug(f"Removed {removed} entries from the parsed document cache")
+        return removed
+
+    def _refs_path(self, file_sha1: str) -> Path:
+        return self.dir_path / self.REFS_DIR / file_sha1
+
+    def retain(self, file: AIFile) -> None:
+        """KnowledgeWarehouse のファイルがキャッシュエントリを参照していることを記録します。"""
+        refs_path = self._refs_path(file.file_sha1)
+        os.makedirs(refs_path, exist_ok=True)
+        (refs_path / f"{file.kw_id}_{file.file_id}").touch()
+
+    def release(self, file: AIFile) -> None:
+        """
+        KnowledgeWarehouse から削除されたファイルの参照を取り除きます。
+        エントリを参照するファイルがなくなった場合は、そのファイルのすべてのキャッシュエントリを削除します。
+        """
+        refs_path = self._refs_path(file.file_sha1)
+        (refs_path / f"{file.kw_id}_{file.file_id}").unlink(missing_ok=True)
+        if refs_path.exists() and any(refs_path.iterdir()):
+            return
+        self.delete(file.file_sha1)
+
+    def delete(self, file_sha1: str) -> None:
+        """指定されたファイルのすべてのキャッシュエントリを削除します。"""
+        for path in self.dir_path.glob(f"*/{file_sha1}_*.jsonl.gz"):
+            path.unlink(missing_ok=True)
+        refs_path = self._refs_path(file_sha1)
+        if refs_path.exists():
+            for ref in refs_path.iterdir():
+                ref.unlink(missing_ok=True)
+            refs_path.rmdir()
@@ -1,4 +1,5 @@
 import logging
+import re
 
 from abc import ABC, abstractmethod
 from typing import Any
@@ -9,6 +10,18 @@ from core.ai_core.files.file import FileExtension, AIFile
 
 logger = logging.getLogger("ai_core")
 
+# UTF-8 にエンコードできない孤立サロゲート
+_SURROGATES = re.compile("[\ud800-\udfff]")
+
+
+def _sanitize_content(content: str) -> str:
+    # 必要な場合にのみ文字列を再構築する
+    if "\u0000" in content:
+        content = content.replace("\u0000", "")
+    if _SURROGATES.search(content):
+        content = content.encode("utf-8", "replace").decode("utf-8")
+    return content
+
 
 class ProcessorBase(ABC):
     supported_extensions: list[FileExtension | str]
@@ -22,18 +35,19 @@ class ProcessorBase(ABC):
         self.check_supported(file)
         docs = await self.process_file_impl(file)
 
+        file_metadata = file.metadata
+        processor_metadata = self.processor_metadata
+
         for idx, doc in enumerate(docs, start=1):
+            content = doc.page_content
             if "original_file_name" in doc.metadata:
-                doc.page_content = f"Filename: {doc.metadata['original_file_name']} Content: {doc.page_content}"
-            doc.page_content = doc.page_content.replace("\u0000", "")
-            doc.page_content = doc.page_content.encode("utf-8", "replace").decode(
-                "utf-8"
-            )
+                content = f"Filename: {doc.metadata['original_file_name']} Content: {content}"
+            doc.page_content = _sanitize_content(content)
             doc.metadata = {
                 "chunk_index": idx,
-                **file.metadata,
+                **file_metadata,
                 **doc.metadata,
-                **self.processor_metadata,
+                **processor_metadata,
             }
         return docs
 
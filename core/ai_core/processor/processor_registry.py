@@ -17,7 +17,7 @@ ProcMapping: TypeAlias = dict[FileExtension | str, str]
 
 known_processors: ProcMapping = {
     FileExtension.txt: "core.ai_core.processor.impl.default_processor.TikTokenTxtProcessor",
-    FileExtension.pdf: "core.ai_core.processor.impl.default_processor.UnstructuredPDFProcessor",
+    FileExtension.pdf: "core.ai_core.processor.impl.pdf_processor.NativePDFProcessor",
     FileExtension.csv: "core.ai_core.processor.impl.default_processor.CSVProcessor",
     FileExtension.docx: "core.ai_core.processor.impl.default_processor.DOCXProcessor",
     FileExtension.doc: "core.ai_core.processor.impl.default_processor.DOCXProcessor",
@@ -1,7 +1,200 @@
+import tiktoken
+
+from enum import Enum
+from typing import Any, Iterable, List, Sequence
+
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
 from pydantic import BaseModel
 
 
+class SplitterMode(str, Enum):
+    # トークン数で分割し、段落・行・文などの自然な区切りを優先する
+    token = "token"
+    # Markdown の見出し・リスト・表に沿って分割する
+    structure = "structure"
+
+
 class SplitterConfig(BaseModel):
 
     chunk_size: int = 400
     chunk_overlap: int = 100
+    encoding_name: str = "cl100k_base"
+    mode: SplitterMode = SplitterMode.token
+
+
+# 区切り位置の優先度（大きいほど自然な区切り）
+_NO_BOUNDARY = 0
+_WORD_BOUNDARY = 1
+_SENTENCE_BOUNDARY = 2
+_LINE_BOUNDARY = 3
+_PARAGRAPH_BOUNDARY = 4
+
+_SENTENCE_ENDINGS = tuple(
+    s.encode("utf-8") for s in ("。", "．", "！", "？", "!", "?", ".", ";", "；")
+)
+
+# エンコーディング名ごとのトークン情報キャッシュ: token -> (直後で切った場合の優先度, 先頭が空白か, 先頭が UTF-8 継続バイトか)
+_token_info_cache: dict[str, dict[int, tuple[int, bool, bool]]] = {}
+
+
+class TikTokenSplitter(TextSplitter):
+    """
+    tiktoken でドキュメントを一度だけトークン化し、トークンのオフセット上で自然な区切り（段落・行・文・単語）を探してチャンクを切り出すスプリッター。
+    複数ドキュメントは tiktoken のバッチエンコードでまとめてトークン化され、各チャンクのトークン数は `chunk_size` メタデータとしてそのまま付与されます。
+
+    引数:
+    - chunk_size (int): チャンクの最大トークン数。
+    - chunk_overlap (int): 隣接するチャンク間で重複させる最大トークン数。
+    - encoding_name (str): 使用する tiktoken のエンコーディング名。
+    - num_threads (int): バッチエンコードに使用するスレッド数。
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 400,
+        chunk_overlap: int = 100,
+        encoding_name: str = "cl100k_base",
+        num_threads: int = 8,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        self._enc = tiktoken.get_encoding(encoding_name)
+        self._token_info = _token_info_cache.setdefault(encoding_name, {})
+        self._num_threads = num_threads
+
+    @classmethod
+    def from_config(cls, config: SplitterConfig, **kwargs: Any) -> "TikTokenSplitter":
+        return cls(
+            chunk_size=config.chunk_size,
+            chunk_overlap=config.chunk_overlap,
+            encoding_name=config.encoding_name,
+            **kwargs,
+        )
+
+    def split_text(self, text: str) -> List[str]:
+        return [doc.page_content for doc in self.create_documents([text])]
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        documents = list(documents)
+        return self.create_documents(
+            [doc.page_content for doc in documents],
+            [doc.metadata for doc in documents],
+        )
+
+    def create_documents(
+        self, texts: List[str], metadatas: List[dict] | None = None
+    ) -> List[Document]:
+        metadatas = metadatas or [{}] * len(texts)
+        all_tokens = self._enc.encode_ordinary_batch(
+            texts, num_threads=self._num_threads
+        )
+
+        chunks = []
+        for tokens, metadata in zip(all_tokens, metadatas, strict=False):
+            for start, end in self._split_offsets(tokens):
+                content = self._enc.decode_bytes(tokens[start:end]).decode(
+                    "utf-8", errors="replace"
+                )
+                if not content.strip():
+                    continue
+                chunks.append(
+                    Document(
+                        page_content=content,
+                        metadata={**metadata, "chunk_size": end - start},
+                    )
+                )
+        return chunks
+
+    def _split_offsets(self, tokens: Sequence[int]) -> List[tuple[int, int]]:
+        n = len(tokens)
+        size = self._chunk_size
+        overlap = self._chunk_overlap
+
+        offsets = []
+        start = 0
+        while start < n:
+            if start + size >= n:
+                offsets.append((start, n))
+                break
+
+            end = self._best_boundary(tokens, start + size // 2, start + size, latest=True)
+            if end is None:
+                end = start + size
+            offsets.append((start, end))
+
+            next_start = end
+            if overlap > 0:
+                candidate = self._best_boundary(
+                    tokens, max(start + 1, end - overlap), end - 1, latest=False
+                )
+                if candidate is not None:
+                    next_start = candidate
+            start = next_start
+        return offsets
+
+    def _best_boundary(
+        self, tokens: Sequence[int], low: int, high: int, latest: bool
+    ) -> int | None:
+        """
+        [low, high] の範囲で最も自然な区切り位置（その位置のトークンの直前で切る）を返します。
+        同じ優先度の場合、latest が True なら後ろ側、False なら前側を優先します。
+        UTF-8 の文字の途中になる位置は選択しません。
+        """
+        best_pos = None
+        best_rank = -1
+        positions = range(high, low - 1, -1) if latest else range(low, high + 1)
+        for pos in positions:
+            if pos <= 0 or pos >= len(tokens):
+                continue
+            prev_rank, _, _ = self._info(tokens[pos - 1])
+            _, starts_with_space, is_continuation = self._info(tokens[pos])
+            if is_continuation:
+                continue
+            rank = max(prev_rank, _WORD_BOUNDARY if starts_with_space else _NO_BOUNDARY)
+            if rank > best_rank:
+                best_pos, best_rank = pos, rank
+                if rank == _PARAGRAPH_BOUNDARY:
+                    break
+        return best_pos
+
+    def _info(self, token: int) -> tuple[int, bool, bool]:
+        info = self._token_info.get(token)
+        if info is None:
+            raw = self._enc.decode_single_token_bytes(token)
+            if raw.endswith(b"\n\n"):
+                rank = _PARAGRAPH_BOUNDARY
+            elif raw.endswith(b"\n"):
+                rank = _LINE_BOUNDARY
+            elif raw.rstrip().endswith(_SENTENCE_ENDINGS):
+                rank = _SENTENCE_BOUNDARY
+            elif raw[-1:].isspace():
+                rank = _WORD_BOUNDARY
+            else:
+                rank = _NO_BOUNDARY
+            info = (
+                rank,
+                raw[:1].isspace(),
+                bool(raw) and 0x80 <= raw[0] <= 0xBF,
+            )
+            self._token_info[token] = info
+        return info
+
+
+def build_splitter(config: SplitterConfig, **kwargs: Any) -> TextSplitter:
+    """
+    SplitterConfig の `mode` に応じたスプリッターを作成します。
+
+    引数:
+    - config (SplitterConfig): スプリッターの設定。
+    - **kwargs: スプリッターのコンストラクタに渡す追加の引数。
+
+    戻り値:
+    - TextSplitter: 作成されたスプリッター。
+    """
+    if config.mode == SplitterMode.structure:
+        # structure_splitter は TikTokenSplitter に依存するため、循環インポートを避けてここでインポートする
+        from core.ai_core.processor.structure_splitter import MarkdownStructureSplitter
+
+        return MarkdownStructureSplitter.from_config(config, **kwargs)
+    return TikTokenSplitter.from_config(config, **kwargs)
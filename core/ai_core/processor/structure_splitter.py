@@ -0,0 +1,315 @@
+import re
+import tiktoken
+
+from dataclasses import dataclass
+from typing import Any, Iterable, List
+
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
+
+from core.ai_core.processor.splitter import SplitterConfig, TikTokenSplitter
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_TABLE_ROW = re.compile(r"^\s*\|")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+
+_BLOCK_SEPARATOR = "\n\n"
+
+
+@dataclass
+class _Block:
+    kind: str  # "heading" | "paragraph" | "list" | "table" | "code"
+    text: str
+    heading_path: tuple[str, ...]
+    tokens: int = 0
+
+
+class MarkdownStructureSplitter(TextSplitter):
+    """
+    Markdown の構造（見出し・リスト・表・コードブロック）に沿ってチャンクを作成するスプリッター。
+    ブロックは途中で分割せずにチャンクサイズまで詰め込み、表やリストがチャンクサイズを超える場合のみ行・項目単位で分割します（表はヘッダー行を繰り返します）。
+    重複は見出しをまたがない、ブロック単位の区切りでのみ行われます。
+    各チャンクには `heading_path`（例: "第1章 > 概要"）と `chunk_size`（トークン数）メタデータが付与されます。
+
+    引数:
+    - chunk_size (int): チャンクの最大トークン数。
+    - chunk_overlap (int): 前のチャンクから引き継ぐブロックの最大トークン数。
+    - encoding_name (str): 使用する tiktoken のエンコーディング名。
+    - min_section_tokens (int | None): この値未満のセクションは次のセクションと同じチャンクにまとめます。デフォルトは chunk_size の 1/4。
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 400,
+        chunk_overlap: int = 100,
+        encoding_name: str = "cl100k_base",
+        min_section_tokens: int | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        self._enc = tiktoken.get_encoding(encoding_name)
+        self._min_section_tokens = (
+            min_section_tokens if min_section_tokens is not None else chunk_size // 4
+        )
+        # 単一ブロック（段落・コード）がチャンクサイズを超える場合のフォールバック
+        self._fallback = TikTokenSplitter(
+            chunk_size=chunk_size, chunk_overlap=0, encoding_name=encoding_name
+        )
+
+    @classmethod
+    def from_config(
+        cls, config: SplitterConfig, **kwargs: Any
+    ) -> "MarkdownStructureSplitter":
+        return cls(
+            chunk_size=config.chunk_size,
+            chunk_overlap=config.chunk_overlap,
+            encoding_name=config.encoding_name,
+            **kwargs,
+        )
+
+    def split_text(self, text: str) -> List[str]:
+        return [doc.page_content for doc in self.create_documents([text])]
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        documents = list(documents)
+        return self.create_documents(
+            [doc.page_content for doc in documents],
+            [doc.metadata for doc in documents],
+        )
+
+    def create_documents(
+        self, texts: List[str], metadatas: List[dict] | None = None
+    ) -> List[Document]:
+        metadatas = metadatas or [{}] * len(texts)
+        chunks = []
+        for text, metadata in zip(texts, metadatas, strict=False):
+            blocks = self._parse_blocks(text)
+            counts = self._enc.encode_ordinary_batch([b.text for b in blocks])
+            for block, tokens in zip(blocks, counts, strict=False):
+                block.tokens = len(tokens)
+
+            for chunk_blocks in self._pack(self._split_oversized(blocks)):
+                chunks.append(
+                    Document(
+                        page_content=_BLOCK_SEPARATOR.join(b.text for b in chunk_blocks),
+                        metadata={
+                            **metadata,
+                            "heading_path": " > ".join(_common_path(chunk_blocks)),
+                            "chunk_size": _tokens(chunk_blocks),
+                        },
+                    )
+                )
+        return chunks
+
+    def _parse_blocks(self, text: str) -> List[_Block]:
+        blocks: List[_Block] = []
+        path: list[tuple[int, str]] = []
+        lines = text.splitlines()
+        i = 0
+
+        def current_path() -> tuple[str, ...]:
+            return tuple(title for _, title in path)
+
+        while i < len(lines):
+            line = lines[i]
+            if not line.strip():
+                i += 1
+                continue
+
+            heading = _HEADING.match(line)
+            if heading:
+                level = len(heading.group(1))
+                while path and path[-1][0] >= level:
+                    path.pop()
+                path.append((level, heading.group(2)))
+                blocks.append(_Block("heading", line.strip(), current_path()))
+                i += 1
+                continue
+
+            if _FENCE.match(line):
+                fence = _FENCE.match(line).group(1)
+                j = i + 1
+                while j < len(lines) and not lines[j].strip().startswith(fence):
+                    j += 1
+                blocks.append(
+                    _Block("code", "\n".join(lines[i : j + 1]), current_path())
+                )
+                i = j + 1
+                continue
+
+            if _TABLE_ROW.match(line):
+                j = i
+                while j < len(lines) and _TABLE_ROW.match(lines[j]):
+                    j += 1
+                blocks.append(_Block("table", "\n".join(lines[i:j]), current_path()))
+                i = j
+                continue
+
+            if _LIST_ITEM.match(line):
+                j = i + 1
+                # 項目の継続行（インデント行）と後続の項目を同じリストとして扱う
+                while j < len(lines) and lines[j].strip() and (
+                    _LIST_ITEM.match(lines[j]) or lines[j].startswith((" ", "\t"))
+                ):
+                    j += 1
+                blocks.append(_Block("list", "\n".join(lines[i:j]), current_path()))
+                i = j
+                continue
+
+            j = i + 1
+            while (
+                j < len(lines)
+                and lines[j].strip()
+                and not _HEADING.match(lines[j])
+                and not _FENCE.match(lines[j])
+                and not _TABLE_ROW.match(lines[j])
+                and not _LIST_ITEM.match(lines[j])
+            ):
+                j += 1
+            blocks.append(_Block("paragraph", "\n".join(lines[i:j]), current_path()))
+            i = j
+
+        return blocks
+
+    def _split_oversized(self, blocks: List[_Block]) -> List[_Block]:
+        result = []
+        for block in blocks:
+            if block.tokens <= self._chunk_size:
+                result.append(block)
+            elif block.kind == "table":
+                result.extend(self._split_table(block))
+            elif block.kind == "list":
+                result.extend(self._split_list(block))
+            else:
+                for doc in self._fallback.create_documents([block.text]):
+                    result.append(
+                        _Block(
+                            block.kind,
+                            doc.page_content,
+                            block.heading_path,
+                            doc.metadata["chunk_size"],
+                        )
+                    )
+        return result
+
+    def _split_table(self, block: _Block) -> List[_Block]:
+        rows = block.text.split("\n")
+        header = rows[:2] if len(rows) > 1 and _TABLE_SEPARATOR.match(rows[1]) else []
+        body = rows[len(header) :]
+        header_tokens = len(self._enc.encode_ordinary("\n".join(header))) if header else 0
+        row_tokens = [len(t) for t in self._enc.encode_ordinary_batch(body)]
+
+        pieces = []
+        current: list[str] = []
+        current_tokens = header_tokens
+        for row, tokens in zip(body, row_tokens, strict=False):
+            if current and current_tokens + tokens > self._chunk_size:
+                pieces.append(
+                    _Block("table", "\n".join(header + current), block.heading_path, current_tokens)
+                )
+                current, current_tokens = [], header_tokens
+            current.append(row)
+            current_tokens += tokens
+        if current:
+            pieces.append(
+                _Block("table", "\n".join(header + current), block.heading_path, current_tokens)
+            )
+        return pieces
+
+    def _split_list(self, block: _Block) -> List[_Block]:
+        # トップレベルの項目単位で分割する
+        items: list[str] = []
+        for line in block.text.split("\n"):
+            if items and not (_LIST_ITEM.match(line) and not line.startswith((" ", "\t"))):
+                items[-1] += "\n" + line
+            else:
+                items.append(line)
+
+        item_tokens = [len(t) for t in self._enc.encode_ordinary_batch(items)]
+        pieces = []
+        current: list[str] = []
+        current_tokens = 0
+        for item, tokens in zip(items, item_tokens, strict=False):
+            if current and current_tokens + tokens > self._chunk_size:
+                pieces.append(
+                    _Block("list", "\n".join(current), block.heading_path, current_tokens)
+                )
+                current, current_tokens = [], 0
+            current.append(item)
+            current_tokens += tokens
+        if current:
+            pieces.append(
+                _Block("list", "\n".join(current), block.heading_path, current_tokens)
+            )
+        return pieces
+
+    def _pack(self, blocks: List[_Block]) -> List[List[_Block]]:
+        chunks: List[List[_Block]] = []
+        current: List[_Block] = []
+        current_tokens = 0
+
+        for block in blocks:
+            starts_section = block.kind == "heading"
+            too_big = current and current_tokens + block.tokens > self._chunk_size
+            section_done = (
+                starts_section and current_tokens >= self._min_section_tokens
+            )
+
+            if too_big or section_done:
+                # 末尾の見出しは本文と同じチャンクに入るよう次のチャンクへ移す
+                headings: List[_Block] = []
+                while current and current[-1].kind == "heading":
+                    headings.insert(0, current.pop())
+                if current:
+                    chunks.append(current)
+
+                # 見出しをまたがない場合のみ、直前のブロックを重複として引き継ぐ
+                carry = (
+                    []
+                    if starts_section or headings
+                    else self._overlap_blocks(current)
+                )
+                while carry and _tokens(carry) + block.tokens > self._chunk_size:
+                    carry.pop(0)
+                # 見出しが収まらない場合は本文のみとする（見出しは heading_path に残る）
+                if _tokens(headings) + block.tokens > self._chunk_size:
+                    headings = []
+
+                current = headings + carry
+                current_tokens = _tokens(current)
+
+            current.append(block)
+            current_tokens += block.tokens
+
+        if current and any(b.kind != "heading" for b in current):
+            chunks.append(current)
+        return chunks
+
+    def _overlap_blocks(self, blocks: List[_Block]) -> List[_Block]:
+        carry: List[_Block] = []
+        tokens = 0
+        for block in reversed(blocks):
+            if block.kind in ("heading", "table", "code"):
+                break
+            if tokens + block.tokens > self._chunk_overlap:
+                break
+            carry.insert(0, block)
+            tokens += block.tokens
+        return carry
+
+
+def _tokens(blocks: List[_Block]) -> int:
+    return sum(b.tokens for b in blocks)
+
+
+def _common_path(blocks: List[_Block]) -> tuple[str, ...]:
+    paths = [b.heading_path for b in blocks]
+    common = paths[0]
+    for path in paths[1:]:
+        n = 0
+        while n < min(len(common), len(path)) and common[n] == path[n]:
+            n += 1
+        common = common[:n]
+    return common
@@ -1,6 +1,9 @@
+import hashlib
 import logging
+import os
+import threading
 
-from IPython.display import Image, display
+from collections import OrderedDict
 
 from langchain_core.documents import Document
 from langchain_core.messages import AIMessageChunk
@@ -20,6 +23,7 @@ from core.ai_core.rag.entities.models import (
 from typing import (
     Any,
     AsyncGenerator,
+    List,
     Tuple,
 )
 
@@ -30,6 +34,63 @@ from core.ai_core.rag.node_functions.node_functions_factory import NodeFunctions
 logger = logging.getLogger("ai_core")
 
 
+class _CompiledGraphCache:
+    """
+    コンパイル済みのグラフをプロセス内で再利用するための LRU キャッシュ。
+    キーはパイプラインのクラス、検索設定と LLM 設定のハッシュ、および vector store のオブジェクト ID です
+    （キャッシュが vector store を参照している間は ID が再利用されることはありません）。
+    置き換えられた vector store のエントリは evict で削除します。
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[
+            Tuple[str, str, int], Tuple[Any, LLMEndpoint, List[str]]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(
+        pipeline: type,
+        retrieval_config: RetrievalConfig,
+        llm: LLMEndpoint,
+        vector_store: VectorStore | None,
+    ) -> Tuple[str, str, int]:
+        digest = hashlib.sha256()
+        digest.update(retrieval_config.model_dump_json().encode("utf-8"))
+        digest.update(llm.get_config().model_dump_json().encode("utf-8"))
+        pipeline_name = f"{pipeline.__module__}.{pipeline.__qualname__}"
+        return pipeline_name, digest.hexdigest(), id(vector_store)
+
+    def get(self, key: Tuple[str, str, int]) -> Tuple[Any, LLMEndpoint, List[str]] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple[str, str, int], entry: Tuple[Any, LLMEndpoint, List[str]]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, vector_store: VectorStore):
+        with self._lock:
+            for key in [k for k in self._entries if k[2] == id(vector_store)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_compiled_graphs = _CompiledGraphCache(
+    max_size=int(os.getenv("AI_COMPILED_GRAPH_CACHE_SIZE", 32))
+)
+
+
 class AiQARAGLangGraph:
     def __init__(
         self,
@@ -101,15 +162,31 @@ class AiQARAGLangGraph:
             last_chunk=True,
         )
 
+    @staticmethod
+    def evict_compiled_graphs(vector_store: VectorStore):
+        """
+        vector store を使用するコンパイル済みのグラフをキャッシュから削除します。
+        vector store を置き換えた場合に、古い vector store がメモリに残らないようにするために使用します。
+        """
+        _compiled_graphs.evict(vector_store)
+
     def create_graph(self):
         if not self.graph:
-            workflow = StateGraph(AgentState)
-
-            self._build_workflow(workflow)
-
-            self.graph = workflow.compile()
-
-            self._draw_graph()
+            # 同じ設定のグラフはコンパイル済みのものを再利用する（ノードは質問ごとの状態を持たない）
+            key = _compiled_graphs.key(
+                type(self),
+                self.retrieval_config, self.llm_endpoint, self.vector_store
+            )
+            entry = _compiled_graphs.get(key)
+            if entry is None:
+                workflow = StateGraph(AgentState)
+
+                self._build_workflow(workflow)
+
+                entry = (workflow.compile(), self.llm_endpoint, self.final_nodes)
+                _compiled_graphs.put(key, entry)
+                logger.debug("Compiled the RAG workflow graph")
+            self.graph, self.llm_endpoint, self.final_nodes = entry
         return self.graph
 
     def _build_workflow(self, workflow: StateGraph):
@@ -235,8 +312,13 @@ class AiQARAGLangGraph:
 
         return RAGResponseMetadata(**metadata, metadata_model=None)
 
-    def _draw_graph(self):
+    def draw_graph(self):
+        """
+        ワークフローのグラフを mermaid の PNG として表示します（デバッグ用、IPython が必要です）。
+        """
+        from IPython.display import Image, display
+
         try:
-            display(Image(self.graph.get_graph().draw_mermaid_png()))
+            display(Image(self.create_graph().get_graph().draw_mermaid_png()))
         except Exception as e:
             raise ValueError(f"Error drawing graph: {e}")
@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+
+from core.ai_core.utils.onnx_utils import (
+    create_session,
+    encode_inputs,
+    find_model_file,
+    load_tokenizer,
+    resolve_model_dir,
+)
+
+logger = logging.getLogger("ai_core")
+
+
+class _CrossEncoder:
+    # 読み込んだモデルはプロセス内で共有する（get_reranker は質問ごとに呼び出されるため）
+    _cache: Dict[Tuple[str, bool, int, int], "_CrossEncoder"] = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, model_name: str, quantize: bool, max_length: int, num_workers: int):
+        model_dir = resolve_model_dir(model_name)
+        threads_per_session = max(1, (os.cpu_count() or 1) // num_workers)
+        self.session = create_session(find_model_file(model_dir, quantize), threads_per_session)
+        self.tokenizer = load_tokenizer(model_dir, max_length)
+        self.executor = ThreadPoolExecutor(
+            max_workers=num_workers, thread_name_prefix="onnx-rerank"
+        )
+
+    @classmethod
+    def get(
+        cls, model_name: str, quantize: bool, max_length: int, num_workers: int
+    ) -> "_CrossEncoder":
+        key = (model_name, quantize, max_length, num_workers)
+        with cls._cache_lock:
+            if key not in cls._cache:
+                logger.debug(f"Loading cross-encoder {model_name} for reranking")
+                cls._cache[key] = cls(model_name, quantize, max_length, num_workers)
+            return cls._cache[key]
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        inputs = encode_inputs(
+            self.tokenizer, self.session, [(query, text) for text in texts]
+        )
+        logits = self.session.run(None, inputs)[0]
+        if logits.ndim == 2 and logits.shape[1] == 2:
+            # 2 クラス分類のモデルは「関連あり」の確率を使用する
+            logits = logits[:, 1] - logits[:, 0]
+        return 1 / (1 + np.exp(-logits.reshape(-1)))
+
+
+class LocalCrossEncoderRerank(BaseDocumentCompressor):
+    """
+    ONNX Runtime で cross-encoder をプロセス内の CPU 上で実行するリランカー（API キー不要）。
+    (クエリ, チャンク) の組をバッチにまとめてスレッドプールで並列にスコアリングし、
+    スコア（0〜1）をメタデータの relevance_score_key に設定して上位 top_n 件を返します。
+
+    latency_budget を指定した場合、時間内にスコアリングできなかったバッチは待たずに打ち切ります。
+    バッチは検索結果の順に投入されるため、上位の候補から優先してスコアリングされます。
+    スコアリングできたチャンクが top_n 件に満たない場合は、残りを検索結果の順で（スコアなしで）補います。
+
+    引数:
+    - model (str): モデルのディレクトリパスまたは Hugging Face Hub のリポジトリ ID。
+    - top_n (int): 返すチャンクの数。
+    - quantize (bool): int8 量子化したモデルを使用するかどうか。
+    - max_length (int): (クエリ, チャンク) の組あたりの最大トークン数。
+    - batch_size (int): 1 回の推論でスコアリングする組の数。
+    - num_workers (int): 推論を行うスレッド数。
+    - latency_budget (float | None): スコアリングにかける最大秒数。None の場合は制限しない。
+    - relevance_score_key (str): スコアを設定するメタデータのキー。
+    """
+
+    model: str
+    top_n: int = 5
+    quantize: bool = True
+    max_length: int = 512
+    batch_size: int = 16
+    num_workers: int = 2
+    latency_budget: float | None = None
+    relevance_score_key: str = "relevance_score"
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        if not documents:
+            return []
+        encoder = _CrossEncoder.get(
+            self.model, self.quantize, self.max_length, self.num_workers
+        )
+
+        start = time.perf_counter()
+        futures = [
+            encoder.executor.submit(
+                encoder.score,
+                query,
+                [doc.page_content for doc in documents[i : i + self.batch_size]],
+            )
+            for i in range(0, len(documents), self.batch_size)
+        ]
+        _, pending = wait(futures, timeout=self.latency_budget)
+        for future in pending:
+            future.cancel()
+
+        scored: List[Tuple[float, Document]] = []
+        unscored: List[Document] = []
+        for batch, future in enumerate(futures):
+            docs = documents[batch * self.batch_size : (batch + 1) * self.batch_size]
+            if future in pending:
+                unscored.extend(docs)
+                continue
+            for doc, score in zip(docs, future.result(), strict=False):
+                scored.append((float(score), doc))
+        if pending:
+            logger.warning(
+                f"Reranked {len(scored)} of {len(documents)} chunks within the latency budget "
+                f"of {self.latency_budget}s"
+            )
+        else:
+            logger.debug(
+                f"Reranked {len(documents)} chunks in {time.perf_counter() - start:.3f}s"
+            )
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        results = []
+        for score, doc in scored[: self.top_n]:
+            doc = doc.model_copy(update={"metadata": {**doc.metadata}})
+            doc.metadata[self.relevance_score_key] = score
+            results.append(doc)
+        results.extend(unscored[: self.top_n - len(results)])
+        return results
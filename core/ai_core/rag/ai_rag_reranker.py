@@ -1,10 +1,14 @@
 from typing import Sequence, Optional
 
+import numpy as np
+
 from langchain.retrievers.document_compressors import CohereRerank
 from langchain_community.document_compressors import JinaRerank
 from langchain_core.callbacks import Callbacks
 from langchain_core.documents import BaseDocumentCompressor, Document
 
+from core.ai_core.rag.ai_rag_local_reranker import LocalCrossEncoderRerank
+from core.ai_core.rag.ai_rag_retriever import SIMILARITY_SCORE_KEY
 from core.ai_core.rag.config.ai_rag_config import RetrievalConfig, DefaultRerankers
 
 
@@ -23,6 +27,53 @@ class IdempotentCompressor(BaseDocumentCompressor):
         return documents
 
 
+class ScoreCutoffCompressor(BaseDocumentCompressor):
+    """
+    リランカーを使用しない場合に、ベクトル検索の類似度（メタデータの SIMILARITY_SCORE_KEY）でチャンクを絞り込むドキュメント圧縮ツール。
+    類似度の降順に並べたとき、隣り合うチャンクの類似度の差が最大となる位置（スコアの全体の幅に対して gap_ratio 以上の場合）で
+    以降のチャンクを切り捨てます。類似度は relevance_score_key にもコピーされ、relevance_score_threshold による絞り込みに使用されます。
+
+    引数:
+    - min_chunks (int): 切り捨てた後に残す最小のチャンク数。
+    - gap_ratio (float | None): 切り捨てる位置とみなす類似度の差の、スコアの幅に対する割合。None の場合は切り捨てない。
+    - relevance_score_key (str): 類似度をコピーするメタデータのキー。
+    """
+
+    min_chunks: int = 5
+    gap_ratio: float | None = 0.2
+    relevance_score_key: str = "relevance_score"
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        if not documents or any(SIMILARITY_SCORE_KEY not in d.metadata for d in documents):
+            # 類似度がない場合（ハイブリッド検索など）はそのまま返す
+            return documents
+
+        documents = sorted(
+            documents, key=lambda d: d.metadata[SIMILARITY_SCORE_KEY], reverse=True
+        )
+        for doc in documents:
+            doc.metadata.setdefault(self.relevance_score_key, doc.metadata[SIMILARITY_SCORE_KEY])
+
+        if self.gap_ratio is None or len(documents) <= self.min_chunks:
+            return documents
+        scores = np.array([d.metadata[SIMILARITY_SCORE_KEY] for d in documents])
+        span = scores[0] - scores[-1]
+        if span <= 0:
+            return documents
+        # i 番目と i+1 番目の間で切る場合に残るのは i+1 件
+        gaps = scores[:-1] - scores[1:]
+        start = max(self.min_chunks - 1, 0)
+        cut = start + int(np.argmax(gaps[start:]))
+        if gaps[cut] < self.gap_ratio * span:
+            return documents
+        return documents[: cut + 1]
+
+
 class AIRagReranker:
     def __init__(
         self,
@@ -48,7 +99,15 @@ class AIRagReranker:
             reranker = JinaRerank(
                 model=model, top_n=top_n, jina_api_key=api_key, **kwargs
             )
+        elif supplier == DefaultRerankers.LOCAL:
+            kwargs.setdefault("latency_budget", config.latency_budget)
+            kwargs.setdefault("relevance_score_key", config.relevance_score_key)
+            reranker = LocalCrossEncoderRerank(model=model, top_n=top_n, **kwargs)
         else:
-            reranker = IdempotentCompressor()
+            reranker = ScoreCutoffCompressor(
+                min_chunks=top_n,
+                gap_ratio=config.score_gap_ratio,
+                relevance_score_key=config.relevance_score_key,
+            )
 
         return reranker
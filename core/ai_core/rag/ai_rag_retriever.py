@@ -1,17 +1,139 @@
-from langchain_core.vectorstores import VectorStore
+import asyncio
+import logging
+
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore, VectorStoreRetriever
+
+from core.ai_core.rag.config.ai_rag_config import RetrievalConfig, RetrievalMode
+
+logger = logging.getLogger("ai_core")
+
+# Metadata key of the vector similarity of a retrieved chunk (relevance score between 0 and 1)
+SIMILARITY_SCORE_KEY = "similarity_score"
+
+
+def _with_scores(results: List[tuple[Document, float]]) -> List[Document]:
+    # Copy the metadata, documents may be shared with an in-memory docstore
+    return [
+        doc.model_copy(update={"metadata": {**doc.metadata, SIMILARITY_SCORE_KEY: float(score)}})
+        for doc, score in results
+    ]
+
+
+class ScoredVectorStoreRetriever(VectorStoreRetriever):
+    """
+    Similarity search retriever that stores the relevance score of each chunk in its metadata
+    (SIMILARITY_SCORE_KEY), so that chunks can be filtered without a reranker.
+    """
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs: Any
+    ) -> List[Document]:
+        if self.search_type != "similarity":
+            return super()._get_relevant_documents(query, run_manager=run_manager, **kwargs)
+        return _with_scores(
+            self.vectorstore._similarity_search_with_relevance_scores(
+                query, **(self.search_kwargs | kwargs)
+            )
+        )
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun, **kwargs: Any
+    ) -> List[Document]:
+        if self.search_type != "similarity":
+            return await super()._aget_relevant_documents(
+                query, run_manager=run_manager, **kwargs
+            )
+        return _with_scores(
+            await self.vectorstore._asimilarity_search_with_relevance_scores(
+                query, **(self.search_kwargs | kwargs)
+            )
+        )
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that runs the vector search and the BM25 lexical search of the vector store in parallel
+    and merges both rankings with reciprocal rank fusion (score = sum of 1 / (rrf_k + rank)).
+    """
+
+    vector_store: VectorStore
+    search_kwargs: Dict[str, Any] = {}
+    rrf_k: int = 60
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector_docs = self.vector_store.similarity_search(query, **self.search_kwargs)
+        lexical_docs = self.vector_store.bm25_search(query, **self._lexical_kwargs())
+        return self._fuse(vector_docs, [doc for doc, _ in lexical_docs])
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector_docs, lexical_docs = await asyncio.gather(
+            self.vector_store.asimilarity_search(query, **self.search_kwargs),
+            asyncio.to_thread(
+                self.vector_store.bm25_search, query, **self._lexical_kwargs()
+            ),
+        )
+        return self._fuse(vector_docs, [doc for doc, _ in lexical_docs])
+
+    def _lexical_kwargs(self) -> Dict[str, Any]:
+        # Index-specific parameters (nprobe, ef_search) only apply to the vector search
+        return {
+            key: value
+            for key, value in self.search_kwargs.items()
+            if key in ("k", "filter", "fetch_k")
+        }
+
+    def _fuse(self, *rankings: List[Document]) -> List[Document]:
+        scores: Dict[str, float] = {}
+        docs: Dict[str, Document] = {}
+        for ranking in rankings:
+            for rank, doc in enumerate(ranking, start=1):
+                key = doc.id or doc.page_content
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank)
+                docs.setdefault(key, doc)
+        k = self.search_kwargs.get("k", 4)
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)[:k]
+        return [docs[key] for key in ranked]
 
 
 class AIRagRetriever:
     def __init__(
         self,
         vector_store: VectorStore | None = None,
+        retrieval_config: RetrievalConfig | None = None,
     ):
         self.vector_store = vector_store
+        self.retrieval_config = retrieval_config
 
     def get_retriever(self, **kwargs):
-        if self.vector_store:
-            retriever = self.vector_store.as_retriever(**kwargs)
-        else:
+        if not self.vector_store:
             raise ValueError("No vector store provided")
 
-        return retriever
+        if (
+            self.retrieval_config is not None
+            and self.retrieval_config.retrieval_mode == RetrievalMode.HYBRID
+        ):
+            if hasattr(self.vector_store, "bm25_search"):
+                return HybridRetriever(
+                    vector_store=self.vector_store,
+                    search_kwargs=kwargs.get("search_kwargs", {}),
+                    rrf_k=self.retrieval_config.rrf_k,
+                )
+            logger.warning(
+                f"{type(self.vector_store).__name__} has no lexical index, falling back to vector retrieval"
+            )
+
+        if self.retrieval_config is not None:
+            return ScoredVectorStoreRetriever(vectorstore=self.vector_store, **kwargs)
+        return self.vector_store.as_retriever(**kwargs)
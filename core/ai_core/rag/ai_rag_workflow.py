@@ -9,6 +9,8 @@ from core.ai_core.rag.config.langgraph_config import NodeConfig
 
 class DefaultWorkflow(str, Enum):
     RAG = "rag"
+    # Retrieves chunks for the original question while rephrasing it
+    SPECULATIVE_RAG = "speculative_rag"
 
     @property
     def nodes(self) -> List[NodeConfig]:
@@ -23,6 +25,16 @@ class DefaultWorkflow(str, Enum):
                     edges=[END],
                     tools=[{"name": CitedAnswerToolsList.SIMPLE_CITED_ANSWER}],
                 ),
-            ]
+            ],
+            self.SPECULATIVE_RAG: [
+                NodeConfig(name=START, edges=["filter_history"]),
+                NodeConfig(name="filter_history", edges=["speculative_retrieve"]),
+                NodeConfig(name="speculative_retrieve", edges=["generate_rag"]),
+                NodeConfig(
+                    name="generate_rag",
+                    edges=[END],
+                    tools=[{"name": CitedAnswerToolsList.SIMPLE_CITED_ANSWER}],
+                ),
+            ],
         }
         return workflows[self]
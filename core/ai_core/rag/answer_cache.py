@@ -0,0 +1,158 @@
+import logging
+import os
+import re
+import threading
+import time
+
+from collections import OrderedDict
+from typing import AsyncGenerator, Dict, Hashable, List, Tuple
+
+import numpy as np
+
+from core.ai_core.embedder.cached_embeddings import normalize_query
+from core.ai_core.rag.entities.models import (
+    ParsedRAGChunkResponse,
+    ParsedRAGResponse,
+    RAGResponseMetadata,
+)
+
+logger = logging.getLogger("ai_core")
+
+# 再生時に回答を文・行の区切りで分割する
+_REPLAY_SPLIT = re.compile(r"(?<=[。．.!?！？\n])")
+
+
+class SemanticAnswerCache:
+    """
+    質問の embedding が近い過去の回答を再利用するためのプロセス内キャッシュ。
+    エントリはスコープ（KnowledgeWarehouse の ID とインデックスのバージョン、検索設定など）ごとに保持され、
+    同じスコープ内で embedding のコサイン類似度がしきい値以上の質問があれば、その回答を返します。
+    スコープの最初の要素は対象の KnowledgeWarehouse のキーのタプルとし、
+    インデックスが変更された KnowledgeWarehouse のスコープは invalidate で削除されます。
+    参照されなくなったスコープも残らないよう、期限切れのエントリは追加時にすべてのスコープから定期的に削除されます。
+
+    引数:
+    - max_size (int): スコープごとに保持するエントリの最大数。
+    - ttl (float): エントリの有効期間（秒）。
+    """
+
+    _default: "SemanticAnswerCache | None" = None
+
+    def __init__(self, max_size: int = 1000, ttl: float = 86400.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._scopes: Dict[
+            Tuple[Hashable, ...],
+            OrderedDict[str, Tuple[float, np.ndarray, ParsedRAGResponse]],
+        ] = {}
+        self._lock = threading.Lock()
+        # 次にすべてのスコープから期限切れのエントリを削除する時刻
+        self._next_sweep = 0.0
+
+    @classmethod
+    def default(cls) -> "SemanticAnswerCache":
+        if cls._default is None:
+            cls._default = cls(
+                max_size=int(os.getenv("AI_ANSWER_CACHE_SIZE", 1000)),
+                ttl=float(os.getenv("AI_ANSWER_CACHE_TTL", 86400)),
+            )
+        return cls._default
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get(
+        self,
+        scope: Tuple[Hashable, ...],
+        question: str,
+        embedding: List[float],
+        threshold: float,
+    ) -> ParsedRAGResponse | None:
+        """
+        スコープ内で質問に最も近いエントリの回答を返します。
+
+        引数:
+        - scope (Tuple[Hashable, ...]): 回答を共有できる範囲を表すキー。
+        - question (str): 質問。
+        - embedding (List[float]): 質問の embedding。
+        - threshold (float): 回答を再利用するコサイン類似度の最小値。
+
+        戻り値:
+        - ParsedRAGResponse | None: 再利用できる回答。ない場合は None。
+        """
+        key = normalize_query(question)
+        now = time.monotonic()
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if not entries:
+                return None
+            for expired in [k for k, (expires_at, _, _) in entries.items() if expires_at < now]:
+                del entries[expired]
+            if not entries:
+                del self._scopes[scope]
+                return None
+
+            if key not in entries:
+                keys = list(entries)
+                matrix = np.stack([entries[k][1] for k in keys])
+                similarities = matrix @ self._normalize(embedding)
+                best = int(np.argmax(similarities))
+                if similarities[best] < threshold:
+                    return None
+                logger.debug(
+                    f"Reusing the answer to a question with similarity {similarities[best]:.3f}"
+                )
+                key = keys[best]
+            entries.move_to_end(key)
+            return entries[key][2]
+
+    def put(
+        self,
+        scope: Tuple[Hashable, ...],
+        question: str,
+        embedding: List[float],
+        response: ParsedRAGResponse,
+    ) -> None:
+        key = normalize_query(question)
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            entries = self._scopes.setdefault(scope, OrderedDict())
+            entries[key] = (now + self.ttl, self._normalize(embedding), response)
+            entries.move_to_end(key)
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+
+    def _sweep(self, now: float) -> None:
+        # 期限切れのエントリと空のスコープ（破棄された KnowledgeWarehouse のものなど）を削除する
+        for scope in list(self._scopes):
+            entries = self._scopes[scope]
+            for expired in [k for k, (expires_at, _, _) in entries.items() if expires_at < now]:
+                del entries[expired]
+            if not entries:
+                del self._scopes[scope]
+        self._next_sweep = now + min(self.ttl, 60.0)
+
+    def invalidate(self, warehouse_key: Hashable) -> None:
+        """指定した KnowledgeWarehouse のキーを含むスコープのエントリをすべて削除します。"""
+        with self._lock:
+            for scope in [s for s in self._scopes if warehouse_key in s[0]]:
+                del self._scopes[scope]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scopes.clear()
+
+    @staticmethod
+    async def areplay(
+        response: ParsedRAGResponse,
+    ) -> AsyncGenerator[ParsedRAGChunkResponse, None]:
+        """キャッシュされた回答を文ごとのチャンクとして返し、最後にメタデータのチャンクを返します。"""
+        metadata = response.metadata or RAGResponseMetadata()
+        for piece in _REPLAY_SPLIT.split(response.answer):
+            if piece:
+                yield ParsedRAGChunkResponse(answer=piece, metadata=metadata)
+        yield ParsedRAGChunkResponse(answer="", metadata=metadata, last_chunk=True)
@@ -0,0 +1,85 @@
+import hashlib
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from langchain_core.documents import Document
+
+
+def merge_chunks(results: Sequence[List[Document]], score_keys: Sequence[str]) -> List[Document]:
+    """
+    タスクごとの検索結果をまとめ、同じチャンク（ベクトル ID、または内容のハッシュが同じもの）を 1 つにします。
+    重複したチャンクのスコアは最大値を残します。
+    順序は各タスクの結果を順位ごとに交互に並べたものとし、すべてのチャンクに score_keys の最初のスコアがある場合はその降順に並べ替えます。
+
+    引数:
+    - results (Sequence[List[Document]]): タスクごとの検索結果。
+    - score_keys (Sequence[str]): まとめるスコアのメタデータのキー（優先する順）。
+
+    戻り値:
+    - List[Document]: 重複のないチャンクのリスト（メタデータはコピーされます）。
+    """
+    merged: Dict[str, Document] = {}
+    content_keys: Dict[str, str] = {}
+    for rank in range(max((len(docs) for docs in results), default=0)):
+        for docs in results:
+            if rank >= len(docs):
+                continue
+            doc = docs[rank]
+            content_hash = hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+            key = content_keys.get(content_hash, doc.id or content_hash)
+            if key not in merged:
+                merged[key] = doc.model_copy(update={"metadata": dict(doc.metadata)})
+                content_keys[content_hash] = key
+                continue
+            metadata = merged[key].metadata
+            for score_key in score_keys:
+                if score_key in doc.metadata:
+                    metadata[score_key] = max(
+                        metadata.get(score_key, doc.metadata[score_key]),
+                        doc.metadata[score_key],
+                    )
+
+    chunks = list(merged.values())
+    for score_key in score_keys:
+        if chunks and all(score_key in doc.metadata for doc in chunks):
+            chunks.sort(key=lambda doc: doc.metadata[score_key], reverse=True)
+            break
+    return chunks
+
+
+def mmr_order(relevance: np.ndarray, vectors: np.ndarray, lambda_mult: float) -> List[int]:
+    """
+    最大周辺関連性（MMR）で候補を並べ替えます。
+    各ステップで「関連度 × lambda_mult − 選択済みの候補との最大のコサイン類似度 × (1 − lambda_mult)」が最大の候補を選びます。
+    選択済みの候補との類似度は候補の行列とのベクトル積で 1 ステップごとに更新します。
+
+    引数:
+    - relevance (np.ndarray): 候補の関連度（大きいほど関連度が高い）。0〜1 に正規化して使用します。
+    - vectors (np.ndarray): 候補の埋め込みベクトルの行列。
+    - lambda_mult (float): 関連度と多様性の重み（1 の場合は関連度のみ）。
+
+    戻り値:
+    - List[int]: 選択した順の候補のインデックス。
+    """
+    n = len(relevance)
+    if n == 0:
+        return []
+    relevance = np.asarray(relevance, dtype=np.float32)
+    span = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / span if span > 0 else np.ones(n, np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    order: List[int] = []
+    for _ in range(n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        selected = int(np.argmax(scores))
+        order.append(selected)
+        available[selected] = False
+        np.maximum(max_similarity, vectors @ vectors[selected], out=max_similarity)
+    return order
@@ -11,14 +11,25 @@ from core.ai_core.utils.utils import normalize_to_env_variable_name
 class DefaultRerankers(str, Enum):
     COHERE = "cohere"
     JINA = "jina"
+    LOCAL = "local"  # ONNX cross-encoder run in-process on CPU (no API key)
 
     @property
     def default_model(self) -> str:
         return {
             self.COHERE: "rerank-multilingual-v3.0",
             self.JINA: "jina-reranker-v2-base-multilingual",
+            self.LOCAL: "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1",
         }[self]
 
+    @property
+    def requires_api_key(self) -> bool:
+        return self != self.LOCAL
+
+
+class RetrievalMode(str, Enum):
+    VECTOR = "vector"
+    HYBRID = "hybrid"  # Vector search fused with BM25 lexical search (reciprocal rank fusion)
+
 
 class RerankerConfig(AIBaseConfig):
     supplier: DefaultRerankers | None = None
@@ -27,6 +38,11 @@ class RerankerConfig(AIBaseConfig):
     api_key: str | None = None
     relevance_score_threshold: float | None = None
     relevance_score_key: str = "relevance_score"
+    # Local reranker: maximum seconds spent scoring chunks (None for no limit)
+    latency_budget: float | None = None
+    # Without a reranker: cut the retrieved chunks at the largest drop in vector similarity if the drop is
+    # at least this share of the score range (None keeps all chunks). At least top_n chunks are kept.
+    score_gap_ratio: float | None = 0.2
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -36,7 +52,7 @@ class RerankerConfig(AIBaseConfig):
         if self.model is None and self.supplier is not None:
             self.model = self.supplier.default_model
 
-        if self.supplier:
+        if self.supplier and self.supplier.requires_api_key:
             api_key_var = f"{normalize_to_env_variable_name(self.supplier)}_API_KEY"
             self.api_key = os.getenv(api_key_var)
 
@@ -53,9 +69,35 @@ class RetrievalConfig(AIBaseConfig):
     max_history: int = 10
     max_files: int = 20
     k: int = 40  # Number of chunks returned by the retriever
+    # Search-time overrides for approximate vector indexes (None keeps the index defaults)
+    nprobe: int | None = None  # IVF: number of clusters to visit
+    ef_search: int | None = None  # HNSW: size of the candidate list
+    retrieval_mode: RetrievalMode = RetrievalMode.VECTOR
+    rrf_k: int = 60  # Rank constant of the reciprocal rank fusion in hybrid mode
+    # Order the chunks merged across tasks with maximal marginal relevance (None keeps the relevance order):
+    # 1 ranks by relevance only, lower values favour chunks that differ from the ones already selected
+    mmr_lambda: float | None = None
+    chunk_token_budget: int | None = None  # Maximum number of tokens of the retrieved chunks
+    # speculative_retrieve: minimum cosine similarity between the original and the condensed question
+    # to reuse the chunks retrieved for the original question
+    speculative_similarity_threshold: float = 0.9
+    # Only rephrase questions that refer to the chat history (rule-based check, no LLM call otherwise)
+    skip_standalone_rephrase: bool = True
+    # Reuse the answer to an earlier question of the same warehouse whose embedding similarity reaches
+    # this threshold (None disables the semantic answer cache)
+    answer_cache_threshold: float | None = None
     prompt: str | None = None
     workflow_config: WorkflowConfig = WorkflowConfig(nodes=DefaultWorkflow.RAG.nodes)
 
     def __init__(self, **data):
         super().__init__(**data)
         self.llm_config.set_api_key(force_reset=False)
+
+    def search_kwargs(self, k: int | None = None) -> dict:
+        """Build the retriever's search_kwargs, including the index search overrides that are set."""
+        kwargs = {"k": k if k is not None else self.k}
+        if self.nprobe is not None:
+            kwargs["nprobe"] = self.nprobe
+        if self.ef_search is not None:
+            kwargs["ef_search"] = self.ef_search
+        return kwargs
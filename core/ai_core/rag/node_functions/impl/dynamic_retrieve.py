@@ -64,8 +64,10 @@ class DynamicRetrieve(NodeFunctionBase):
             reranker = AIRagReranker(self.retrieval_config).get_reranker(**kwargs)
 
             k = max([top_n * 2, self.retrieval_config.k])
-            kwargs = {"search_kwargs": {"k": k}}
-            base_retriever = AIRagRetriever(self.vector_store).get_retriever(**kwargs)
+            kwargs = {"search_kwargs": self.retrieval_config.search_kwargs(k)}
+            base_retriever = AIRagRetriever(
+                self.vector_store, self.retrieval_config
+            ).get_retriever(**kwargs)
 
             if i > 1:
                 logging.info(
@@ -85,12 +87,10 @@ class DynamicRetrieve(NodeFunctionBase):
             # Gather all the responses asynchronously
             responses = await asyncio.gather(*async_tasks) if async_tasks else []
 
-            docs = []
-            _n = []
-            for response in responses:
-                _docs = self.filter_chunks_by_relevance(response)
-                _n.append(len(_docs))
-                docs += _docs
+            results = [self.filter_chunks_by_relevance(r) for r in responses]
+            _n = [len(_docs) for _docs in results]
+            # 複数のタスクで取得された同じチャンクは 1 つにまとめる
+            docs = self.select_chunks(results)
 
             if not docs:
                 break
@@ -1,4 +1,5 @@
 import asyncio
+import logging
 
 from langchain_core.vectorstores import VectorStore
 
@@ -6,6 +7,9 @@ from core.ai_core.llm import LLMEndpoint
 from core.ai_core.rag.config.ai_rag_config import RetrievalConfig
 from core.ai_core.rag.node_functions.node_function_base import NodeFunctionBase, AgentState
 from core.ai_core.rag.prompts import custom_prompts
+from core.ai_core.rag.question_classifier import depends_on_history
+
+logger = logging.getLogger("ai_core")
 
 
 class RephraseQuestion(NodeFunctionBase):
@@ -38,9 +42,19 @@ class RephraseQuestion(NodeFunctionBase):
             else [state["messages"][0].content]
         )
 
+        # 履歴に依存しない質問はそのまま独立した質問として使用する（LLM を呼び出さない）
+        if self.retrieval_config.skip_standalone_rephrase:
+            if not len(state["chat_history"]):
+                rephrase = [False] * len(tasks)
+            else:
+                rephrase = [depends_on_history(task) for task in tasks]
+        else:
+            rephrase = [True] * len(tasks)
+        logger.debug(f"Rephrasing {sum(rephrase)} of {len(tasks)} questions")
+
         # Prepare the async tasks for all user tasks
         async_tasks = []
-        for task in tasks:
+        for task in (task for task, needed in zip(tasks, rephrase) if needed):
             msg = custom_prompts.CONDENSE_QUESTION_PROMPT.format(
                 chat_history=state["chat_history"].to_list(),
                 question=task,
@@ -51,11 +65,11 @@ class RephraseQuestion(NodeFunctionBase):
             async_tasks.append(model.ainvoke(msg))
 
         # Gather all the responses asynchronously
-        responses = await asyncio.gather(*async_tasks) if async_tasks else []
+        responses = iter(await asyncio.gather(*async_tasks) if async_tasks else [])
 
         # Replace each question with its condensed version
         condensed_questions = []
-        for response in responses:
-            condensed_questions.append(response.content)
+        for task, needed in zip(tasks, rephrase):
+            condensed_questions.append(next(responses).content if needed else task)
 
         return {**state, "tasks": condensed_questions}
\ No newline at end of file
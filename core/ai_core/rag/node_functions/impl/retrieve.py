@@ -1,6 +1,9 @@
 import asyncio
 
+from typing import List
+
 from langchain.retrievers import ContextualCompressionRetriever
+from langchain_core.documents import Document
 from langchain_core.vectorstores import VectorStore
 
 from core.ai_core.llm import LLMEndpoint
@@ -45,12 +48,27 @@ class Retrieve(NodeFunctionBase):
         if not tasks:
             return {**state, "docs": []}
 
-        kwargs = {
-            "search_kwargs": {
-                "k": self.retrieval_config.k,
-            }
-        }
-        base_retriever = AIRagRetriever(self.vector_store).get_retriever(**kwargs)
+        responses = await self.aretrieve_tasks(tasks)
+
+        # 複数のタスクで取得された同じチャンクは 1 つにまとめる
+        docs = self.select_chunks(responses)
+
+        return {**state, "docs": docs}
+
+    async def aretrieve_tasks(self, tasks: List[str]) -> List[List[Document]]:
+        """
+        Retrieve and rerank the chunks of each task concurrently
+
+        Args:
+            tasks: The questions to retrieve chunks for
+
+        Returns:
+            list: The chunks of each task, filtered by relevance
+        """
+        kwargs = {"search_kwargs": self.retrieval_config.search_kwargs()}
+        base_retriever = AIRagRetriever(
+            self.vector_store, self.retrieval_config
+        ).get_retriever(**kwargs)
 
         kwargs = {"top_n": self.retrieval_config.reranker_config.top_n}
         reranker = AIRagReranker(self.retrieval_config).get_reranker(**kwargs)
@@ -68,9 +86,4 @@ class Retrieve(NodeFunctionBase):
         # Gather all the responses asynchronously
         responses = await asyncio.gather(*async_tasks) if async_tasks else []
 
-        docs = []
-        for response in responses:
-            _docs = self.filter_chunks_by_relevance(response)
-            docs += _docs
-
-        return {**state, "docs": docs}
+        return [self.filter_chunks_by_relevance(response) for response in responses]
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+
+from typing import List
+
+import numpy as np
+
+from langchain_core.vectorstores import VectorStore
+
+from core.ai_core.llm import LLMEndpoint
+from core.ai_core.rag.config.ai_rag_config import RetrievalConfig
+from core.ai_core.rag.node_functions.impl.rephrase_question import RephraseQuestion
+from core.ai_core.rag.node_functions.impl.retrieve import Retrieve
+from core.ai_core.rag.node_functions.node_function_base import AgentState
+
+logger = logging.getLogger("ai_core")
+
+
+class SpeculativeRetrieve(Retrieve):
+    name = "speculative_retrieve"
+    is_async = True
+
+    def __init__(
+        self,
+        retrieval_config: RetrievalConfig,
+        llm: LLMEndpoint,
+        vector_store: VectorStore | None = None,
+    ):
+        super().__init__(
+            retrieval_config=retrieval_config, llm=llm, vector_store=vector_store
+        )
+        self.rephrase_question = RephraseQuestion(
+            retrieval_config=retrieval_config, llm=llm, vector_store=vector_store
+        )
+
+    async def arun(self, state: AgentState) -> AgentState:
+        """
+        Rephrase the questions and retrieve chunks for the original questions at the same time.
+        The speculative chunks of a task are kept when its condensed question is similar enough
+        to the original one, the other tasks are retrieved again with the condensed question.
+
+        Args:
+            state (messages): The current state
+
+        Returns:
+            dict: The updated state with re-phrased questions and the retrieved chunks
+        """
+
+        tasks = (
+            state["tasks"]
+            if "tasks" in state and state["tasks"]
+            else [state["messages"][0].content]
+        )
+
+        rephrased, speculative = await asyncio.gather(
+            self.rephrase_question.arun({**state, "tasks": tasks}),
+            self.aretrieve_tasks(tasks),
+        )
+        condensed_tasks = rephrased["tasks"]
+
+        similarities = await self._asimilarities(tasks, condensed_tasks)
+        threshold = self.retrieval_config.speculative_similarity_threshold
+        missed = [i for i, s in enumerate(similarities) if s < threshold]
+        logger.debug(
+            f"Reusing speculative retrieval for {len(tasks) - len(missed)} of {len(tasks)} tasks"
+        )
+
+        responses = list(speculative)
+        if missed:
+            retried = await self.aretrieve_tasks([condensed_tasks[i] for i in missed])
+            for i, docs in zip(missed, retried, strict=False):
+                responses[i] = docs
+
+        # 複数のタスクで取得された同じチャンクは 1 つにまとめる
+        docs = self.select_chunks(responses)
+
+        return {**state, "tasks": condensed_tasks, "docs": docs}
+
+    async def _asimilarities(
+        self, tasks: List[str], condensed_tasks: List[str]
+    ) -> List[float]:
+        embeddings = self.vector_store.embeddings if self.vector_store else None
+        if embeddings is None:
+            return [
+                1.0 if task.strip() == condensed.strip() else 0.0
+                for task, condensed in zip(tasks, condensed_tasks, strict=False)
+            ]
+
+        # 元の質問の埋め込みは検索時にクエリの埋め込みキャッシュに保存されている
+        vectors = await asyncio.gather(
+            *(embeddings.aembed_query(text) for text in [*tasks, *condensed_tasks])
+        )
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        n = len(tasks)
+        return np.einsum("ij,ij->i", vectors[:n], vectors[n:]).tolist()
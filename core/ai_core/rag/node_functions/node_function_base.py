@@ -3,6 +3,8 @@ import logging
 from abc import ABC, abstractmethod
 from typing import Any, Type, Dict, List, Tuple, TypedDict, Annotated, Sequence
 
+import numpy as np
+
 from langchain_core.documents import Document
 from langchain_core.messages import BaseMessage
 from langchain_core.prompts import BasePromptTemplate, format_document
@@ -11,6 +13,8 @@ from langgraph.graph import add_messages
 from pydantic import BaseModel
 
 from core.ai_core.llm import LLMEndpoint
+from core.ai_core.rag.ai_rag_retriever import SIMILARITY_SCORE_KEY
+from core.ai_core.rag.chunk_selection import merge_chunks, mmr_order
 from core.ai_core.rag.config.ai_rag_config import RetrievalConfig
 from core.ai_core.rag.entities.chat import ChatHistory
 from core.ai_core.rag.prompts import custom_prompts
@@ -141,6 +145,49 @@ class NodeFunctionBase(ABC):
 
         return filtered_chunks
 
+    def select_chunks(self, results: List[List[Document]]) -> List[Document]:
+        """
+        タスクごとの検索結果から重複したチャンクを取り除き、1 つのリストにまとめます。
+        mmr_lambda が設定されている場合は MMR で多様なチャンクが先になるように並べ替え、
+        chunk_token_budget が設定されている場合はトークン数の合計が上限を超えないように末尾のチャンクを取り除きます。
+        """
+        config = self.retrieval_config
+        score_keys = [config.reranker_config.relevance_score_key, SIMILARITY_SCORE_KEY]
+        chunks = merge_chunks(results, score_keys)
+        n_retrieved = sum(len(docs) for docs in results)
+
+        if config.mmr_lambda is not None and len(chunks) > 1:
+            vectors = None
+            if hasattr(self.vector_store, "get_vectors") and all(doc.id for doc in chunks):
+                vectors = self.vector_store.get_vectors([doc.id for doc in chunks])
+            score_key = next(
+                (k for k in score_keys if all(k in doc.metadata for doc in chunks)), None
+            )
+            if vectors is None:
+                logger.debug("Chunk vectors are not available, skipping MMR")
+            else:
+                # スコアがない場合は順位を関連度とする
+                relevance = np.array(
+                    [
+                        doc.metadata[score_key] if score_key else -rank
+                        for rank, doc in enumerate(chunks)
+                    ],
+                    dtype=np.float32,
+                )
+                chunks = [chunks[i] for i in mmr_order(relevance, vectors, config.mmr_lambda)]
+
+        if config.chunk_token_budget is not None:
+            selected, tokens = [], 0
+            for doc in chunks:
+                tokens += self.llm_endpoint.count_tokens(doc.page_content)
+                if selected and tokens > config.chunk_token_budget:
+                    break
+                selected.append(doc)
+            chunks = selected
+
+        logger.debug(f"Selected {len(chunks)} of {n_retrieved} retrieved chunks")
+        return chunks
+
     def bind_tools_to_llm(self, node_name: str):
         if self.llm_endpoint.supports_func_calling():
             tools = self.retrieval_config.workflow_config.get_node_tools(node_name)
@@ -0,0 +1,58 @@
+import re
+
+# 直前の会話を指す代名詞・指示語
+# one / there / then / same や関係代名詞の that は単独の質問にも頻出するため含めない。
+# this / that は質問の先頭・末尾にある場合と "this one" の形の場合のみ、these / those は関係節を導かない場合のみ指示語とみなす
+_EN_REFERENCES = re.compile(
+    r"\b(it|its|he|him|his|she|her|hers|they|them|their|theirs|former|latter)\b"
+    r"|\b(these|those)\b(?!\s+(who|whose|which|that)\b)"
+    r"|^(this|that)\b"
+    r"|\b(this|that)(\s+ones?)?[\s?？!！.]*$"
+    r"|\b(this|that)\s+ones?\b"
+    r"|\b(the\s+above|mentioned\s+above|previous\s+(answer|question|response|message|one)s?)\b",
+    re.IGNORECASE,
+)
+_JA_REFERENCES = re.compile(
+    r"(それ|これ|あれ|その|この|あの|そこ|ここ|あそこ|そちら|こちら|彼|彼女|前者|後者|"
+    r"上記|前述|先ほど|さっき|同じ|同様)"
+)
+# 前の質問の続きであることを示す書き出し
+_EN_CONTINUATIONS = re.compile(
+    r"^\s*(and|also|but|so|then|what about|how about|why not|more|tell me more|"
+    r"what else|anything else|same for|and if|or)\b",
+    re.IGNORECASE,
+)
+_JA_CONTINUATIONS = re.compile(
+    r"^\s*(また|では|じゃあ|それで|それでは|ほかに|他に|さらに|もっと|あと|ちなみに)"
+)
+_CJK = re.compile(r"[぀-ヿ㐀-鿿ｦ-ﾟ]")
+
+# これより短い質問は省略された追加の質問とみなす
+_MAX_FOLLOW_UP_WORDS = 3
+_MAX_FOLLOW_UP_CJK_CHARS = 6
+
+
+def depends_on_history(question: str) -> bool:
+    """
+    質問がチャット履歴を参照しているかどうかをルールで判定します。
+    代名詞・指示語、前の質問の続きであることを示す書き出し、省略された短い追加の質問を履歴に依存するものとみなします。
+    判定に迷う場合は True を返します（履歴を使用した言い換えが行われるだけのため）。
+
+    引数:
+    - question (str): 判定する質問。
+
+    戻り値:
+    - bool: 質問を理解するためにチャット履歴が必要な場合は True。
+    """
+    text = question.strip()
+    if not text:
+        return True
+    if _EN_REFERENCES.search(text) or _JA_REFERENCES.search(text):
+        return True
+    if _EN_CONTINUATIONS.search(text) or _JA_CONTINUATIONS.search(text):
+        return True
+
+    body = re.sub(r"[\s?？!！。.、,]+$", "", text)
+    if _CJK.search(body):
+        return len(re.sub(r"\s", "", body)) <= _MAX_FOLLOW_UP_CJK_CHARS
+    return len(body.split()) <= _MAX_FOLLOW_UP_WORDS
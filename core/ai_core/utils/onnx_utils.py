@@ -0,0 +1,119 @@
+import logging
+import os
+
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger("ai_core")
+
+# 量子化済みモデルとして優先的に使用するファイル名
+_QUANTIZED_FILE_NAMES = ("model_int8.onnx", "model_quantized.onnx", "model_qint8_avx512.onnx")
+_MODEL_FILE_NAMES = ("model.onnx", "model_optimized.onnx")
+
+
+def resolve_model_dir(model_name_or_path: str) -> Path:
+    """
+    ローカルのディレクトリ、または Hugging Face Hub のリポジトリ ID から ONNX モデルのディレクトリを取得します。
+    リポジトリ ID の場合、ONNX モデルとトークナイザーのみを環境変数 `AI_ONNX_MODEL_CACHE`（デフォルトは `~/.cache/ai/onnx`）にダウンロードします。
+
+    引数:
+    - model_name_or_path (str): モデルのディレクトリパスまたはリポジトリ ID。
+
+    戻り値:
+    - Path: `tokenizer.json` と ONNX モデルを含むディレクトリ。
+    """
+    path = Path(model_name_or_path).expanduser()
+    if path.is_dir():
+        return path
+
+    from huggingface_hub import snapshot_download
+
+    cache_dir = Path(os.getenv("AI_ONNX_MODEL_CACHE", "~/.cache/ai/onnx")).expanduser()
+    return Path(
+        snapshot_download(
+            repo_id=model_name_or_path,
+            cache_dir=cache_dir,
+            allow_patterns=["*.json", "*.onnx", "onnx/*", "*.txt", "*.model"],
+        )
+    )
+
+
+def find_model_file(model_dir: Path, quantize: bool) -> Path:
+    """
+    モデルディレクトリ内の ONNX ファイルを探します。
+    quantize が True の場合は int8 量子化済みのファイルを優先し、存在しない場合は動的量子化して `model_int8.onnx` として保存します。
+    """
+    candidates = [model_dir, model_dir / "onnx"]
+
+    if quantize:
+        for directory in candidates:
+            for name in _QUANTIZED_FILE_NAMES:
+                if (directory / name).exists():
+                    return directory / name
+
+    for directory in candidates:
+        for name in _MODEL_FILE_NAMES:
+            if (directory / name).exists():
+                model_file = directory / name
+                return quantize_model(model_file) if quantize else model_file
+
+    raise FileNotFoundError(f"Can't find an ONNX model in {model_dir}")
+
+
+def quantize_model(model_file: Path) -> Path:
+    """ONNX モデルの重みを int8 に動的量子化し、同じディレクトリに保存します。"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    output = model_file.with_name("model_int8.onnx")
+    if not output.exists():
+        logger.info(f"Quantizing {model_file} to int8")
+        tmp_output = output.with_suffix(".tmp.onnx")
+        quantize_dynamic(str(model_file), str(tmp_output), weight_type=QuantType.QInt8)
+        os.replace(tmp_output, output)
+    return output
+
+
+def create_session(model_file: Path, num_threads: int | None = None):
+    """
+    CPU 上で実行する onnxruntime の InferenceSession を作成します。
+
+    引数:
+    - model_file (Path): ONNX モデルファイル。
+    - num_threads (int | None): セッションあたりの演算スレッド数。None の場合は onnxruntime のデフォルト。
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+    return ort.InferenceSession(
+        str(model_file), sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+def load_tokenizer(model_dir: Path, max_length: int):
+    """`tokenizer.json` を読み込み、切り詰めとパディングを有効にした tokenizers の Tokenizer を返します。"""
+    from tokenizers import Tokenizer
+
+    tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+    tokenizer.enable_truncation(max_length=max_length)
+    pad_id = tokenizer.token_to_id("[PAD]")
+    if pad_id is None:
+        pad_id = tokenizer.token_to_id("<pad>") or 0
+    tokenizer.enable_padding(pad_id=pad_id, pad_token=tokenizer.id_to_token(pad_id))
+    return tokenizer
+
+
+def encode_inputs(tokenizer, session, texts: list[str]) -> dict[str, np.ndarray]:
+    """テキストをトークン化し、セッションが要求する入力（input_ids、attention_mask、token_type_ids）を作成します。"""
+    encodings = tokenizer.encode_batch(texts)
+    inputs = {
+        "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+        "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+    }
+    input_names = {i.name for i in session.get_inputs()}
+    return {name: value for name, value in inputs.items() if name in input_names}
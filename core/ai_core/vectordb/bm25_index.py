@@ -0,0 +1,143 @@
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger("ai_core")
+
+# 英数字の語（"ABC-1234" や "v1.2" のような型番・品番は 1 語として扱う）
+_WORD = re.compile(r"[0-9a-z]+(?:[-_./][0-9a-z]+)*")
+_WORD_SEPARATORS = re.compile(r"[-_./]")
+# ひらがな・カタカナ・CJK 統合漢字・ハングル
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    BM25 用にテキストをトークン化します。
+    NFKC 正規化と小文字化の後、英数字は語単位（区切り記号を含む型番は区切りを除いた形も追加）、
+    日本語・中国語・韓国語の連続した文字は文字 bigram（1 文字のみの場合は unigram）に分割します。
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for word in _WORD.findall(text):
+        tokens.append(word)
+        if _WORD_SEPARATORS.search(word):
+            # "abc-1234" と "abc1234" のどちらの表記でも一致させる
+            tokens.append(_WORD_SEPARATORS.sub("", word))
+    for run in _CJK.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    ドキュメント ID をキーとする BM25 の転置インデックス。
+    ドキュメントごとの語の出現回数を保持し、追加・削除をインデックス全体を作り直さずに反映します。
+
+    引数:
+    - k1 (float): 語の出現回数の飽和パラメータ。
+    - b (float): 文書長の正規化の強さ。
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, documents: Iterable[Tuple[str, str]]) -> None:
+        """(ドキュメント ID, テキスト) の組をインデックスに追加します。既存の ID は置き換えられます。"""
+        terms = [(doc_id, dict(Counter(tokenize(text)))) for doc_id, text in documents]
+        with self._lock:
+            for doc_id, doc_terms in terms:
+                self._add_terms(doc_id, doc_terms)
+
+    def _add_terms(self, doc_id: str, terms: Dict[str, int]) -> None:
+        if doc_id in self._doc_terms:
+            self._delete(doc_id)
+        self._doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def delete(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for doc_id in ids:
+                self._delete(doc_id)
+
+    def _delete(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, limit: int | None = None) -> List[Tuple[str, float]]:
+        """クエリに一致するドキュメントの ID と BM25 スコアを、スコアの降順で最大 limit 件返します。"""
+        terms = set(tokenize(query))
+        scores: Dict[str, float] = {}
+        with self._lock:
+            n = len(self._doc_terms)
+            if n == 0:
+                return []
+            avg_length = self._total_length / n
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length
+                    )
+                    scores[doc_id] = (
+                        scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                    )
+        if limit is not None:
+            return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+    def save(self, path: Path | str) -> None:
+        """ドキュメントごとの語の出現回数を JSON として一時ファイル経由でアトミックに保存します。"""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with self._lock, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"k1": self.k1, "b": self.b, "documents": self._doc_terms},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path | str) -> "BM25Index":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        for doc_id, terms in data["documents"].items():
+            index._add_terms(doc_id, terms)
+        return index
@@ -0,0 +1,158 @@
+import logging
+import os
+
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+
+from core.ai_core.vectordb.vectordb_config import ReductionConfig, ReductionMethod
+
+logger = logging.getLogger("ai_core")
+
+
+class DimensionReducer:
+    """
+    保存するベクトルの次元を削減する変換。
+    PCA（サンプルで学習）または先頭次元への切り詰め（Matryoshka 学習済みモデル向け）を行い、必要に応じて L2 正規化します。
+    ドキュメントとクエリの両方に同じ変換を適用するため、ReducedEmbeddings と組み合わせて使用します。
+
+    プロパティ:
+    - config (ReductionConfig): 次元削減の設定。
+    - recall (float | None): 学習時に測定した、元の次元に対する近傍検索の recall@k。
+    """
+
+    FILE_NAME = "reducer.npz"
+
+    def __init__(self, config: ReductionConfig):
+        self.config = config
+        self.mean: np.ndarray | None = None
+        self.components: np.ndarray | None = None
+        self.recall: float | None = None
+
+    def fit(self, vectors: np.ndarray) -> "DimensionReducer":
+        """
+        サンプルのベクトルで変換を学習し、元の次元に対する recall を測定します。
+
+        引数:
+        - vectors (np.ndarray): 元の次元のベクトル（n x d）。
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.config.dimension >= vectors.shape[1]:
+            raise ValueError(
+                f"Target dimension {self.config.dimension} must be smaller than "
+                f"the embedding dimension {vectors.shape[1]}"
+            )
+
+        rng = np.random.default_rng(0)
+        if len(vectors) > self.config.sample_size:
+            sample = vectors[
+                rng.choice(len(vectors), self.config.sample_size, replace=False)
+            ]
+        else:
+            sample = vectors
+
+        if self.config.method == ReductionMethod.pca:
+            self.mean = sample.mean(axis=0)
+            # 特異値分解の右特異ベクトルが主成分になる
+            _, _, vt = np.linalg.svd(sample - self.mean, full_matrices=False)
+            self.components = vt[: self.config.dimension].astype(np.float32)
+
+        self.recall = self._measure_recall(sample)
+        logger.info(
+            f"Fitted {self.config.method.value} reducer {vectors.shape[1]} -> "
+            f"{self.config.dimension} dims (recall@{self.config.recall_k}={self.recall:.3f})"
+        )
+        return self
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.config.method == ReductionMethod.pca:
+            if self.components is None:
+                raise ValueError("Can't transform vectors before fitting the reducer")
+            reduced = (vectors - self.mean) @ self.components.T
+        else:
+            reduced = vectors[..., : self.config.dimension]
+
+        if self.config.normalize:
+            reduced = reduced / np.clip(
+                np.linalg.norm(reduced, axis=-1, keepdims=True), 1e-12, None
+            )
+        return reduced.astype(np.float32)
+
+    def _measure_recall(self, sample: np.ndarray) -> float:
+        # サンプル内のベクトルをクエリとして、削減前後の上位 k 件の一致率を測定する
+        k = min(self.config.recall_k, len(sample) - 1)
+        n_queries = min(self.config.recall_queries, len(sample))
+        if k <= 0 or n_queries == 0:
+            return 1.0
+
+        reduced = self.transform(sample)
+        hits = 0
+        for i in range(n_queries):
+            full = _top_k(sample, sample[i], k, exclude=i)
+            approx = _top_k(reduced, reduced[i], k, exclude=i)
+            hits += len(set(full) & set(approx))
+        return hits / (n_queries * k)
+
+    def save(self, folder_path: str | Path) -> Path:
+        path = Path(folder_path) / self.FILE_NAME
+        arrays = {"config": np.array(self.config.model_dump_json())}
+        if self.mean is not None:
+            arrays["mean"] = self.mean
+            arrays["components"] = self.components
+        if self.recall is not None:
+            arrays["recall"] = np.array(self.recall)
+
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, folder_path: str | Path) -> "DimensionReducer":
+        with np.load(Path(folder_path) / cls.FILE_NAME) as data:
+            reducer = cls(ReductionConfig.model_validate_json(str(data["config"])))
+            if "mean" in data:
+                reducer.mean = data["mean"]
+                reducer.components = data["components"]
+            if "recall" in data:
+                reducer.recall = float(data["recall"])
+        return reducer
+
+
+def _top_k(vectors: np.ndarray, query: np.ndarray, k: int, exclude: int) -> np.ndarray:
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    distances[exclude] = np.inf
+    return np.argpartition(distances, k)[:k]
+
+
+class ReducedEmbeddings(Embeddings):
+    """
+    ラップした Embeddings の出力に DimensionReducer を適用する Embeddings。
+    vector store の embedding 関数として使用し、ドキュメントとクエリに同じ次元削減を適用します。
+
+    引数:
+    - embeddings (Embeddings): ラップする Embeddings。
+    - reducer (DimensionReducer): 学習済みの DimensionReducer。
+    """
+
+    def __init__(self, embeddings: Embeddings, reducer: DimensionReducer) -> None:
+        self.embeddings = embeddings
+        self.reducer = reducer
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.reducer.transform(self.embeddings.embed_documents(texts)).tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = await self.embeddings.aembed_documents(texts)
+        return self.reducer.transform(vectors).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.reducer.transform(self.embeddings.embed_query(text)).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = await self.embeddings.aembed_query(text)
+        return self.reducer.transform(vector).tolist()
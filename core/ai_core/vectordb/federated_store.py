@@ -0,0 +1,226 @@
+import asyncio
+import heapq
+import logging
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger("ai_core")
+
+_executors: Dict[int, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(max_workers: int | None) -> ThreadPoolExecutor:
+    # 検索ごとに作成される FederatedVectorStore がスレッドを残さないよう、スレッドプールはプロセス内で共有する
+    max_workers = max_workers or os.cpu_count() or 1
+    with _executors_lock:
+        if max_workers not in _executors:
+            _executors[max_workers] = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="federated-search",
+            )
+        return _executors[max_workers]
+
+
+class FederatedVectorStore(VectorStore):
+    """
+    複数の vector store（シャード）を 1 つの vector store として検索するための読み取り専用の VectorStore。
+    クエリの埋め込みは Embeddings ごとに 1 回だけ計算し、各シャードの検索はスレッドプールで並列に実行します
+    （FAISS は検索中に GIL を解放するため、検索時間は最も遅いシャードの時間に近くなります）。
+    結果は各シャードの関連度スコア（0〜1、大きいほど関連度が高い）でヒープを使用してマージされます。
+    同じ距離の種類のシャード間では、関連度スコアの順序は距離の順序と一致します。
+
+    引数:
+    - shards (Sequence[VectorStore]): 検索する vector store のリスト。
+    - max_workers (int | None): 検索に使用するスレッドプールのスレッド数（デフォルトは CPU 数）。同じスレッド数のスレッドプールはインスタンス間で共有されます。
+    """
+
+    def __init__(
+        self, shards: Sequence[VectorStore], max_workers: int | None = None
+    ) -> None:
+        if not shards:
+            raise ValueError("At least one vector store is required")
+        self.shards = list(shards)
+        self._executor = _get_executor(max_workers)
+        self._relevance_fns = [self._relevance_fn(shard) for shard in self.shards]
+
+    @staticmethod
+    def _relevance_fn(shard: VectorStore) -> Callable[[float], float]:
+        try:
+            return shard._select_relevance_score_fn()
+        except NotImplementedError:
+            logger.warning(
+                f"{type(shard).__name__} has no relevance score function, ranking by negated distance"
+            )
+            return lambda score: -score
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.shards[0].embeddings
+
+    def _embedding_groups(self) -> Dict[int, Tuple[Embeddings, List[int]]]:
+        # 同じ Embeddings を使用するシャードはクエリの埋め込みを共有する
+        groups: Dict[int, Tuple[Embeddings, List[int]]] = {}
+        for i, shard in enumerate(self.shards):
+            embeddings = shard.embeddings
+            if embeddings is None:
+                raise ValueError(f"{type(shard).__name__} has no embeddings")
+            groups.setdefault(id(embeddings), (embeddings, []))[1].append(i)
+        return groups
+
+    def _search_shard(
+        self, i: int, embedding: List[float], k: int, **kwargs: Any
+    ) -> List[Tuple[float, Document, float]]:
+        results = self.shards[i].similarity_search_with_score_by_vector(
+            embedding, k=k, **kwargs
+        )
+        relevance = self._relevance_fns[i]
+        return [(relevance(score), doc, score) for doc, score in results]
+
+    @staticmethod
+    def _top_k(
+        shard_results: Iterable[List[Tuple[float, Document, float]]], k: int
+    ) -> List[Tuple[float, Document, float]]:
+        return heapq.nlargest(
+            k,
+            (item for results in shard_results for item in results),
+            key=lambda item: item[0],
+        )
+
+    def _merge(
+        self, shard_results: Iterable[List[Tuple[float, Document, float]]], k: int
+    ) -> List[Tuple[Document, float]]:
+        return [(doc, score) for _, doc, score in self._top_k(shard_results, k)]
+
+    def _search(
+        self, query: str, k: int, **kwargs: Any
+    ) -> Iterable[List[Tuple[float, Document, float]]]:
+        futures = []
+        for embeddings, indices in self._embedding_groups().values():
+            embedding = embeddings.embed_query(query)
+            futures.extend(
+                self._executor.submit(self._search_shard, i, embedding, k, **kwargs)
+                for i in indices
+            )
+        return (future.result() for future in futures)
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """各シャードを並列に検索し、上位 k 件のドキュメントと各シャードでのスコア（距離）を返します。"""
+        return self._merge(self._search(query, k, **kwargs), k)
+
+    async def asimilarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        groups = list(self._embedding_groups().values())
+        embeddings = await asyncio.gather(
+            *(group_embeddings.aembed_query(query) for group_embeddings, _ in groups)
+        )
+        loop = asyncio.get_running_loop()
+        shard_results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    self._executor,
+                    lambda i=i, embedding=embedding: self._search_shard(
+                        i, embedding, k, **kwargs
+                    ),
+                )
+                for (_, indices), embedding in zip(groups, embeddings, strict=False)
+                for i in indices
+            )
+        )
+        return self._merge(shard_results, k)
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    async def asimilarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        results = await self.asimilarity_search_with_score(query, k, **kwargs)
+        return [doc for doc, _ in results]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        # 埋め込みベクトルは全シャードが同じ Embeddings を使用している場合のみ共有できる
+        if len(self._embedding_groups()) > 1:
+            raise ValueError(
+                "Searching by vector requires all vector stores to use the same embeddings"
+            )
+        futures = [
+            self._executor.submit(self._search_shard, i, embedding, k, **kwargs)
+            for i in range(len(self.shards))
+        ]
+        return [doc for doc, _ in self._merge((f.result() for f in futures), k)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return self._relevance_fns[0]
+
+    def _similarity_search_with_relevance_scores(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        # シャードごとに異なる関連度の関数を適用する
+        top = self._top_k(self._search(query, k, **kwargs), k)
+        return [(doc, relevance) for relevance, doc, _ in top]
+
+    def get_vectors(self, ids: Sequence[str]) -> np.ndarray | None:
+        """各シャードからドキュメント ID に対応するベクトルを取り出します（全シャードが同じ Embeddings を使用している場合のみ）。"""
+        if len(self._embedding_groups()) > 1:
+            return None
+        found: Dict[str, np.ndarray] = {}
+        for shard in self.shards:
+            if not hasattr(shard, "get_vectors"):
+                return None
+            remaining = [_id for _id in dict.fromkeys(ids) if _id not in found]
+            if not remaining:
+                break
+            shard_ids = [doc.id for doc in shard.get_by_ids(remaining)]
+            if shard_ids:
+                vectors = shard.get_vectors(shard_ids)
+                if vectors is None:
+                    return None
+                found.update(zip(shard_ids, vectors, strict=False))
+        if len(found) < len(set(ids)):
+            return None
+        return np.stack([found[_id] for _id in ids])
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        docs: List[Document] = []
+        for shard in self.shards:
+            docs.extend(shard.get_by_ids(ids))
+        return docs
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        raise NotImplementedError(
+            "FederatedVectorStore is read-only, add documents to one of its vector stores"
+        )
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "FederatedVectorStore":
+        raise NotImplementedError(
+            "FederatedVectorStore is created from existing vector stores"
+        )
@@ -1,12 +1,18 @@
+import asyncio
 import logging
 import os
 
+from typing import List
+
+import numpy as np
+
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_core.vectorstores import VectorStore
 
 from core.ai_core.knowledge_warehouse.serialization import VectordbConfig, FAISSConfig
+from core.ai_core.vectordb.impl.faiss_store import FaissStore, allow_legacy_pickle
 from core.ai_core.vectordb.vectordb_base import VectordbBase
 from core.ai_core.vectordb.vectordb_builder import VectordbType
 
@@ -14,31 +20,124 @@ logger = logging.getLogger("ai_core")
 
 
 class FaissCpu(VectordbBase):
-    def __init__(self) -> None:
-        super().__init__(VectordbType.FaissCPU)
+    def __init__(
+        self,
+        vectordb_type: VectordbType = VectordbType.FaissCPU,
+        allow_dangerous_deserialization: bool | None = None,
+    ) -> None:
+        super().__init__(vectordb_type)
+        # 旧形式（pickle）のドキュメントストアの読み込みを許可するかどうか（None の場合は環境変数 `AI_ALLOW_LEGACY_PICKLE` に従う）
+        self.allow_dangerous_deserialization = allow_dangerous_deserialization
+        self._compaction: asyncio.Task | None = None
+        self._segment_merge: asyncio.Task | None = None
 
     async def build_impl(
         self, docs: list[Document], embedder: Embeddings
     ) -> VectorStore:
-        logger.debug(f"Using {VectordbType.FaissCPU} as vector store.")
-        vector_db = await FAISS.afrom_documents(documents=docs, embedding=embedder)
+        logger.debug(f"Using {self.vectordb_type} as vector store.")
+        vector_db = await FaissStore.afrom_documents(documents=docs, embedding=embedder)
+        await asyncio.to_thread(vector_db.apply_index_config, self.index_config.faiss)
+        await self._build_lexical_index(vector_db)
+        return vector_db
+
+    async def build_from_embeddings_impl(
+        self, docs: list[Document], vectors: np.ndarray, embedder: Embeddings
+    ) -> VectorStore:
+        logger.debug(
+            f"Using {self.vectordb_type} as vector store ({vectors.shape[1]} dims)."
+        )
+        ids = [doc.id for doc in docs]
+        vector_db = await FaissStore.afrom_embeddings(
+            text_embeddings=[
+                (doc.page_content, vector)
+                for doc, vector in zip(docs, vectors.tolist(), strict=False)
+            ],
+            embedding=embedder,
+            metadatas=[doc.metadata for doc in docs],
+            ids=ids if all(ids) else None,
+        )
+        await asyncio.to_thread(vector_db.apply_index_config, self.index_config.faiss)
+        await self._build_lexical_index(vector_db)
         return vector_db
 
+    async def _build_lexical_index(self, vector_db: FaissStore) -> None:
+        # 作成後は追加・削除のたびに更新され、ナレッジと一緒に保存される
+        if self.index_config.faiss.lexical_index:
+            await asyncio.to_thread(vector_db.bm25_index)
+
+    async def aadd_documents(self, docs: list[Document]) -> List[str]:
+        ids = await super().aadd_documents(docs)
+        if isinstance(self.vector_db, FaissStore):
+            # 学習に十分なベクトルが集まった時点で Flat から設定されたインデックスに切り替える
+            await asyncio.to_thread(
+                self.vector_db.apply_index_config, self.index_config.faiss
+            )
+        return ids
+
+    async def adelete(self, ids: List[str]) -> None:
+        self.check_build()
+        if not ids:
+            return
+        # 削除済みとして記録するだけなので、削除するチャンク数に比例する時間で終わる
+        self.vector_db.delete(ids)
+        if (
+            isinstance(self.vector_db, FaissStore)
+            and self.vector_db.deleted_ratio >= self.index_config.faiss.compaction_threshold
+            and (self._compaction is None or self._compaction.done())
+        ):
+            self._compaction = asyncio.create_task(self.acompact())
+
+    async def acompact(self) -> int:
+        """削除済みのベクトルをバックグラウンドのスレッドでインデックスから取り除きます。"""
+        if not isinstance(self.vector_db, FaissStore):
+            return 0
+        try:
+            return await asyncio.to_thread(self.vector_db.compact)
+        except Exception as e:
+            logger.error(f"Error compacting {self.vectordb_type} vector store: {e}")
+            return 0
+
+    async def amerge_segments(self) -> bool:
+        """保存済みのセグメントをバックグラウンドのスレッドでベースのインデックスにまとめます。"""
+        if not isinstance(self.vector_db, FaissStore):
+            return False
+        try:
+            return await asyncio.to_thread(self.vector_db.merge_segments)
+        except Exception as e:
+            logger.error(f"Error merging {self.vectordb_type} vector store segments: {e}")
+            return False
+
     async def save_impl(self, kw_path: str) -> VectordbConfig:
         if isinstance(self.vector_db, FAISS):
             vectordb_path = os.path.join(kw_path, "vector_store_faiss")
             os.makedirs(vectordb_path, exist_ok=True)
+            # 前回と同じフォルダへの保存では、前回以降に追加されたベクトルだけがセグメントとして書き込まれる
             self.vector_db.save_local(folder_path=vectordb_path)
-            return FAISSConfig(vectordb_folder_path=vectordb_path)
+            if (
+                isinstance(self.vector_db, FaissStore)
+                and self.vector_db.needs_segment_merge(self.index_config.faiss)
+                and (self._segment_merge is None or self._segment_merge.done())
+            ):
+                self._segment_merge = asyncio.create_task(self.amerge_segments())
+            return FAISSConfig(
+                vectordb_type=self.vectordb_type, vectordb_folder_path=vectordb_path
+            )
         else:
             raise Exception(
                 f"Can't serialize other vector stores {self.vector_db} for now"
             )
 
     def load_impl(self, config: VectordbConfig, embedder: Embeddings) -> VectorStore:
-        vector_db = FAISS.load_local(
+        vector_db = FaissStore.load_local(
             folder_path=config.vectordb_folder_path,
             embeddings=embedder,
-            allow_dangerous_deserialization=True,
+            # 旧形式（pickle）のドキュメントストアは明示的に許可された場合のみ読み込む
+            allow_dangerous_deserialization=(
+                allow_legacy_pickle()
+                if self.allow_dangerous_deserialization is None
+                else self.allow_dangerous_deserialization
+            ),
+            # nprobe は faiss のインデックスファイルに保存されないため設定から復元する
+            index_config=config.index_config.faiss,
         )
         return vector_db
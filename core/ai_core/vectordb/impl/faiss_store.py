@@ -0,0 +1,1121 @@
+import json
+import logging
+import math
+import operator
+import os
+import pickle
+import threading
+
+from pathlib import Path
+from uuid import uuid4
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from core.ai_core.vectordb.bm25_index import BM25Index
+from core.ai_core.vectordb.metadata_index import (
+    DEFAULT_METADATA_KEYS,
+    MetadataIndex,
+    normalize_metadata,
+)
+from core.ai_core.vectordb.sqlite_docstore import SqliteDocstore
+from core.ai_core.vectordb.vectordb_config import FaissIndexConfig, FaissIndexType
+
+logger = logging.getLogger("ai_core")
+
+# フィルタに一致する候補がこの数以下の場合、HNSW ではグラフを辿らずに候補との距離を直接計算する
+_BRUTE_FORCE_LIMIT = 10000
+
+
+def default_mmap() -> bool:
+    """環境変数 `AI_FAISS_MMAP`（デフォルトは有効）から、インデックスをメモリマップで読み込むかどうかを返します。"""
+    return os.getenv("AI_FAISS_MMAP", "true").lower() in ("1", "true", "yes")
+
+
+def allow_legacy_pickle() -> bool:
+    """
+    環境変数 `AI_ALLOW_LEGACY_PICKLE`（デフォルトは無効）から、旧形式の pickle されたドキュメントストアの読み込みを許可するかどうかを返します。
+    pickle の読み込みは任意のコードを実行できるため、信頼できるフォルダの移行時にのみ有効にしてください。
+    """
+    return os.getenv("AI_ALLOW_LEGACY_PICKLE", "false").lower() in ("1", "true", "yes")
+
+
+class FaissStore(FAISS):
+    """
+    インデックスの種類（Flat / IVF-Flat / IVF-PQ / HNSW）を切り替えられる FAISS ベクトルストア。
+    ドキュメントは常に Flat インデックスに追加され、`apply_index_config` で設定されたインデックスに変換されます。
+    IVF 系のインデックスはベクトル数が `min_train_size` に達した時点でサンプルから学習されます。
+    検索時には `nprobe` / `ef_search` キーワード引数で探索パラメータを呼び出しごとに上書きできます。
+
+    ドキュメントは `save_local` で SQLite のドキュメントストア（SqliteDocstore）に保存され、検索結果のドキュメントのみが読み込まれます。
+    `load_local` で読み込んだ場合、インデックスとベクトル ID の一覧は最初に使用されるまで読み込まれません。
+    `mmap=True` の場合、インデックスは読み取り専用でメモリマップされ、ワーカープロセス間で OS のページキャッシュを共有します。
+    ドキュメントを追加する際は、その時点でインデックス全体をメモリに読み込み直します。
+
+    ドキュメントの削除はインデックスを変更せずに位置を削除済み（tombstone）として記録し、検索時に IDSelector で除外します。
+    削除済みのベクトルは `compact` でまとめてインデックスから取り除かれます。
+
+    メタデータのフィルタを指定した検索では、MetadataIndex でフィルタに一致する位置を求め、その部分集合だけを探索します。
+    `bm25_search` はチャンクのテキストの BM25 インデックスによる語彙検索を行います（ハイブリッド検索用）。
+
+    保存先のファイルはマニフェスト（`index.manifest.json`）で管理されます。
+    同じフォルダに再度保存する場合は、前回の保存以降に追加されたベクトルと ID だけをセグメントファイル（.npz）に書き込み、
+    マニフェストを一時ファイル経由でアトミックに置き換えます。セグメントは `merge_segments` でベースのインデックスにまとめられます。
+    """
+
+    # load_local で読み込みを遅延している場合のファイル
+    _index_file: Path | None = None
+    _index_source: Path | None = None
+    _ids_file: Path | None = None
+    _tombstones_file: Path | None = None
+    _metadata_index_file: Path | None = None
+    _bm25_file: Path | None = None
+    # 旧形式（pickle）で保存されたドキュメントストア
+    _legacy_docstore_file: Path | None = None
+    _mmapped: bool = False
+    _search_defaults: FaissIndexConfig | None = None
+    # 保存先のマニフェスト（インデックスの先頭 manifest["ntotal"] 件が保存済みの状態に対応する）
+    _manifest: Dict[str, Any] | None = None
+    _manifest_file: Path | None = None
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self._lock = threading.RLock()
+        # 削除済み（tombstone）のベクトルの位置と、検索時にそれらを除外する IDSelector
+        self._tombstones: set[int] = set()
+        self._selector: Any = None
+        # ドキュメント ID から位置への逆引き（delete のために差分で構築する）
+        self._id_to_index: Dict[str, int] = {}
+        self._id_to_index_size = 0
+        # IVF の位置から転置リスト上の場所への対応表（get_vectors で使用する）
+        self._ivf_location_cache: tuple[Any, int, np.ndarray, np.ndarray] | None = None
+        # 追加・削除のたびに増える値（compact 中の変更の検出に使用する）
+        self._version = 0
+        # メタデータの転置インデックス（未作成の場合は最初のフィルタ付き検索の際にドキュメントストアから作成する）
+        self._metadata_index: MetadataIndex | None = None
+        self._metadata_keys: List[str] = list(DEFAULT_METADATA_KEYS)
+        # BM25 インデックス（未作成の場合は最初の語彙検索の際にドキュメントストアから作成する）
+        self._bm25: BM25Index | None = None
+        # 前回の保存以降に追加されたベクトル（次回の保存でセグメントに書き込む）
+        self._unsaved_vectors: List[np.ndarray] = []
+        # インデックスが作り直された（compact など）ため、次回の保存でインデックス全体を書き込むかどうか
+        self._rewrite = False
+        self._save_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def index(self) -> Any:
+        if self._index_file is not None:
+            with self._lock:
+                if self._index_file is not None:
+                    self._index, self._mmapped = _read_index(
+                        self._index_file, self._mmapped
+                    )
+                    self._index_file = None
+                    self._load_segments(self._index, None)
+                    if self._search_defaults is not None:
+                        self.set_search_defaults(self._search_defaults)
+        return self._index
+
+    @index.setter
+    def index(self, index: Any) -> None:
+        self._index = index
+        self._index_file = None
+        self._mmapped = False
+
+    @property
+    def dimension(self) -> int:
+        """インデックスのベクトルの次元数（遅延読み込み中はマニフェストから取得します）。"""
+        if self._index_file is not None and self._manifest and "dimension" in self._manifest:
+            return self._manifest["dimension"]
+        return self.index.d
+
+    @property
+    def docstore(self) -> Any:
+        self._load_docstore()
+        return self._docstore
+
+    @docstore.setter
+    def docstore(self, docstore: Any) -> None:
+        self._docstore = docstore
+
+    @property
+    def index_to_docstore_id(self) -> Dict[int, str]:
+        if self._ids_file is not None:
+            with self._lock:
+                if self._ids_file is not None:
+                    with open(self._ids_file, encoding="utf-8") as f:
+                        ids = json.load(f)
+                    self._load_segments(None, ids)
+                    self._index_to_docstore_id = dict(enumerate(ids))
+                    self._ids_file = None
+                    if self._tombstones_file is not None:
+                        with open(self._tombstones_file, encoding="utf-8") as f:
+                            self._tombstones = set(json.load(f))
+                        self._tombstones_file = None
+        self._load_docstore()
+        return self._index_to_docstore_id
+
+    @index_to_docstore_id.setter
+    def index_to_docstore_id(self, index_to_docstore_id: Dict[int, str]) -> None:
+        self._index_to_docstore_id = index_to_docstore_id
+
+    def _load_docstore(self) -> None:
+        if self._legacy_docstore_file is None:
+            return
+        with self._lock:
+            if self._legacy_docstore_file is not None:
+                with open(self._legacy_docstore_file, "rb") as f:
+                    self._docstore, self._index_to_docstore_id = pickle.load(f)
+                self._legacy_docstore_file = None
+
+    def _segment_files(self) -> List[Tuple[Path, Dict[str, Any]]]:
+        if self._manifest is None:
+            return []
+        return [
+            (self._manifest_file.parent / segment["file"], segment)
+            for segment in self._manifest["segments"]
+        ]
+
+    def _load_segments(self, index: Any, ids: List[str] | None) -> None:
+        # ベースのインデックス（または ID の一覧）に含まれていないセグメントのベクトル（または ID）を追加する
+        size = index.ntotal if index is not None else len(ids)
+        for file, segment in self._segment_files():
+            if segment["start"] + segment["count"] <= size:
+                continue
+            if segment["start"] != size:
+                raise RuntimeError(f"{file} does not continue the saved index ({size} vectors)")
+            with np.load(file) as data:
+                if index is not None:
+                    index.add(data["vectors"])
+                else:
+                    ids.extend(data["ids"].tolist())
+            size += segment["count"]
+
+    def _ensure_writable(self) -> None:
+        """メモリマップされたインデックスを、変更できるようにメモリ上に読み込み直します。"""
+        index = self.index
+        if self._mmapped:
+            logger.debug("Loading memory-mapped FAISS index into memory for writing")
+            if not self._index_source.exists():
+                raise RuntimeError(
+                    f"{self._index_source} was removed by another process, reload the vector store"
+                )
+            writable, _ = _read_index(self._index_source, mmap=False)
+            if writable.ntotal != index.ntotal:
+                raise RuntimeError(
+                    f"{self._index_source} was modified by another process, reload the vector store"
+                )
+            search_defaults = self._search_defaults
+            self.index = writable
+            if search_defaults is not None:
+                self.set_search_defaults(search_defaults)
+
+    @classmethod
+    def load_local(
+        cls,
+        folder_path: str,
+        embeddings: Embeddings,
+        index_name: str = "index",
+        *,
+        allow_dangerous_deserialization: bool = False,
+        mmap: bool | None = None,
+        index_config: FaissIndexConfig | None = None,
+        **kwargs: Any,
+    ) -> "FaissStore":
+        """
+        インデックスとドキュメントストアを遅延読み込みする FaissStore を作成します。
+        ファイルは最初の検索・追加・削除の際に読み込まれます。
+        SQLite のドキュメントストアがない場合は、旧形式の pickle されたドキュメントストアを読み込みます（次回の保存時に変換されます）。
+
+        引数:
+        - folder_path (str): `save_local` で保存したフォルダ。
+        - embeddings (Embeddings): クエリの embedding に使用する Embeddings。
+        - index_name (str): 保存時のファイル名。
+        - allow_dangerous_deserialization (bool): 旧形式の pickle されたドキュメントストアの読み込みを許可するかどうか。
+        - mmap (bool | None): インデックスをメモリマップで読み込むかどうか。None の場合は環境変数 `AI_FAISS_MMAP` に従います。
+        - index_config (FaissIndexConfig | None): 読み込み時に適用する探索パラメータのデフォルト値。
+        """
+        path = Path(folder_path)
+        manifest_file = path / f"{index_name}.manifest.json"
+        manifest = None
+        if manifest_file.exists():
+            with open(manifest_file, encoding="utf-8") as f:
+                manifest = json.load(f)
+            index_file = path / manifest["index_file"]
+            ids_file = path / manifest["ids_file"]
+        else:
+            index_file = path / f"{index_name}.faiss"
+            ids_file = path / f"{index_name}.ids.json"
+        if not index_file.exists():
+            raise FileNotFoundError(f"Can't find {index_file}")
+
+        store = cls(embeddings, None, None, None, **kwargs)
+        store._index_file = index_file
+        store._index_source = index_file
+
+        docstore_file = path / f"{index_name}.sqlite"
+        legacy_docstore_file = path / f"{index_name}.pkl"
+        if docstore_file.exists() and ids_file.exists():
+            store.docstore = SqliteDocstore(docstore_file)
+            store._ids_file = ids_file
+            tombstones_file = path / f"{index_name}.tombstones.json"
+            if manifest is not None:
+                store._manifest, store._manifest_file = manifest, manifest_file
+                store._tombstones = set(manifest["tombstones"])
+            elif tombstones_file.exists():
+                store._tombstones_file = tombstones_file
+            metadata_index_file = path / f"{index_name}.metadata.json"
+            if metadata_index_file.exists():
+                store._metadata_index_file = metadata_index_file
+            bm25_file = path / f"{index_name}.bm25.json"
+            if bm25_file.exists():
+                store._bm25_file = bm25_file
+        elif legacy_docstore_file.exists():
+            if not allow_dangerous_deserialization:
+                raise ValueError(
+                    f"{legacy_docstore_file} is a pickled docstore saved by an older version. "
+                    "Convert a trusted knowledge warehouse to SQLite once with "
+                    "`python -m core.ai_core.knowledge_warehouse.migrate_legacy <folder>`, "
+                    "or set `allow_dangerous_deserialization` to `True` "
+                    "(`AI_ALLOW_LEGACY_PICKLE=true`) to load it as is."
+                )
+            logger.warning(
+                f"Loading the pickled docstore {legacy_docstore_file}. "
+                "Only load stores from trusted sources; it is converted to SQLite on the next save."
+            )
+            store._legacy_docstore_file = legacy_docstore_file
+        else:
+            raise FileNotFoundError(f"Can't find a docstore in {path}")
+        # セグメントのベクトルを追加するインデックスはメモリ上に読み込む
+        store._mmapped = (default_mmap() if mmap is None else mmap) and not (
+            store._manifest is not None and store._manifest["segments"]
+        )
+        store._search_defaults = index_config
+        if index_config is not None:
+            store._metadata_keys = list(index_config.metadata_keys)
+        return store
+
+    @staticmethod
+    def has_legacy_docstore(folder_path: str | Path, index_name: str = "index") -> bool:
+        """フォルダに旧形式（pickle）のドキュメントストアのみが保存されているかどうかを返します。"""
+        path = Path(folder_path)
+        return (path / f"{index_name}.pkl").exists() and not (
+            path / f"{index_name}.sqlite"
+        ).exists()
+
+    def save_local(self, folder_path: str, index_name: str = "index") -> None:
+        """
+        インデックスとドキュメントストアを保存します。
+        前回と同じフォルダに保存する場合は、前回の保存以降の変更（追加されたベクトルと削除）だけを書き込みます。
+        それ以外の場合（初回の保存や compact の後など）はインデックス全体を書き込みます。
+        """
+        path = Path(folder_path)
+        path.mkdir(exist_ok=True, parents=True)
+        manifest_file = path / f"{index_name}.manifest.json"
+        with self._save_lock, self._lock:
+            if (
+                not self._rewrite
+                and self._manifest_file is not None
+                and manifest_file.exists()
+                and self._manifest_file.resolve() == manifest_file.resolve()
+            ):
+                self._save_segment(path, index_name)
+            else:
+                self._save_full(path, index_name)
+
+    def _save_segment(self, path: Path, index_name: str) -> None:
+        manifest = dict(self._manifest)
+        if self._unsaved_vectors:
+            vectors = np.concatenate(self._unsaved_vectors)
+            start = manifest["ntotal"]
+            index_to_docstore_id = self.index_to_docstore_id
+            if start + len(vectors) != len(index_to_docstore_id):
+                raise RuntimeError("Unsaved vectors do not match the vector store")
+            segment_file = f"{index_name}.{uuid4().hex[:12]}.npz"
+            ids = [index_to_docstore_id[i] for i in range(start, len(index_to_docstore_id))]
+            _save_npz(path / segment_file, vectors=vectors, ids=np.array(ids))
+            manifest["segments"] = [
+                *manifest["segments"],
+                {"file": segment_file, "start": start, "count": len(vectors)},
+            ]
+            manifest["ntotal"] = len(index_to_docstore_id)
+        manifest["tombstones"] = sorted(self._tombstones)
+
+        # 保存済みのデータベースへの書き込みは未保存の追加・削除のみ
+        docstore = self.docstore.save(path / f"{index_name}.sqlite")
+        _write_json(self._manifest_file, manifest)
+        logger.debug(
+            f"Saved {manifest['ntotal'] - self._manifest['ntotal']} new vectors to {path}"
+        )
+        self.docstore = docstore
+        self._manifest = manifest
+        self._unsaved_vectors = []
+
+    def _save_full(self, path: Path, index_name: str) -> None:
+        # ファイル名は保存のたびに変え、他のプロセスがメモリマップしているファイルを書き換えない
+        faiss = dependable_faiss_import()
+        manifest_file = path / f"{index_name}.manifest.json"
+        previous = _read_json(manifest_file) if manifest_file.exists() else None
+
+        name = f"{index_name}.{uuid4().hex[:12]}"
+        faiss.write_index(self.index, str(path / f"{name}.faiss"))
+        index_to_docstore_id = self.index_to_docstore_id
+        n = len(index_to_docstore_id)
+        _write_json(path / f"{name}.ids.json", [index_to_docstore_id[i] for i in range(n)])
+
+        self.metadata_index().save(path / f"{index_name}.metadata.json")
+        bm25 = self._current_bm25_index()
+        if bm25 is not None:
+            bm25.save(path / f"{index_name}.bm25.json")
+        else:
+            (path / f"{index_name}.bm25.json").unlink(missing_ok=True)
+
+        docstore = self.docstore
+        if not isinstance(docstore, SqliteDocstore):
+            docstore = SqliteDocstore(documents=docstore._dict)
+        docstore = docstore.save(path / f"{index_name}.sqlite")
+
+        manifest = {
+            "index_file": f"{name}.faiss",
+            "ids_file": f"{name}.ids.json",
+            "ntotal": n,
+            # 読み込み時にインデックスを読まずに次元数を確認できるようにする
+            "dimension": self.index.d,
+            "segments": [],
+            "tombstones": sorted(self._tombstones),
+            # BM25 インデックスに反映済みの位置の数（読み込み時に残りをドキュメントストアから追加する）
+            "bm25_ntotal": n if bm25 is not None else None,
+        }
+        _write_json(manifest_file, manifest)
+
+        # 以前のファイルは新しいマニフェストに置き換えた後で削除する
+        stale = [
+            f"{index_name}.faiss",
+            f"{index_name}.ids.json",
+            f"{index_name}.tombstones.json",
+            f"{index_name}.pkl",
+        ]
+        if previous is not None:
+            stale += [previous["index_file"], previous["ids_file"]]
+            stale += [segment["file"] for segment in previous["segments"]]
+        for file_name in stale:
+            (path / file_name).unlink(missing_ok=True)
+
+        # 保存後はドキュメントを SQLite から読み込み、メモリ上に保持しない
+        self.docstore = docstore
+        self._manifest, self._manifest_file = manifest, manifest_file
+        self._index_source = path / manifest["index_file"]
+        self._unsaved_vectors, self._rewrite = [], False
+
+    def needs_segment_merge(self, config: FaissIndexConfig) -> bool:
+        """保存済みのセグメントの数または合計サイズが設定の上限を超えたかどうかを返します。"""
+        manifest = self._manifest
+        if manifest is None or not manifest["segments"]:
+            return False
+        segment_total = sum(segment["count"] for segment in manifest["segments"])
+        return (
+            len(manifest["segments"]) >= config.max_segments
+            or segment_total >= config.segment_merge_ratio * (manifest["ntotal"] - segment_total)
+        )
+
+    def merge_segments(self) -> bool:
+        """
+        保存済みのセグメントをベースのインデックスにまとめて新しいファイルに書き込み、マニフェストを置き換えます。
+        保存されたファイルのみを使用するため、実行中も検索・追加・保存ができます。
+
+        戻り値:
+        - bool: セグメントをまとめた場合は True。
+        """
+        faiss = dependable_faiss_import()
+        with self._save_lock:
+            manifest, manifest_file = self._manifest, self._manifest_file
+            if manifest is None or not manifest["segments"]:
+                return False
+        path = manifest_file.parent
+        index_name = manifest_file.name.removesuffix(".manifest.json")
+
+        index, _ = _read_index(path / manifest["index_file"], mmap=False)
+        ids = _read_json(path / manifest["ids_file"])
+        merged = [segment["file"] for segment in manifest["segments"]]
+        for file_name in merged:
+            with np.load(path / file_name) as data:
+                index.add(data["vectors"])
+                ids.extend(data["ids"].tolist())
+        if index.ntotal != manifest["ntotal"] or len(ids) != manifest["ntotal"]:
+            raise RuntimeError(f"Segments in {manifest_file} do not match the saved index")
+
+        name = f"{index_name}.{uuid4().hex[:12]}"
+        faiss.write_index(index, str(path / f"{name}.faiss"))
+        _write_json(path / f"{name}.ids.json", ids)
+        del index, ids
+
+        with self._save_lock:
+            current = self._manifest
+            if current is None or current["index_file"] != manifest["index_file"]:
+                # 実行中にインデックス全体が保存された
+                logger.info("Vector store was rewritten during segment merge, skipping it")
+                (path / f"{name}.faiss").unlink(missing_ok=True)
+                (path / f"{name}.ids.json").unlink(missing_ok=True)
+                return False
+            new_manifest = {
+                **current,
+                "index_file": f"{name}.faiss",
+                "ids_file": f"{name}.ids.json",
+                "segments": [s for s in current["segments"] if s["file"] not in merged],
+            }
+            with self._lock:
+                metadata_index = self._metadata_index
+                if metadata_index is not None and metadata_index.size == current["ntotal"]:
+                    metadata_index.save(path / f"{index_name}.metadata.json")
+                bm25 = self._bm25
+                # BM25 は ID 単位で追加・削除されるため、反映済みの位置の数を先に記録しておけばロックせずに保存できる
+                bm25_ntotal = min(len(self.index_to_docstore_id), current["ntotal"])
+            if bm25 is not None:
+                bm25.save(path / f"{index_name}.bm25.json")
+                new_manifest["bm25_ntotal"] = bm25_ntotal
+            _write_json(manifest_file, new_manifest)
+            with self._lock:
+                self._manifest = new_manifest
+                # 未読み込みのファイルはまとめた後のファイルから読み込む
+                if self._index_file is not None:
+                    self._index_file = self._index_source = path / new_manifest["index_file"]
+                elif not self._mmapped:
+                    self._index_source = path / new_manifest["index_file"]
+                if self._ids_file is not None:
+                    self._ids_file = path / new_manifest["ids_file"]
+
+        for file_name in [manifest["index_file"], manifest["ids_file"], *merged]:
+            (path / file_name).unlink(missing_ok=True)
+        logger.info(f"Merged {len(merged)} segments into {path / new_manifest['index_file']}")
+        return True
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        embeddings = self._embed_documents(texts)
+        return self.add_embeddings(
+            zip(texts, embeddings, strict=False), metadatas=metadatas, ids=ids, **kwargs
+        )
+
+    async def aadd_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        embeddings = await self._aembed_documents(texts)
+        return self.add_embeddings(
+            zip(texts, embeddings, strict=False), metadatas=metadatas, ids=ids, **kwargs
+        )
+
+    def add_embeddings(
+        self,
+        text_embeddings: Iterable[Tuple[str, List[float]]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        with self._lock:
+            self._ensure_writable()
+            text_embeddings = list(text_embeddings)
+            # 保存済みのインデックスは追加前に読み込み、追加分だけを反映する
+            metadata_index = self._current_metadata_index()
+            bm25 = self._current_bm25_index()
+            start = len(self.index_to_docstore_id)
+            added = super().add_embeddings(
+                text_embeddings, metadatas=metadatas, ids=ids, **kwargs
+            )
+            if metadata_index is not None:
+                metadata_index.add(start, metadatas or [None] * len(added))
+            if bm25 is not None:
+                bm25.add(zip(added, (text for text, _ in text_embeddings), strict=False))
+            if self._manifest is not None and not self._rewrite:
+                # 次回の保存でセグメントに書き込む（インデックスに追加されたものと同じベクトル）
+                vectors = np.array([e for _, e in text_embeddings], dtype=np.float32)
+                if self._normalize_L2:
+                    dependable_faiss_import().normalize_L2(vectors)
+                self._unsaved_vectors.append(vectors)
+            self._version += 1
+            return added
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        ドキュメントを削除します。インデックスは変更せず、ベクトルの位置を削除済みとして記録するため、
+        削除にかかる時間はインデックスのサイズではなく削除するドキュメント数に比例します。
+        """
+        if ids is None:
+            raise ValueError("No ids provided to delete.")
+        with self._lock:
+            id_to_index = self._reverse_index()
+            missing_ids = [
+                _id
+                for _id in ids
+                if _id not in id_to_index or id_to_index[_id] in self._tombstones
+            ]
+            if missing_ids:
+                raise ValueError(
+                    f"Some specified ids do not exist in the current store. Ids not found: {missing_ids}"
+                )
+            self._tombstones.update(id_to_index[_id] for _id in ids)
+            self._selector = None
+            self.docstore.delete(ids)
+            bm25 = self._current_bm25_index()
+            if bm25 is not None:
+                bm25.delete(ids)
+            self._version += 1
+        return True
+
+    def merge_from(self, target: FAISS) -> None:
+        with self._lock:
+            self._ensure_writable()
+            super().merge_from(target)
+            # 追加されたドキュメントのインデックスは次に必要になった時点で作り直す
+            self._metadata_index, self._metadata_index_file = None, None
+            self._bm25, self._bm25_file = None, None
+            self._mark_rewrite()
+            self._version += 1
+
+    def metadata_index(self) -> MetadataIndex:
+        """メタデータの転置インデックスを返します。保存されていない場合はドキュメントストアから作成します。"""
+        with self._lock:
+            if self._metadata_index is None and self._metadata_index_file is not None:
+                metadata_index = MetadataIndex.load(self._metadata_index_file)
+                self._metadata_index_file = None
+                if (
+                    metadata_index.keys == self._metadata_keys
+                    and metadata_index.size <= len(self.index_to_docstore_id)
+                ):
+                    # 保存後にセグメントとして追加されたベクトルの分を追加する
+                    self._add_metadata(metadata_index, metadata_index.size)
+                    self._metadata_index = metadata_index
+            if self._metadata_index is None:
+                self._metadata_index = self._add_metadata(
+                    MetadataIndex(self._metadata_keys), 0
+                )
+            return self._metadata_index
+
+    def _current_metadata_index(self) -> MetadataIndex | None:
+        # 作成済み、または保存済みのインデックスのみを返す（ない場合は作成しない）
+        if self._metadata_index is None and self._metadata_index_file is None:
+            return None
+        return self.metadata_index()
+
+    def bm25_index(self) -> BM25Index:
+        """BM25 インデックスを返します。保存されていない場合はドキュメントストアから作成します。"""
+        with self._lock:
+            if self._bm25 is None and self._bm25_file is not None:
+                bm25 = BM25Index.load(self._bm25_file)
+                self._bm25_file = None
+                covered = self._manifest.get("bm25_ntotal") if self._manifest else None
+                if covered is not None:
+                    # 保存後にセグメントとして追加・削除されたドキュメントを反映する
+                    self._update_bm25(bm25, covered)
+                self._bm25 = bm25
+            if self._bm25 is None:
+                self._bm25 = self._update_bm25(BM25Index(), 0)
+            return self._bm25
+
+    def _update_bm25(self, bm25: BM25Index, start: int) -> BM25Index:
+        # 削除済みのドキュメントを取り除き、位置 start 以降のドキュメントを追加する
+        index_to_docstore_id = self.index_to_docstore_id
+        id_to_index = self._reverse_index()
+        bm25.delete(
+            _id
+            for _id in (index_to_docstore_id[i] for i in self._tombstones if i < start)
+            if id_to_index[_id] in self._tombstones
+        )
+        ids = [
+            index_to_docstore_id[i]
+            for i in range(start, len(index_to_docstore_id))
+            if i not in self._tombstones
+        ]
+        batch_size = 1000
+        for offset in range(0, len(ids), batch_size):
+            batch = ids[offset : offset + batch_size]
+            bm25.add(
+                (_id, doc.page_content)
+                for _id, doc in zip(batch, self._get_documents(batch), strict=False)
+                if isinstance(doc, Document)
+            )
+        return bm25
+
+    def _current_bm25_index(self) -> BM25Index | None:
+        if self._bm25 is None and self._bm25_file is None:
+            return None
+        return self.bm25_index()
+
+    def bm25_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Union[Callable, Dict[str, Any]]] = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """
+        BM25 でクエリの語を含むドキュメントを検索します。
+
+        引数:
+        - query (str): 検索クエリ。
+        - k (int): 返すドキュメントの数。
+        - filter (Callable | Dict[str, Any] | None): メタデータのフィルタ（similarity_search と同じ形式）。
+        - fetch_k (int): フィルタを適用する際に一度に読み込むドキュメントの数。
+
+        戻り値:
+        - List[Tuple[Document, float]]: ドキュメントと BM25 スコアのリスト（スコアの降順）。
+        """
+        hits = self.bm25_index().search(query, limit=None if filter is not None else k)
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+
+        results: List[Tuple[Document, float]] = []
+        batch_size = max(k, fetch_k)
+        for start in range(0, len(hits), batch_size):
+            batch = hits[start : start + batch_size]
+            docs = self._get_documents([_id for _id, _ in batch])
+            for (_, score), doc in zip(batch, docs, strict=False):
+                if isinstance(doc, Document) and (
+                    filter_func is None or filter_func(doc.metadata)
+                ):
+                    results.append((doc, score))
+                    if len(results) == k:
+                        return results
+        return results
+
+    def _add_metadata(self, metadata_index: MetadataIndex, start: int) -> MetadataIndex:
+        # 位置 start 以降のドキュメントのメタデータをインデックスに追加する
+        index_to_docstore_id = self.index_to_docstore_id
+        batch_size = 1000
+        for offset in range(start, len(index_to_docstore_id), batch_size):
+            positions = range(offset, min(offset + batch_size, len(index_to_docstore_id)))
+            docs = self._get_documents([index_to_docstore_id[i] for i in positions])
+            metadata_index.add(
+                offset,
+                [
+                    doc.metadata if isinstance(doc, Document) and i not in self._tombstones else None
+                    for i, doc in zip(positions, docs, strict=False)
+                ],
+            )
+        metadata_index.size = len(index_to_docstore_id)
+        return metadata_index
+
+    @property
+    def deleted_ratio(self) -> float:
+        """インデックス内のベクトルのうち、削除済みのものの割合。"""
+        total = len(self.index_to_docstore_id)
+        return len(self._tombstones) / total if total else 0.0
+
+    def _reverse_index(self) -> Dict[str, int]:
+        # 前回以降に追加された位置の分だけ逆引きを更新する（同じ ID が再追加された場合は新しい位置が優先される）
+        index_to_docstore_id = self.index_to_docstore_id
+        for i in range(self._id_to_index_size, len(index_to_docstore_id)):
+            self._id_to_index[index_to_docstore_id[i]] = i
+        self._id_to_index_size = len(index_to_docstore_id)
+        return self._id_to_index
+
+    def _tombstone_selector(self) -> tuple[Any, Any] | None:
+        # IDSelectorNot は内部のセレクターを参照するだけなので、検索が終わるまで両方を保持する
+        if not self._tombstones:
+            return None
+        if self._selector is None:
+            faiss = dependable_faiss_import()
+            batch = faiss.IDSelectorBatch(
+                np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones))
+            )
+            self._selector = (faiss.IDSelectorNot(batch), batch)
+        return self._selector
+
+    def compact(self) -> int:
+        """
+        削除済みのベクトルをインデックスから取り除き、位置を詰め直します。
+        インデックスの複製に対して行うため、実行中も検索できます。
+        実行中にドキュメントが追加・削除された場合は何もせずに終了します（次回の実行で再度行います）。
+
+        戻り値:
+        - int: 取り除いたベクトルの数。
+        """
+        faiss = dependable_faiss_import()
+        with self._lock:
+            self._ensure_writable()
+            self._current_metadata_index()
+            version = self._version
+            tombstones = set(self._tombstones)
+            if not tombstones:
+                return 0
+            index = faiss.clone_index(self.index)
+            index_to_docstore_id = dict(self.index_to_docstore_id)
+
+        n = index.ntotal
+        live = np.array([i for i in range(n) if i not in tombstones], dtype=np.int64)
+        dead = np.fromiter(sorted(tombstones), dtype=np.int64, count=len(tombstones))
+
+        remap = np.full(n, -1, dtype=np.int64)
+        remap[live] = np.arange(len(live), dtype=np.int64)
+        if isinstance(index, faiss.IndexHNSW):
+            # HNSW はベクトルを削除できないため、残すベクトルから作り直す
+            vectors = index.reconstruct_n(0, n)[live]
+            index.reset()
+            index.add(vectors)
+        elif isinstance(index, faiss.IndexIVF):
+            # IVF は削除しても残りの ID が詰められないため、転置リスト内の ID を振り直す
+            # direct map が有効なインデックス（以前のバージョンで保存されたものなど）は remove_ids できないため無効にする
+            if index.direct_map.type != faiss.DirectMap.NoMap:
+                index.make_direct_map(False)
+            index.remove_ids(dead)
+            invlists = index.invlists
+            for list_no in range(index.nlist):
+                size = invlists.list_size(list_no)
+                if size:
+                    ptr = invlists.get_ids(list_no)
+                    ids = faiss.rev_swig_ptr(ptr, size)
+                    ids[:] = remap[ids]
+                    invlists.release_ids(list_no, ptr)
+        else:
+            index.remove_ids(dead)
+
+        with self._lock:
+            if self._version != version:
+                logger.info("Vector store changed during compaction, skipping it")
+                return 0
+            self.index = index
+            self.index_to_docstore_id = {
+                new: index_to_docstore_id[int(old)] for new, old in enumerate(live)
+            }
+            self._tombstones = set()
+            self._selector = None
+            self._id_to_index, self._id_to_index_size = {}, 0
+            if self._metadata_index is not None:
+                self._metadata_index.remap(remap)
+            self._mark_rewrite()
+            self._version += 1
+        logger.info(f"Compacted vector store, removed {len(dead)} deleted vectors")
+        return len(dead)
+
+    def apply_index_config(self, config: FaissIndexConfig) -> bool:
+        """
+        Flat インデックスを設定されたインデックスに変換します。
+        位置（index_to_docstore_id のキー）はそのまま保たれます。
+
+        戻り値:
+        - bool: インデックスを変換した場合は True。
+        """
+        faiss = dependable_faiss_import()
+        with self._lock:
+            self._metadata_keys = list(config.metadata_keys)
+            if self._metadata_index is not None and self._metadata_index.keys != self._metadata_keys:
+                self._metadata_index = None
+            if config.index_type == FaissIndexType.flat or not isinstance(
+                self.index, faiss.IndexFlat
+            ):
+                self.set_search_defaults(config)
+                return False
+
+            n = self.index.ntotal
+            if config.index_type != FaissIndexType.hnsw and n < config.min_train_size:
+                # 学習に十分なベクトルが集まるまでは Flat のまま
+                return False
+            version = self._version
+            vectors = self.index.reconstruct_n(0, n)
+
+        index = self._create_index(vectors.shape[1], n, config)
+        if not index.is_trained:
+            sample = vectors
+            if n > config.train_sample_size:
+                rng = np.random.default_rng(0)
+                sample = vectors[rng.choice(n, config.train_sample_size, replace=False)]
+            logger.info(f"Training {config.index_type} index on {len(sample)} vectors")
+            index.train(sample)
+        index.add(vectors)
+
+        with self._lock:
+            if self._version != version:
+                logger.info("Vector store changed while building the index, keeping it flat")
+                return False
+            self.index = index
+            self.set_search_defaults(config)
+            self._mark_rewrite()
+            self._version += 1
+        return True
+
+    def _mark_rewrite(self) -> None:
+        # 位置やインデックスの種類が変わったため、保存済みのファイルに差分を追加できない
+        self._rewrite = True
+        self._unsaved_vectors = []
+
+    def set_search_defaults(self, config: FaissIndexConfig) -> None:
+        """インデックスのデフォルトの探索パラメータ（nprobe / efSearch）を設定します。"""
+        faiss = dependable_faiss_import()
+        if isinstance(self.index, faiss.IndexIVF):
+            self.index.nprobe = config.nprobe
+        elif isinstance(self.index, faiss.IndexHNSW):
+            self.index.hnsw.efSearch = config.ef_search
+
+    def _create_index(self, dimension: int, n: int, config: FaissIndexConfig):
+        faiss = dependable_faiss_import()
+        metric = (
+            faiss.METRIC_INNER_PRODUCT
+            if self.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT
+            else faiss.METRIC_L2
+        )
+
+        if config.index_type == FaissIndexType.hnsw:
+            index = faiss.IndexHNSWFlat(dimension, config.hnsw_m, metric)
+            index.hnsw.efConstruction = config.ef_construction
+            return index
+
+        # faiss はクラスタあたり 39 点以上の学習サンプルを推奨している
+        nlist = config.nlist or int(4 * math.sqrt(n))
+        nlist = max(1, min(nlist, min(n, config.train_sample_size) // 39))
+        quantizer = (
+            faiss.IndexFlatIP(dimension)
+            if metric == faiss.METRIC_INNER_PRODUCT
+            else faiss.IndexFlatL2(dimension)
+        )
+        if config.index_type == FaissIndexType.ivf_flat:
+            return faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+
+        # サブベクトル数は次元数を割り切る必要がある
+        m = max(d for d in range(1, min(config.pq_m, dimension) + 1) if dimension % d == 0)
+        if m != config.pq_m:
+            logger.warning(f"Using pq_m={m} instead of {config.pq_m} for {dimension} dims")
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, m, config.pq_nbits, metric)
+
+    @staticmethod
+    def _search_parameters(
+        index: Any,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        selector: Any = None,
+    ):
+        faiss = dependable_faiss_import()
+        # SearchParameters を渡す場合、指定しない値はインデックスの設定ではなく faiss のデフォルト値になる
+        if isinstance(index, faiss.IndexIVF) and (nprobe is not None or selector is not None):
+            return faiss.SearchParametersIVF(
+                nprobe=nprobe if nprobe is not None else index.nprobe, sel=selector
+            )
+        if isinstance(index, faiss.IndexHNSW) and (
+            ef_search is not None or selector is not None
+        ):
+            return faiss.SearchParametersHNSW(
+                efSearch=ef_search if ef_search is not None else index.hnsw.efSearch,
+                sel=selector,
+            )
+        if selector is not None:
+            return faiss.SearchParameters(sel=selector)
+        return None
+
+    def _search_candidates(
+        self,
+        index: Any,
+        vector: np.ndarray,
+        n: int,
+        candidates: np.ndarray,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # メタデータのフィルタに一致する位置の部分集合だけを探索する
+        faiss = dependable_faiss_import()
+        if isinstance(index, faiss.IndexHNSW) and len(candidates) <= _BRUTE_FORCE_LIMIT:
+            # 候補が少ない場合、グラフを辿ると候補に到達できないことがあるため距離を直接計算する
+            vectors = index.reconstruct_batch(candidates)
+            if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+                distances = -(vectors @ vector[0])
+            else:
+                distances = ((vectors - vector[0]) ** 2).sum(axis=1)
+            order = np.argsort(distances)[:n]
+            scores = distances[order]
+            if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+                scores = -scores
+            return scores[None, :], candidates[order][None, :]
+
+        batch = faiss.IDSelectorBatch(candidates)
+        # 候補の割合が小さいほど、n 件を見つけるために探索範囲を広げる
+        share = len(candidates) / max(index.ntotal, 1)
+        if isinstance(index, faiss.IndexIVF):
+            nprobe = nprobe if nprobe is not None else index.nprobe
+            nprobe = max(nprobe, min(index.nlist, math.ceil(nprobe / share)))
+        elif isinstance(index, faiss.IndexHNSW):
+            ef_search = ef_search if ef_search is not None else index.hnsw.efSearch
+            ef_search = max(ef_search, min(index.ntotal, math.ceil(2 * n / share)))
+        params = self._search_parameters(index, nprobe, ef_search, batch)
+        return index.search(vector, n, params=params)
+
+    def _get_documents(self, ids: List[str]) -> List[Document | str | None]:
+        docstore = self.docstore
+        if isinstance(docstore, SqliteDocstore):
+            # 検索結果のドキュメントを 1 回のクエリでまとめて読み込む
+            return docstore.mget(ids)
+        return [docstore.search(_id) for _id in ids]
+
+    def get_vectors(self, ids: Sequence[str]) -> np.ndarray | None:
+        """
+        ドキュメント ID に対応するベクトルをインデックスから取り出します（IVF-PQ の場合は近似値）。
+
+        戻り値:
+        - np.ndarray | None: ID の順のベクトルの行列。インデックスにない ID が含まれる場合は None。
+        """
+        faiss = dependable_faiss_import()
+        with self._lock:
+            index = self.index
+            id_to_index = self._reverse_index()
+            positions = [id_to_index.get(_id) for _id in ids]
+            if any(i is None for i in positions):
+                return None
+            ivf = faiss.try_extract_index_ivf(index)
+            if ivf is None or ivf.direct_map.type != faiss.DirectMap.NoMap:
+                return index.reconstruct_batch(np.array(positions, dtype=np.int64))
+            # IVF は位置から転置リスト上の場所を引く必要がある。インデックスの direct map を有効にすると
+            # remove_ids（compact）ができなくなるため、共有のインデックスは変更せずに独自の対応表を使う
+            list_nos, offsets = self._ivf_locations(index, ivf)
+            vectors = np.empty((len(positions), index.d), dtype=np.float32)
+            for row, position in enumerate(positions):
+                ivf.reconstruct_from_offset(
+                    int(list_nos[position]),
+                    int(offsets[position]),
+                    faiss.swig_ptr(vectors[row]),
+                )
+        return vectors
+
+    def _ivf_locations(self, index: Any, ivf: Any) -> tuple[np.ndarray, np.ndarray]:
+        # 位置ごとの (転置リストの番号, リスト内のオフセット)。インデックスが置き換えられるかベクトルが追加されたら作り直す
+        cached = self._ivf_location_cache
+        if cached is not None and cached[0] is index and cached[1] == index.ntotal:
+            return cached[2], cached[3]
+        faiss = dependable_faiss_import()
+        list_nos = np.full(index.ntotal, -1, dtype=np.int64)
+        offsets = np.full(index.ntotal, -1, dtype=np.int64)
+        invlists = ivf.invlists
+        for list_no in range(ivf.nlist):
+            size = invlists.list_size(list_no)
+            if size:
+                ptr = invlists.get_ids(list_no)
+                ids = faiss.rev_swig_ptr(ptr, size).copy()
+                invlists.release_ids(list_no, ptr)
+                list_nos[ids] = list_no
+                offsets[ids] = np.arange(size, dtype=np.int64)
+        self._ivf_location_cache = (index, index.ntotal, list_nos, offsets)
+        return list_nos, offsets
+
+    @staticmethod
+    def _create_filter_func(
+        filter: Optional[Union[Callable, Dict[str, Any]]],
+    ) -> Callable[[Dict[str, Any]], bool]:
+        if not isinstance(filter, dict):
+            return FAISS._create_filter_func(filter)
+        # UUID・Path の値は、保存後のメタデータと同じ文字列として比較する
+        filter_func = FAISS._create_filter_func(normalize_metadata(filter))
+        return lambda metadata: filter_func(normalize_metadata(metadata))
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        return [doc for doc in self._get_documents(list(ids)) if isinstance(doc, Document)]
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Union[Callable, Dict[str, Any]]] = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        faiss = dependable_faiss_import()
+        vector = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vector)
+
+        n = k if filter is None else fetch_k
+        # compact による入れ替えと競合しないよう、インデックスと位置の対応を同時に取得する
+        with self._lock:
+            index = self.index
+            index_to_docstore_id = self.index_to_docstore_id
+            candidates = (
+                self.metadata_index().candidates(filter) if isinstance(filter, dict) else None
+            )
+            if candidates is not None and self._tombstones:
+                candidates = np.setdiff1d(
+                    candidates,
+                    np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones)),
+                )
+            selector = self._tombstone_selector() if candidates is None else None
+
+        if candidates is None:
+            params = self._search_parameters(
+                index,
+                kwargs.get("nprobe"),
+                kwargs.get("ef_search"),
+                selector[0] if selector is not None else None,
+            )
+            if params is None:
+                scores, indices = index.search(vector, n)
+            else:
+                scores, indices = index.search(vector, n, params=params)
+        elif len(candidates) == 0:
+            return []
+        else:
+            scores, indices = self._search_candidates(
+                index, vector, n, candidates, kwargs.get("nprobe"), kwargs.get("ef_search")
+            )
+
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+        # IVF / HNSW では候補が k 件に満たない場合がある（-1 が返される）
+        hits = [(j, i) for j, i in enumerate(indices[0]) if i != -1]
+        ids = [index_to_docstore_id[i] for _, i in hits]
+        docs = []
+        for (j, _), _id, doc in zip(hits, ids, self._get_documents(ids), strict=False):
+            if not isinstance(doc, Document):
+                raise ValueError(f"Could not find document for id {_id}, got {doc}")
+            if filter_func is None or filter_func(doc.metadata):
+                docs.append((doc, scores[0][j]))
+
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            cmp = (
+                operator.ge
+                if self.distance_strategy
+                in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD)
+                else operator.le
+            )
+            docs = [(doc, score) for doc, score in docs if cmp(score, score_threshold)]
+        return docs[:k]
+
+
+def _read_json(path: Path) -> Any:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path: Path, data: Any) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _save_npz(path: Path, **arrays: np.ndarray) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _read_index(index_file: Path, mmap: bool) -> tuple[Any, bool]:
+    faiss = dependable_faiss_import()
+    if mmap:
+        try:
+            flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            return faiss.read_index(str(index_file), flags), True
+        except RuntimeError as e:
+            # メモリマップに対応していないインデックスの場合は通常どおり読み込む
+            logger.debug(f"Can't memory-map {index_file} ({e}), reading it into memory")
+    return faiss.read_index(str(index_file)), False
@@ -0,0 +1,215 @@
+import json
+import logging
+import operator
+import os
+
+from pathlib import Path, PurePath
+from typing import Any, Callable, Dict, Iterable, List
+from uuid import UUID
+
+import numpy as np
+
+logger = logging.getLogger("ai_core")
+
+DEFAULT_METADATA_KEYS = ["aifile_id", "original_file_name", "file_extension", "file_sha1"]
+
+_COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$gt": operator.gt,
+    "$lt": operator.lt,
+    "$gte": operator.ge,
+    "$lte": operator.le,
+}
+
+_INDEXABLE = (str, int, float, bool)
+
+
+def normalize_metadata(value: Any) -> Any:
+    """
+    メタデータまたはフィルタの値の UUID と Path を文字列に変換します（辞書・リストは再帰的に変換します）。
+    SQLite のドキュメントストアに保存したメタデータは文字列として読み込まれるため、保存の前後で同じ型で比較できるようにします。
+    """
+    if isinstance(value, (UUID, PurePath)):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: normalize_metadata(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [normalize_metadata(v) for v in value]
+    return value
+
+
+class MetadataIndex:
+    """
+    チャンクのメタデータの値からベクトルの位置を引く転置インデックス。
+    LangChain の FAISS と同じ形式のフィルタ（`{"aifile_id": "..."}`、`$in`、`$gte`、`$and` / `$or` / `$not` など）から、
+    条件を満たす可能性のある位置の集合を求め、検索をその部分集合に限定するために使用します。
+    インデックスされていないキーの条件は求めた集合に反映されないため、検索結果には常に元のフィルタも適用してください。
+
+    引数:
+    - keys (List[str]): インデックスするメタデータのキー。スカラー値（文字列・数値・真偽値）のみがインデックスされます。
+    """
+
+    def __init__(self, keys: List[str] | None = None) -> None:
+        self.keys = list(keys) if keys is not None else list(DEFAULT_METADATA_KEYS)
+        self.size = 0
+        self._postings: Dict[str, Dict[Any, List[int]]] = {key: {} for key in self.keys}
+        self._arrays: Dict[tuple[str, Any], np.ndarray] = {}
+
+    def add(self, start: int, metadatas: Iterable[Dict[str, Any] | None]) -> None:
+        """位置 `start` から順に追加されたベクトルのメタデータをインデックスに追加します。"""
+        position = start
+        for metadata in metadatas:
+            for key in self.keys:
+                value = normalize_metadata((metadata or {}).get(key))
+                if isinstance(value, _INDEXABLE):
+                    self._postings[key].setdefault(value, []).append(position)
+            position += 1
+        self.size = max(self.size, position)
+        self._arrays.clear()
+
+    def remap(self, remap: np.ndarray) -> None:
+        """
+        インデックスの位置を詰め直した後に呼び出します。
+
+        引数:
+        - remap (np.ndarray): 古い位置から新しい位置への対応。削除された位置は -1。
+        """
+        for values in self._postings.values():
+            for value, positions in list(values.items()):
+                new_positions = remap[np.asarray(positions, dtype=np.int64)]
+                new_positions = new_positions[new_positions >= 0]
+                if len(new_positions):
+                    values[value] = new_positions.tolist()
+                else:
+                    del values[value]
+        self.size = int((remap >= 0).sum())
+        self._arrays.clear()
+
+    def candidates(self, filter: Dict[str, Any]) -> np.ndarray | None:
+        """
+        フィルタを満たす可能性のある位置を昇順の配列で返します。
+        フィルタがインデックスで絞り込めない場合（インデックスされていないキーのみの条件など）は None を返します。
+        """
+        try:
+            result = self._resolve(normalize_metadata(filter))
+        except TypeError:
+            # 比較できない型の値が含まれる場合は絞り込まない
+            return None
+        return result[0] if result is not None else None
+
+    def _resolve(self, filter: Dict[str, Any]) -> tuple[np.ndarray, bool] | None:
+        # 戻り値は (位置の集合, フィルタと完全に一致するかどうか)
+        if "$and" in filter:
+            return self._intersect([self._resolve(f) for f in filter["$and"]])
+        if "$or" in filter:
+            parts = [self._resolve(f) for f in filter["$or"]]
+            if any(part is None for part in parts):
+                return None
+            positions = _EMPTY
+            for part, _ in parts:
+                positions = np.union1d(positions, part)
+            return positions, all(exact for _, exact in parts)
+        if "$not" in filter:
+            inner = self._resolve(filter["$not"])
+            if inner is None or not inner[1]:
+                # 補集合を取れるのは条件と完全に一致する場合のみ
+                return None
+            return np.setdiff1d(self._universe(), inner[0], assume_unique=True), True
+        return self._intersect(
+            [self._resolve_field(field, condition) for field, condition in filter.items()]
+        )
+
+    def _intersect(
+        self, parts: List[tuple[np.ndarray, bool] | None]
+    ) -> tuple[np.ndarray, bool] | None:
+        resolved = [part for part in parts if part is not None]
+        if not resolved:
+            return None
+        positions = resolved[0][0]
+        for part, _ in resolved[1:]:
+            positions = np.intersect1d(positions, part, assume_unique=True)
+        return positions, len(resolved) == len(parts) and all(e for _, e in resolved)
+
+    def _resolve_field(self, field: str, condition: Any) -> tuple[np.ndarray, bool] | None:
+        if field not in self._postings:
+            return None
+        if isinstance(condition, list):
+            return self._union(field, condition)
+        if not isinstance(condition, dict):
+            return self._union(field, [condition])
+
+        parts = []
+        for op, value in condition.items():
+            if op == "$eq":
+                parts.append(self._union(field, [value]))
+            elif op == "$in":
+                parts.append(self._union(field, list(value)))
+            elif op in ("$neq", "$nin"):
+                # メタデータにキーがないチャンクも条件を満たす
+                excluded = self._union(field, [value] if op == "$neq" else list(value))
+                if excluded is None:
+                    parts.append(None)
+                else:
+                    parts.append(
+                        (np.setdiff1d(self._universe(), excluded[0], assume_unique=True), True)
+                    )
+            elif op in _COMPARISONS and value is not None:
+                compare = _COMPARISONS[op]
+                matched = [v for v in self._postings[field] if compare(v, value)]
+                parts.append(self._union(field, matched))
+            else:
+                parts.append(None)
+        return self._intersect(parts)
+
+    def _union(self, field: str, values: List[Any]) -> tuple[np.ndarray, bool] | None:
+        if any(value is None or not isinstance(value, _INDEXABLE) for value in values):
+            # キーがないチャンク（None）はインデックスされていない
+            return None
+        arrays = [self._array(field, value) for value in values]
+        if not arrays:
+            return _EMPTY, True
+        if len(arrays) == 1:
+            return arrays[0], True
+        return np.unique(np.concatenate(arrays)), True
+
+    def _array(self, field: str, value: Any) -> np.ndarray:
+        key = (field, value)
+        if key not in self._arrays:
+            self._arrays[key] = np.asarray(
+                self._postings[field].get(value, []), dtype=np.int64
+            )
+        return self._arrays[key]
+
+    def _universe(self) -> np.ndarray:
+        return np.arange(self.size, dtype=np.int64)
+
+    def save(self, path: Path | str) -> None:
+        """インデックスを JSON として一時ファイル経由でアトミックに保存します。"""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "keys": self.keys,
+                    "size": self.size,
+                    "postings": {
+                        key: [[value, positions] for value, positions in values.items()]
+                        for key, values in self._postings.items()
+                    },
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path | str) -> "MetadataIndex":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["keys"])
+        index.size = data["size"]
+        for key, values in data["postings"].items():
+            index._postings[key] = {value: positions for value, positions in values}
+        return index
+
+
+_EMPTY = np.empty(0, dtype=np.int64)
@@ -0,0 +1,189 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+logger = logging.getLogger("ai_core")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    page_content TEXT NOT NULL,
+    metadata TEXT NOT NULL
+)
+"""
+
+# SQLite の 1 文で使用できるパラメータ数の上限より小さくする
+_BATCH_SIZE = 500
+
+
+class SqliteDocstore(Docstore, AddableMixin):
+    """
+    チャンク（page_content とメタデータ）をベクトル ID をキーとして SQLite に保存するドキュメントストア。
+    ドキュメントは検索で参照されたものだけが読み込まれ、メタデータは JSON として保存されます（pickle は使用しません）。
+    追加・削除は `save` が呼ばれるまでメモリ上に保持され、保存時に 1 つのトランザクションで書き込まれます。
+    データベースへの接続は最初にアクセスした時点で開かれます。
+
+    プロパティ:
+    - path (Path | None): データベースファイルのパス。None の場合は未保存のドキュメントのみを保持します。
+
+    引数:
+    - path (Path | str | None): データベースファイルのパス。
+    - documents (Dict[str, Document] | None): 初期ドキュメント（未保存として扱われます）。
+    """
+
+    def __init__(
+        self,
+        path: Path | str | None = None,
+        documents: Dict[str, Document] | None = None,
+    ) -> None:
+        self.path = Path(path) if path is not None else None
+        self._pending: Dict[str, Document] = dict(documents or {})
+        self._deleted: set[str] = set()
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+
+    def _connection(self) -> sqlite3.Connection | None:
+        if self.path is None or not self.path.exists():
+            return None
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            return self._conn
+
+    def _fetch(self, ids: Sequence[str]) -> Dict[str, Document]:
+        conn = self._connection()
+        if conn is None or not ids:
+            return {}
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), _BATCH_SIZE):
+                batch = list(ids[start : start + _BATCH_SIZE])
+                rows = conn.execute(
+                    "SELECT id, page_content, metadata FROM chunks WHERE id IN "
+                    f"({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for doc_id, page_content, metadata in rows:
+                    found[doc_id] = Document(
+                        id=doc_id, page_content=page_content, metadata=json.loads(metadata)
+                    )
+        return found
+
+    def mget(self, ids: Sequence[str]) -> List[Document | None]:
+        """ID のリストに対応するドキュメントをまとめて取得します。存在しない ID には None を返します。"""
+        missing = [
+            doc_id
+            for doc_id in ids
+            if doc_id not in self._pending and doc_id not in self._deleted
+        ]
+        found = self._fetch(missing)
+        return [
+            None
+            if doc_id in self._deleted
+            else self._pending.get(doc_id) or found.get(doc_id)
+            for doc_id in ids
+        ]
+
+    def search(self, search: str) -> Union[str, Document]:
+        doc = self.mget([search])[0]
+        if doc is None:
+            return f"ID {search} not found."
+        return doc
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = [
+            doc_id for doc_id, doc in zip(texts, self.mget(list(texts))) if doc is not None
+        ]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        for doc_id, doc in texts.items():
+            self._deleted.discard(doc_id)
+            self._pending[doc_id] = doc
+
+    def delete(self, ids: List) -> None:
+        for doc_id in ids:
+            self._pending.pop(doc_id, None)
+            self._deleted.add(doc_id)
+
+    def ids(self) -> Iterator[str]:
+        """保存済みと未保存のすべてのドキュメント ID を返します。"""
+        conn = self._connection()
+        if conn is not None:
+            with self._lock:
+                rows = conn.execute("SELECT id FROM chunks").fetchall()
+            for (doc_id,) in rows:
+                if doc_id not in self._deleted and doc_id not in self._pending:
+                    yield doc_id
+        yield from self._pending
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.ids())
+
+    def save(self, path: Path | str) -> "SqliteDocstore":
+        """
+        未保存の追加・削除をデータベースに書き込みます。
+        別のパスに保存する場合は、既存のデータベースをコピーしてから書き込み、一時ファイル経由でアトミックに置き換えます。
+
+        戻り値:
+        - SqliteDocstore: 保存先のデータベースを参照するドキュメントストア。
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        same_file = self.path is not None and self.path.exists() and self.path.resolve() == path.resolve()
+
+        if same_file:
+            conn = self._connection()
+            with self._lock:
+                self._write(conn)
+            self._pending, self._deleted = {}, set()
+            return self
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.unlink(missing_ok=True)
+        target = sqlite3.connect(tmp_path)
+        try:
+            source = self._connection()
+            if source is not None:
+                with self._lock:
+                    source.backup(target)
+            self._write(target)
+        finally:
+            target.close()
+        os.replace(tmp_path, path)
+        return SqliteDocstore(path)
+
+    def _write(self, conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute(_SCHEMA)
+            deleted = list(self._deleted)
+            for start in range(0, len(deleted), _BATCH_SIZE):
+                batch = deleted[start : start + _BATCH_SIZE]
+                conn.execute(
+                    f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, page_content, metadata) VALUES (?, ?, ?)",
+                (
+                    (
+                        doc_id,
+                        doc.page_content,
+                        json.dumps(doc.metadata, ensure_ascii=False, default=str),
+                    )
+                    for doc_id, doc in self._pending.items()
+                ),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
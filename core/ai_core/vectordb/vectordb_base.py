@@ -1,14 +1,26 @@
+import asyncio
 import logging
 
 from abc import ABC, abstractmethod
+from pathlib import Path
 from typing import Self, List
 
+import numpy as np
+
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_core.vectorstores import VectorStore
 
 from core.ai_core.knowledge_warehouse.serialization import VectordbConfig
-from core.ai_core.vectordb.vectordb_config import VectordbType
+from core.ai_core.vectordb.dimension_reducer import DimensionReducer, ReducedEmbeddings
+from core.ai_core.vectordb.sqlite_docstore import SqliteDocstore
+from core.ai_core.vectordb.vectordb_config import (
+    FaissIndexType,
+    ReductionConfig,
+    ReductionMethod,
+    VectordbType,
+    VectorIndexConfig,
+)
 
 logger = logging.getLogger("ai_core")
 
@@ -21,20 +33,63 @@ class VectordbBase(ABC):
 
     def __init__(self, vectordb_type: VectordbType) -> None:
         self.vectordb_type = vectordb_type
+        self.index_config = VectorIndexConfig()
+        self.reducer: DimensionReducer | None = None
 
     def check_build(self):
         if self.vector_db is None:
             raise ValueError("Can't save/load vectordb without building it first")
 
-    async def build(self, docs: list[Document], embedder: Embeddings) -> Self:
+    @property
+    def reduction_pending(self) -> bool:
+        """次元削減が設定されているが、まだ学習されていない（元の次元で保存している）かどうか。"""
+        return self.index_config.reduction is not None and self.reducer is None
+
+    @staticmethod
+    def _reduction_samples(reduction: ReductionConfig) -> int:
+        # PCA の学習には sample_size 件（少なくとも目標次元数）のベクトルが必要
+        if reduction.method != ReductionMethod.pca:
+            return 0
+        return max(reduction.sample_size, reduction.dimension)
+
+    async def build(
+        self,
+        docs: list[Document],
+        embedder: Embeddings,
+        index_config: VectorIndexConfig | None = None,
+    ) -> Self:
         logger.debug(f"Building vectordb {self.vectordb_type}")
         if docs is None or len(docs) == 0:
             raise ValueError("Can't initialize knowledge warehouse without documents")
         if embedder is None:
             raise ValueError("Can't initialize knowledge warehouse without an embedder")
         # self.docs = docs
-        self.embedder = embedder
-        self.vector_db = await self.build_impl(docs, embedder)
+        self.index_config = index_config or VectorIndexConfig()
+
+        reduction = self.index_config.reduction
+        if reduction is not None and len(docs) < self._reduction_samples(reduction):
+            # 学習に十分なチャンクが集まるまでは元の次元で保存し、aadd_documents で学習する
+            logger.info(
+                f"Deferring {reduction.method.value} reduction to {reduction.dimension} dims until "
+                f"{self._reduction_samples(reduction)} chunks are indexed ({len(docs)} so far)"
+            )
+            reduction = None
+
+        if reduction is None:
+            self.embedder = embedder
+            self.vector_db = await self.build_impl(docs, embedder)
+            return self
+
+        # 次元削減を行う場合は、元の次元で一度だけ embedding して変換を学習する
+        vectors = np.asarray(
+            await embedder.aembed_documents([doc.page_content for doc in docs]),
+            dtype=np.float32,
+        )
+        self.reducer = DimensionReducer(self.index_config.reduction).fit(vectors)
+        self.embedder = ReducedEmbeddings(embedder, self.reducer)
+        self.vector_db = await self.build_from_embeddings_impl(
+            docs, self.reducer.transform(vectors), self.embedder
+        )
         return self
 
     @abstractmethod
@@ -43,10 +98,67 @@ class VectordbBase(ABC):
     ) -> VectorStore:
         raise NotImplementedError
 
+    async def build_from_embeddings_impl(
+        self, docs: list[Document], vectors: np.ndarray, embedder: Embeddings
+    ) -> VectorStore:
+        """Build the vector store from precomputed (e.g. dimension-reduced) embeddings."""
+        raise NotImplementedError(
+            f"{self.vectordb_type} doesn't support building from embeddings"
+        )
+
+    async def aadd_documents(self, docs: list[Document]) -> List[str]:
+        """Embed and add documents to the vector store, returning their IDs."""
+        self.check_build()
+        ids = await self.vector_db.aadd_documents(docs)
+        if self.reduction_pending and len(self.get_all_ids()) >= self._reduction_samples(
+            self.index_config.reduction
+        ):
+            await self._apply_pending_reduction()
+        return ids
+
+    async def _apply_pending_reduction(self) -> None:
+        # 保存済みのチャンクで変換を学習し、削減した次元の vector store を作り直す（チャンク ID は保たれる）
+        ids = self.get_all_ids()
+        docs = self.get_documents(ids)
+        vectors = None
+        if (
+            hasattr(self.vector_db, "get_vectors")
+            and self.index_config.faiss.index_type != FaissIndexType.ivf_pq
+        ):
+            # IVF-PQ から取り出したベクトルは近似値のため、その場合は embedding し直す
+            vectors = await asyncio.to_thread(self.vector_db.get_vectors, ids)
+        if vectors is None:
+            vectors = await self.embedder.aembed_documents([doc.page_content for doc in docs])
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        reducer = await asyncio.to_thread(
+            DimensionReducer(self.index_config.reduction).fit, vectors
+        )
+        embedder = ReducedEmbeddings(self.embedder, reducer)
+        vector_db = await self.build_from_embeddings_impl(
+            docs, reducer.transform(vectors), embedder
+        )
+        self.reducer, self.embedder, self.vector_db = reducer, embedder, vector_db
+
+    async def adelete(self, ids: List[str]) -> None:
+        """Delete documents from the vector store by ID."""
+        self.check_build()
+        if ids:
+            await self.vector_db.adelete(ids)
+
     async def save(self, kw_path: str) -> VectordbConfig:
         logger.debug(f"Saving vectordb {self.vectordb_type} to {kw_path}")
         self.check_build()
-        return await self.save_impl(kw_path)
+        config = await self.save_impl(kw_path)
+        config.index_config = self.index_config
+        if self.reducer is not None:
+            self.reducer.save(config.vectordb_folder_path)
+        else:
+            # 学習前の状態で保存する場合、以前に保存した変換を読み込まないようにする
+            (Path(config.vectordb_folder_path) / DimensionReducer.FILE_NAME).unlink(
+                missing_ok=True
+            )
+        return config
 
     @abstractmethod
     async def save_impl(self, kw_path: str) -> VectordbConfig:
@@ -58,6 +170,11 @@ class VectordbBase(ABC):
         )
         # get docs from vector db
         # self.docs = self.vector_db.get_by_ids(config.docs_ids)
+        self.index_config = config.index_config
+        reducer_path = Path(config.vectordb_folder_path) / DimensionReducer.FILE_NAME
+        if self.index_config.reduction is not None and reducer_path.exists():
+            self.reducer = DimensionReducer.load(config.vectordb_folder_path)
+            embedder = ReducedEmbeddings(embedder, self.reducer)
         self.embedder = embedder
         self.vector_db = self.load_impl(config, embedder)
         return self
@@ -68,6 +185,27 @@ class VectordbBase(ABC):
 
     def get_all_ids(self) -> List[str]:
         """Get all document IDs from the vector store."""
-        if hasattr(self.vector_db, "docstore"):
-            return list(self.vector_db.docstore._dict.keys())
+        docstore = getattr(self.vector_db, "docstore", None)
+        if isinstance(docstore, SqliteDocstore):
+            return list(docstore.ids())
+        if docstore is not None:
+            return list(docstore._dict.keys())
         return []
+
+    def get_documents(self, ids: List[str]) -> List[Document]:
+        """Get documents by ID from the vector store, keeping their IDs."""
+        docs = []
+        docstore = getattr(self.vector_db, "docstore", None)
+        if docstore is not None:
+            if isinstance(docstore, SqliteDocstore):
+                found = docstore.mget(ids)
+            else:
+                found = [docstore.search(doc_id) for doc_id in ids]
+            for doc_id, doc in zip(ids, found, strict=False):
+                if isinstance(doc, Document):
+                    docs.append(
+                        Document(
+                            id=doc_id, page_content=doc.page_content, metadata=doc.metadata
+                        )
+                    )
+        return docs
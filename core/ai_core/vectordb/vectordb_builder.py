@@ -6,7 +6,11 @@ from langchain_core.embeddings import Embeddings
 from core.ai_core.knowledge_warehouse.serialization import VectordbConfig
 from core.ai_core.vectordb.vectordb_registry import get_vectordb_class
 from core.ai_core.vectordb.vectordb_base import VectordbBase
-from core.ai_core.vectordb.vectordb_config import default_vectordb_type, VectordbType
+from core.ai_core.vectordb.vectordb_config import (
+    default_vectordb_type,
+    VectordbType,
+    VectorIndexConfig,
+)
 
 logger = logging.getLogger("ai_core")
 
@@ -15,20 +19,38 @@ class VectordbBuilder:
 
     @classmethod
     async def build_default_vectordb(
-        cls, docs: list[Document], embedder: Embeddings
+        cls,
+        docs: list[Document],
+        embedder: Embeddings,
+        index_config: VectorIndexConfig | None = None,
     ) -> VectordbBase:
-        return await cls.build_vectordb(default_vectordb_type(), docs, embedder)
+        return await cls.build_vectordb(
+            default_vectordb_type(), docs, embedder, index_config
+        )
 
     @classmethod
     async def build_vectordb(
-        cls, vectordb_type: VectordbType, docs: list[Document], embedder: Embeddings
+        cls,
+        vectordb_type: VectordbType,
+        docs: list[Document],
+        embedder: Embeddings,
+        index_config: VectorIndexConfig | None = None,
     ) -> VectordbBase:
         vectordb_cls = get_vectordb_class(vectordb_type)
-        return await vectordb_cls().build(docs, embedder)
+        return await vectordb_cls().build(docs, embedder, index_config)
 
     @classmethod
     def load_vectordb(
-        cls, config: VectordbConfig, embeddings: Embeddings
+        cls,
+        config: VectordbConfig,
+        embeddings: Embeddings,
+        allow_dangerous_deserialization: bool | None = None,
     ) -> VectordbBase:
         vectordb_cls = get_vectordb_class(config.vectordb_type)
-        return vectordb_cls().load(config, embeddings)
+        # None の場合は各 vector db のデフォルト（環境変数 `AI_ALLOW_LEGACY_PICKLE`）に従う
+        kwargs = (
+            {}
+            if allow_dangerous_deserialization is None
+            else {"allow_dangerous_deserialization": allow_dangerous_deserialization}
+        )
+        return vectordb_cls(**kwargs).load(config, embeddings)
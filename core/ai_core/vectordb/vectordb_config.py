@@ -1,5 +1,9 @@
 from enum import Enum
 
+from pydantic import BaseModel, Field, model_validator
+
+from core.ai_core.vectordb.metadata_index import DEFAULT_METADATA_KEYS
+
 
 class VectordbType(str, Enum):
     FaissCPU = "Faiss-CPU"
@@ -8,3 +12,78 @@ class VectordbType(str, Enum):
 
 def default_vectordb_type() -> VectordbType:
     return VectordbType.FaissCPU
+
+
+class ReductionMethod(str, Enum):
+    # サンプルで学習した PCA で射影する
+    pca = "pca"
+    # 先頭の次元のみを使用する（Matryoshka 学習済みのモデル向け）
+    truncate = "truncate"
+
+
+class ReductionConfig(BaseModel):
+    method: ReductionMethod = ReductionMethod.pca
+    dimension: int = 256
+    sample_size: int = 10000
+    normalize: bool = True
+    recall_queries: int = 200
+    recall_k: int = 10
+
+
+class FaissIndexType(str, Enum):
+    # 全件探索（学習不要・厳密）
+    flat = "flat"
+    # 転置ファイル + 非圧縮ベクトル
+    ivf_flat = "ivf_flat"
+    # 転置ファイル + 直積量子化（メモリ削減）
+    ivf_pq = "ivf_pq"
+    # グラフベースの近似最近傍探索（学習不要）
+    hnsw = "hnsw"
+
+
+class FaissIndexConfig(BaseModel):
+    index_type: FaissIndexType = FaissIndexType.flat
+    # IVF: クラスタ数（None の場合はベクトル数から 4 * sqrt(n) を使用）と探索するクラスタ数
+    nlist: int | None = None
+    nprobe: int = 16
+    # PQ: サブベクトル数とサブベクトルあたりのビット数
+    pq_m: int = 16
+    pq_nbits: int = 8
+    # HNSW: ノードあたりのリンク数と構築時・探索時の候補数
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+    # IVF 系の学習に使用するサンプル数と、Flat から切り替える最小ベクトル数
+    train_sample_size: int = 50000
+    min_train_size: int = 1000
+    # 削除済みベクトルの割合がこの値を超えたらバックグラウンドでインデックスを詰め直す
+    compaction_threshold: float = 0.2
+    # 差分を保存したセグメントの数、またはその合計がベースのインデックスに対してこの割合を超えたら、バックグラウンドでまとめる
+    max_segments: int = 8
+    segment_merge_ratio: float = 0.2
+    # フィルタ付き検索を高速化するために転置インデックスを作成するメタデータのキー（タグなどの独自のキーを追加できます）
+    metadata_keys: list[str] = Field(default_factory=lambda: list(DEFAULT_METADATA_KEYS))
+    # 構築時にチャンクのテキストの BM25 インデックスを作成するかどうか（ハイブリッド検索で使用）
+    lexical_index: bool = True
+
+    @model_validator(mode="after")
+    def check_train_size(self) -> "FaissIndexConfig":
+        # PQ の各サブ量子化器は 2**pq_nbits 個のセントロイドを学習するため、それ以上のサンプルが必要
+        if self.index_type == FaissIndexType.ivf_pq:
+            required = max(self.nlist or 1, 2**self.pq_nbits)
+            if self.min_train_size < required:
+                raise ValueError(
+                    f"min_train_size ({self.min_train_size}) must be at least "
+                    f"max(nlist, 2**pq_nbits) = {required} for {self.index_type.value} indexes"
+                )
+            if self.train_sample_size < required:
+                raise ValueError(
+                    f"train_sample_size ({self.train_sample_size}) must be at least "
+                    f"max(nlist, 2**pq_nbits) = {required} for {self.index_type.value} indexes"
+                )
+        return self
+
+
+class VectorIndexConfig(BaseModel):
+    reduction: ReductionConfig | None = None
+    faiss: FaissIndexConfig = FaissIndexConfig()
@@ -11,6 +11,7 @@ from streamlit_ui.authentication import knowledge_warehouses_key, selected_knowl
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from core.ai_core.knowledge_warehouse.knowledge_warehouse import KnowledgeWarehouse
+from core.ai_core.knowledge_warehouse.models.ingestion_status import IngestionStatus
 from core.ai_core.storage.storage_builder import StorageBuilder, StorageType
 from core.ai_core.files.file import AIFile
 
@@ -90,6 +91,24 @@ def save_knowledge_warehouse(kw: KnowledgeWarehouse):
         st.error(f"Error saving knowledge warehouse: {str(e)}")
 
 
+def ingestion_progress():
+    progress_bar = st.progress(0.0)
+
+    def on_status(status: IngestionStatus):
+        eta = f", ETA {status.eta:.0f}s" if status.eta is not None else ""
+        progress_bar.progress(
+            status.progress,
+            text=(
+                f"Files: {status.files_indexed}/{status.files_total} indexed, "
+                f"{status.files_parsed - status.files_indexed} parsed, "
+                f"{status.files_queued} queued "
+                f"({status.chunks_per_sec:.1f} chunks/s{eta})"
+            ),
+        )
+
+    return on_status
+
+
 def create_knowledge_warehouse(name: str, files, storage_path: str):
     try:
         # Save uploaded files temporarily
@@ -110,6 +129,7 @@ def create_knowledge_warehouse(name: str, files, storage_path: str):
                     storage=StorageBuilder.build_storage(
                         StorageType.LocalStorage, storage_path, True
                     ),
+                    on_status=ingestion_progress(),
                 )
             )
         except Exception as e:
@@ -164,7 +184,7 @@ def add_files_to_knowledge_warehouse(kw: KnowledgeWarehouse, files) -> bool:
 
         try:
             # Add files to existing knowledge warehouse
-            asyncio.run(kw.aadd_files(file_paths))
+            asyncio.run(kw.aadd_files(file_paths, on_status=ingestion_progress()))
         except Exception as e:
             st.error(f"Error adding files: {str(e)}")
             return False
@@ -0,0 +1,41 @@
+from core.ai_core.rag.answer_cache import SemanticAnswerCache
+from core.ai_core.rag.entities.models import ParsedRAGResponse
+
+
+def _scope(kw_id: str, version: str | None = "v1") -> tuple:
+    return ((kw_id, version, None),), "pipeline"
+
+
+def test_similar_questions_share_the_answer_within_a_scope():
+    cache = SemanticAnswerCache()
+    question = "How do I reset my password?"
+    cache.put(_scope("kw"), question, [1.0, 0.0], ParsedRAGResponse(answer="A"))
+
+    # 正規化した質問が同じ場合は embedding によらず一致する
+    assert cache.get(_scope("kw"), " How do I  reset my password? ", [0.0, 1.0], 0.9).answer == "A"
+    assert cache.get(_scope("kw"), "Reset password?", [0.99, 0.05], 0.9).answer == "A"
+    assert cache.get(_scope("kw"), "Unrelated", [0.0, 1.0], 0.9) is None
+    assert cache.get(_scope("kw", "v2"), question, [1.0, 0.0], 0.9) is None
+
+
+def test_invalidate_removes_scopes_of_the_warehouse():
+    cache = SemanticAnswerCache()
+    cache.put(_scope("a"), "q", [1.0, 0.0], ParsedRAGResponse(answer="A"))
+    cache.put(_scope("b"), "q", [1.0, 0.0], ParsedRAGResponse(answer="B"))
+
+    cache.invalidate(("a", "v1", None))
+
+    assert cache.get(_scope("a"), "q", [1.0, 0.0], 0.9) is None
+    assert cache.get(_scope("b"), "q", [1.0, 0.0], 0.9).answer == "B"
+
+
+def test_expired_scopes_are_removed_when_other_scopes_are_written(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("core.ai_core.rag.answer_cache.time.monotonic", lambda: now[0])
+    cache = SemanticAnswerCache(ttl=10.0)
+    cache.put(_scope("old"), "q", [1.0, 0.0], ParsedRAGResponse(answer="A"))
+
+    now[0] += 11.0
+    cache.put(_scope("new"), "q", [1.0, 0.0], ParsedRAGResponse(answer="B"))
+
+    assert list(cache._scopes) == [_scope("new")]
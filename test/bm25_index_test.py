@@ -0,0 +1,83 @@
+from core.ai_core.vectordb.bm25_index import BM25Index, tokenize
+
+
+def test_tokenize_words_are_normalized_and_lowercased():
+    # NFKC 正規化で全角英数字は半角になる
+    assert tokenize("Hello ＷＯＲＬＤ 123") == ["hello", "world", "123"]
+
+
+def test_tokenize_keeps_part_numbers_with_and_without_separators():
+    assert tokenize("Model ABC-1234 v1.2") == [
+        "model",
+        "abc-1234",
+        "abc1234",
+        "v1.2",
+        "v12",
+    ]
+
+
+def test_tokenize_cjk_runs_into_bigrams():
+    assert tokenize("東京都") == ["東京", "京都"]
+    assert tokenize("猫") == ["猫"]
+    assert tokenize("AI の検索") == ["ai", "の検", "検索"]
+
+
+def _index() -> BM25Index:
+    index = BM25Index()
+    index.add(
+        [
+            ("a", "The quick brown fox jumps over the lazy dog"),
+            ("b", "The error code ABC-1234 is raised when the disk is full"),
+            ("c", "東京都の天気は晴れです"),
+            ("d", "Brown bears and brown foxes"),
+        ]
+    )
+    return index
+
+
+def test_search_ranks_matching_documents():
+    index = _index()
+
+    results = index.search("brown fox")
+    assert [doc_id for doc_id, _ in results] == ["a", "d"]
+    assert results[0][1] > results[1][1] > 0
+    assert index.search("unknown words") == []
+
+
+def test_search_matches_part_numbers_and_japanese():
+    index = _index()
+
+    assert [doc_id for doc_id, _ in index.search("abc1234")] == ["b"]
+    assert [doc_id for doc_id, _ in index.search("ABC-1234")] == ["b"]
+    assert [doc_id for doc_id, _ in index.search("東京の天気")] == ["c"]
+
+
+def test_search_prefers_rare_terms_and_respects_limit():
+    index = _index()
+
+    # "the" は複数のドキュメントに出現するため、"disk" の方が重みが大きい
+    assert index.search("the disk")[0][0] == "b"
+    assert len(index.search("the brown", limit=1)) == 1
+    assert index.search("the brown", limit=1) == index.search("the brown")[:1]
+
+
+def test_add_replaces_and_delete_removes_documents():
+    index = _index()
+    index.add([("a", "A completely different text")])
+    index.delete(["d", "missing"])
+
+    assert len(index) == 3
+    assert index.search("brown") == []
+    assert [doc_id for doc_id, _ in index.search("different")] == ["a"]
+    assert BM25Index().search("anything") == []
+
+
+def test_save_and_load(tmp_path):
+    index = _index()
+    path = tmp_path / "index.bm25.json"
+    index.save(path)
+    loaded = BM25Index.load(path)
+
+    assert len(loaded) == len(index)
+    assert loaded.search("brown fox") == index.search("brown fox")
+    assert loaded.search("天気") == index.search("天気")
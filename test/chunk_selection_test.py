@@ -0,0 +1,72 @@
+import numpy as np
+
+from langchain_core.documents import Document
+
+from core.ai_core.rag.chunk_selection import merge_chunks, mmr_order
+
+
+def _doc(content: str, id: str | None = None, **metadata) -> Document:
+    return Document(page_content=content, id=id, metadata=metadata)
+
+
+def test_merge_chunks_interleaves_task_results_by_rank():
+    results = [
+        [_doc("a1", "a1"), _doc("a2", "a2")],
+        [_doc("b1", "b1"), _doc("b2", "b2"), _doc("b3", "b3")],
+    ]
+    merged = merge_chunks(results, score_keys=["relevance_score"])
+
+    assert [doc.id for doc in merged] == ["a1", "b1", "a2", "b2", "b3"]
+
+
+def test_merge_chunks_deduplicates_by_id_and_content_keeping_max_score():
+    results = [
+        [_doc("same text", "x", score=0.4), _doc("other", "y", score=0.9)],
+        [_doc("same text", None, score=0.7), _doc("different text", "y", score=0.2)],
+    ]
+    merged = merge_chunks(results, score_keys=["score"])
+
+    # 内容が同じチャンク（ID なし）と ID が同じチャンクはまとめられる
+    assert [doc.id for doc in merged] == ["y", "x"]
+    assert [doc.metadata["score"] for doc in merged] == [0.9, 0.7]
+
+
+def test_merge_chunks_uses_the_first_score_key_present_on_all_chunks():
+    results = [
+        [_doc("a", "a", relevance_score=0.1, similarity=0.9)],
+        [_doc("b", "b", similarity=0.5), _doc("c", "c", relevance_score=0.8, similarity=0.7)],
+    ]
+    merged = merge_chunks(results, score_keys=["relevance_score", "similarity"])
+
+    assert [doc.id for doc in merged] == ["a", "c", "b"]
+
+
+def test_merge_chunks_copies_metadata():
+    original = _doc("text", "a", score=0.1)
+    merged = merge_chunks([[original], [_doc("text", "a", score=0.5)]], score_keys=["score"])
+
+    assert merged[0].metadata["score"] == 0.5
+    assert original.metadata["score"] == 0.1
+    assert merge_chunks([], score_keys=["score"]) == []
+
+
+def test_mmr_order_with_lambda_one_is_relevance_order():
+    relevance = np.array([0.2, 0.9, 0.5])
+    vectors = np.eye(3)
+
+    assert mmr_order(relevance, vectors, lambda_mult=1.0) == [1, 2, 0]
+
+
+def test_mmr_order_skips_near_duplicates():
+    relevance = np.array([1.0, 0.95, 0.6])
+    vectors = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]])
+
+    # 2 番目に関連度の高い候補は 1 番目とほぼ同じ向きのため、後回しにされる
+    assert mmr_order(relevance, vectors, lambda_mult=0.5) == [0, 2, 1]
+
+
+def test_mmr_order_handles_equal_relevance_and_empty_input():
+    vectors = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 2.0]])
+
+    assert mmr_order(np.array([0.3, 0.3, 0.3]), vectors, lambda_mult=0.5) == [0, 2, 1]
+    assert mmr_order(np.array([]), np.empty((0, 2)), lambda_mult=0.5) == []
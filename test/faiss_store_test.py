@@ -0,0 +1,54 @@
+import zlib
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+
+from core.ai_core.vectordb.impl.faiss_store import FaissStore
+from core.ai_core.vectordb.vectordb_config import FaissIndexConfig, FaissIndexType
+
+
+class _HashEmbeddings(Embeddings):
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        rng = np.random.default_rng(zlib.crc32(text.encode()))
+        return rng.standard_normal(16).astype(np.float32).tolist()
+
+
+def _ivf_store(n: int = 1000) -> tuple[FaissStore, list[str]]:
+    ids = [f"doc{i}" for i in range(n)]
+    store = FaissStore.from_texts(
+        [f"text {i}" for i in range(n)], _HashEmbeddings(), ids=ids
+    )
+    config = FaissIndexConfig(index_type=FaissIndexType.ivf_flat, min_train_size=100)
+    assert store.apply_index_config(config)
+    return store, ids
+
+
+def test_get_vectors_returns_the_stored_vectors():
+    store, ids = _ivf_store()
+    embeddings = _HashEmbeddings()
+
+    vectors = store.get_vectors(ids[:5])
+
+    expected = np.asarray(embeddings.embed_documents([f"text {i}" for i in range(5)]))
+    np.testing.assert_allclose(vectors, expected, rtol=1e-5)
+    assert store.get_vectors(["missing"]) is None
+
+
+def test_get_vectors_does_not_prevent_compaction_of_ivf_indexes():
+    store, ids = _ivf_store()
+
+    store.get_vectors(ids[:10])
+    store.delete(ids[:500])
+
+    assert store.compact() == 500
+    assert store.index.ntotal == 500
+    # compact で位置が変わった後も正しいベクトルを返す
+    vectors = store.get_vectors(ids[500:503])
+    expected = np.asarray(
+        _HashEmbeddings().embed_documents([f"text {i}" for i in range(500, 503)])
+    )
+    np.testing.assert_allclose(vectors, expected, rtol=1e-5)
@@ -0,0 +1,33 @@
+import zlib
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+
+from core.ai_core.vectordb.federated_store import FederatedVectorStore
+from core.ai_core.vectordb.impl.faiss_store import FaissStore
+
+
+class _HashEmbeddings(Embeddings):
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        rng = np.random.default_rng(zlib.crc32(text.encode()))
+        return rng.standard_normal(16).astype(np.float32).tolist()
+
+
+def test_searches_all_shards_with_a_shared_thread_pool():
+    embeddings = _HashEmbeddings()
+    shards = [
+        FaissStore.from_texts([f"a{i}" for i in range(10)], embeddings),
+        FaissStore.from_texts([f"b{i}" for i in range(10)], embeddings),
+    ]
+
+    first = FederatedVectorStore(shards)
+    second = FederatedVectorStore(shards[:1])
+
+    # インスタンスごとにスレッドプールを作成しない
+    assert first._executor is second._executor
+    assert first.similarity_search("b3", k=1)[0].page_content == "b3"
+    assert first.similarity_search("a7", k=1)[0].page_content == "a7"
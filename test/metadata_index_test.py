@@ -0,0 +1,112 @@
+from uuid import uuid4
+
+import numpy as np
+
+from core.ai_core.vectordb.metadata_index import MetadataIndex, normalize_metadata
+
+
+def _index() -> MetadataIndex:
+    index = MetadataIndex(["file", "page"])
+    index.add(
+        0,
+        [
+            {"file": "a", "page": 1},
+            {"file": "a", "page": 2},
+            {"file": "b", "page": 1},
+            {"file": "c"},
+            None,
+            {"file": "b", "page": 3, "lang": "ja"},
+        ],
+    )
+    return index
+
+
+def _positions(result: np.ndarray | None) -> list[int] | None:
+    return None if result is None else result.tolist()
+
+
+def test_equality_and_in():
+    index = _index()
+
+    assert _positions(index.candidates({"file": "a"})) == [0, 1]
+    assert _positions(index.candidates({"file": {"$eq": "b"}})) == [2, 5]
+    assert _positions(index.candidates({"file": {"$in": ["a", "c"]}})) == [0, 1, 3]
+    assert _positions(index.candidates({"file": ["b", "missing"]})) == [2, 5]
+    assert _positions(index.candidates({"file": "missing"})) == []
+
+
+def test_comparisons_and_combinations():
+    index = _index()
+
+    assert _positions(index.candidates({"page": {"$gte": 2}})) == [1, 5]
+    assert _positions(index.candidates({"file": "a", "page": {"$lt": 2}})) == [0]
+    assert _positions(index.candidates({"$and": [{"file": "b"}, {"page": 3}]})) == [5]
+    assert _positions(index.candidates({"$or": [{"file": "c"}, {"page": 2}]})) == [1, 3]
+
+
+def test_nin_and_neq_include_chunks_without_the_key():
+    index = _index()
+
+    # キーがないチャンク（位置 3 の page、位置 4 のメタデータなし）も条件を満たす
+    assert _positions(index.candidates({"page": {"$nin": [1, 3]}})) == [1, 3, 4]
+    assert _positions(index.candidates({"file": {"$nin": ["a", "b"]}})) == [3, 4]
+    assert _positions(index.candidates({"file": {"$neq": "a"}})) == [2, 3, 4, 5]
+    assert _positions(index.candidates({"file": {"$nin": []}})) == [0, 1, 2, 3, 4, 5]
+
+
+def test_not_of_an_exact_condition_is_the_complement():
+    index = _index()
+
+    assert _positions(index.candidates({"$not": {"file": "a"}})) == [2, 3, 4, 5]
+    assert _positions(index.candidates({"$not": {"page": {"$in": [1, 2]}}})) == [3, 4, 5]
+    either = {"$or": [{"file": "a"}, {"file": "b"}]}
+    assert _positions(index.candidates({"$not": either})) == [3, 4]
+
+
+def test_not_of_an_inexact_condition_is_not_narrowed():
+    index = _index()
+
+    # インデックスされていないキーを含む条件の補集合は求められない
+    assert index.candidates({"$not": {"lang": "ja"}}) is None
+    assert index.candidates({"$not": {"file": "b", "lang": "ja"}}) is None
+    # 絞り込めるのは完全に一致する条件のみで、インデックスされていない部分は無視される
+    assert _positions(index.candidates({"file": "b", "lang": "ja"})) == [2, 5]
+    assert index.candidates({"lang": "ja"}) is None
+
+
+def test_unindexable_values_are_not_narrowed():
+    index = _index()
+
+    assert index.candidates({"file": None}) is None
+    assert index.candidates({"file": {"$in": ["a", None]}}) is None
+    assert index.candidates({"page": {"$unknown": 1}}) is None
+    # 比較できない型の値
+    assert index.candidates({"file": {"$gt": 1}}) is None
+
+
+def test_uuid_and_path_values_are_compared_as_strings():
+    file_id = uuid4()
+    index = MetadataIndex(["aifile_id"])
+    index.add(0, [{"aifile_id": file_id}, {"aifile_id": str(uuid4())}])
+
+    assert normalize_metadata({"a": [file_id]}) == {"a": [str(file_id)]}
+    assert _positions(index.candidates({"aifile_id": file_id})) == [0]
+    assert _positions(index.candidates({"aifile_id": str(file_id)})) == [0]
+    assert _positions(index.candidates({"aifile_id": {"$nin": [file_id]}})) == [1]
+
+
+def test_remap_and_save_load(tmp_path):
+    index = _index()
+    index.remap(np.array([-1, 0, 1, -1, 2, 3]))
+
+    assert index.size == 4
+    assert _positions(index.candidates({"file": "b"})) == [1, 3]
+    assert _positions(index.candidates({"$not": {"file": "a"}})) == [1, 2, 3]
+
+    path = tmp_path / "index.metadata.json"
+    index.save(path)
+    loaded = MetadataIndex.load(path)
+
+    assert loaded.keys == ["file", "page"]
+    assert _positions(loaded.candidates({"page": {"$nin": [1]}})) == [0, 2, 3]
+    assert _positions(loaded.candidates({"file": "c"})) == []
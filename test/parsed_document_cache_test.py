@@ -0,0 +1,60 @@
+import os
+import time
+
+from pathlib import Path
+from uuid import uuid4
+
+from langchain_core.documents import Document
+
+from core.ai_core.files.file import AIFile
+from core.ai_core.processor.parsed_document_cache import ParsedDocumentCache
+
+
+def _file(sha1: str = "abc") -> AIFile:
+    return AIFile(
+        file_id=uuid4(),
+        kw_id=uuid4(),
+        original_filename="doc.txt",
+        path=Path("doc.txt"),
+        file_sha1=sha1,
+        file_extension=".txt",
+    )
+
+
+def _docs(text: str = "text") -> list[Document]:
+    return [Document(page_content=text, metadata={"page": 1})]
+
+
+def test_entries_are_removed_when_the_last_file_is_released(tmp_path):
+    cache = ParsedDocumentCache(tmp_path)
+    first, second = _file(), _file()
+    cache.retain(first)
+    cache.retain(second)
+    cache.put("abc", "Loader", _docs())
+
+    cache.release(first)
+    assert cache.get("abc", "Loader") is not None
+
+    cache.release(second)
+    assert cache.get("abc", "Loader") is None
+    assert not (tmp_path / ParsedDocumentCache.REFS_DIR / "abc").exists()
+
+
+def test_prune_removes_expired_and_least_recently_used_entries(tmp_path):
+    cache = ParsedDocumentCache(tmp_path, max_age=3600)
+    for sha1 in ("old", "a", "b", "c"):
+        cache.put(sha1, "Loader", _docs("x" * 1000))
+    now = time.time()
+    os.utime(cache.cache_path("old", "Loader"), (now - 7200, now - 7200))
+    for age, sha1 in ((30, "a"), (20, "b"), (10, "c")):
+        os.utime(cache.cache_path(sha1, "Loader"), (now - age, now - age))
+
+    # 読み込んだエントリは最近使用したものとして扱う
+    assert cache.get("a", "Loader") is not None
+    cache.max_bytes = os.path.getsize(cache.cache_path("a", "Loader")) * 2
+
+    assert cache.prune() == 2
+    assert cache.get("old", "Loader") is None
+    assert cache.get("b", "Loader") is None
+    assert cache.get("a", "Loader") is not None
+    assert cache.get("c", "Loader") is not None
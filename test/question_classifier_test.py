@@ -0,0 +1,56 @@
+import pytest
+
+from core.ai_core.rag.question_classifier import depends_on_history
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "What is the refund policy for annual subscriptions?",
+        "How do I configure the proxy settings on Windows?",
+        "年次契約の返金ポリシーを教えてください。",
+        "Windows でプロキシを設定する方法を教えてください",
+        # 単独の質問にも頻出する語
+        "Is there a plan that includes more than one admin account?",
+        "Which plans have the same storage limit as the free tier?",
+        "What happens when the trial ends and then I upgrade to a paid plan?",
+        "Do discounts apply to those who pay annually?",
+    ],
+)
+def test_standalone_questions(question):
+    assert not depends_on_history(question)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        # 代名詞・指示語
+        "How much does it cost per month?",
+        "Can you compare those two plans for small teams?",
+        "That sounds expensive, is there a discount for students?",
+        "Could you explain the second step of this?",
+        "Which one is cheaper, this one or the enterprise plan?",
+        "Summarize your previous answer in three bullet points",
+        "それの料金を詳しく教えてください。",
+        "上記の手順をもう少し詳しく説明してください",
+        # 前の質問の続き
+        "And for the enterprise plan, is the refund policy different?",
+        "What about customers located in the European Union?",
+        "では、法人向けプランの場合はどうなりますか？",
+        # 省略された短い質問
+        "Why?",
+        "Pricing details?",
+        "料金は？",
+        # 空の質問
+        "",
+        "   ",
+    ],
+)
+def test_questions_that_depend_on_history(question):
+    assert depends_on_history(question)
+
+
+def test_references_match_whole_words_only():
+    # "item" や "hitherto" に含まれる "it" は代名詞とみなさない
+    assert not depends_on_history("Which item categories are excluded from the warranty program?")
+    assert not depends_on_history("Summarize the hitherto unpublished release notes for version 2")
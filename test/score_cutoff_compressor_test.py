@@ -0,0 +1,63 @@
+from langchain_core.documents import Document
+
+from core.ai_core.rag.ai_rag_reranker import ScoreCutoffCompressor
+from core.ai_core.rag.ai_rag_retriever import SIMILARITY_SCORE_KEY
+
+
+def _docs(*scores: float) -> list[Document]:
+    return [
+        Document(page_content=f"chunk {i}", metadata={SIMILARITY_SCORE_KEY: score})
+        for i, score in enumerate(scores)
+    ]
+
+
+def _scores(docs) -> list[float]:
+    return [doc.metadata[SIMILARITY_SCORE_KEY] for doc in docs]
+
+
+def test_cuts_at_the_largest_gap():
+    compressor = ScoreCutoffCompressor(min_chunks=2, gap_ratio=0.2)
+    docs = compressor.compress_documents(_docs(0.90, 0.88, 0.86, 0.50, 0.48), "query")
+
+    assert _scores(docs) == [0.90, 0.88, 0.86]
+
+
+def test_sorts_by_similarity_and_copies_it_to_the_relevance_score():
+    compressor = ScoreCutoffCompressor(min_chunks=5, relevance_score_key="score")
+    docs = compressor.compress_documents(_docs(0.5, 0.9, 0.7), "query")
+
+    assert _scores(docs) == [0.9, 0.7, 0.5]
+    assert [doc.metadata["score"] for doc in docs] == [0.9, 0.7, 0.5]
+
+
+def test_keeps_an_existing_relevance_score():
+    docs = _docs(0.9, 0.8)
+    docs[0].metadata["relevance_score"] = 0.1
+    docs = ScoreCutoffCompressor().compress_documents(docs, "query")
+
+    assert [doc.metadata["relevance_score"] for doc in docs] == [0.1, 0.8]
+
+
+def test_keeps_at_least_min_chunks():
+    compressor = ScoreCutoffCompressor(min_chunks=3, gap_ratio=0.2)
+    docs = compressor.compress_documents(_docs(0.9, 0.5, 0.48, 0.1, 0.09), "query")
+
+    # 最大の差は 1 件目と 2 件目の間だが、min_chunks 件より前では切らない
+    assert _scores(docs) == [0.9, 0.5, 0.48]
+
+
+def test_does_not_cut_small_gaps_or_flat_scores():
+    compressor = ScoreCutoffCompressor(min_chunks=1, gap_ratio=0.5)
+
+    assert len(compressor.compress_documents(_docs(0.9, 0.8, 0.7, 0.6), "query")) == 4
+    assert len(compressor.compress_documents(_docs(0.5, 0.5, 0.5), "query")) == 3
+
+
+def test_disabled_cutoff_and_missing_similarity():
+    compressor = ScoreCutoffCompressor(min_chunks=1, gap_ratio=None)
+    assert len(compressor.compress_documents(_docs(0.9, 0.1), "query")) == 2
+
+    # 類似度がないチャンクを含む場合（ハイブリッド検索など）はそのまま返す
+    docs = _docs(0.1, 0.9) + [Document(page_content="lexical match")]
+    assert ScoreCutoffCompressor(min_chunks=1).compress_documents(docs, "query") == docs
+    assert ScoreCutoffCompressor().compress_documents([], "query") == []
@@ -0,0 +1,82 @@
+from langchain_core.documents import Document
+
+from core.ai_core.processor.splitter import TikTokenSplitter
+
+
+def _paragraphs(count: int, sentences: int = 6) -> str:
+    return "\n\n".join(
+        " ".join(f"Paragraph {p} sentence {s} is here." for s in range(sentences))
+        for p in range(count)
+    )
+
+
+def test_short_text_is_a_single_chunk():
+    splitter = TikTokenSplitter(chunk_size=100, chunk_overlap=10)
+    docs = splitter.create_documents(["Hello world."], [{"source": "a.txt"}])
+
+    assert len(docs) == 1
+    assert docs[0].page_content == "Hello world."
+    assert docs[0].metadata["source"] == "a.txt"
+    assert docs[0].metadata["chunk_size"] == len(splitter._enc.encode_ordinary("Hello world."))
+
+
+def test_chunks_respect_chunk_size_and_cover_the_text():
+    text = _paragraphs(8)
+    splitter = TikTokenSplitter(chunk_size=60, chunk_overlap=0)
+    docs = splitter.split_text(text)
+
+    assert len(docs) > 1
+    assert "".join(docs) == text
+    for doc in splitter.create_documents([text]):
+        assert doc.metadata["chunk_size"] <= 60
+
+
+def test_chunks_prefer_paragraph_boundaries():
+    text = _paragraphs(6, sentences=2)
+    splitter = TikTokenSplitter(chunk_size=80, chunk_overlap=0)
+    chunks = splitter.split_text(text)
+
+    # 段落の区切りが範囲内にある場合は、段落の途中で切らない
+    for chunk in chunks[:-1]:
+        assert chunk.endswith("\n\n")
+
+
+def test_overlap_starts_at_a_boundary_within_chunk_overlap():
+    text = _paragraphs(8)
+    splitter = TikTokenSplitter(chunk_size=60, chunk_overlap=20)
+    chunks = splitter.split_text(text)
+
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:], strict=False):
+        # 次のチャンクは前のチャンクの末尾（chunk_overlap トークン以内）から始まる
+        overlap = next(
+            previous[i:] for i in range(len(previous)) if current.startswith(previous[i:])
+        )
+        assert overlap
+        assert len(splitter._enc.encode_ordinary(overlap)) <= 20
+
+
+def test_multibyte_characters_are_not_split():
+    text = "これは日本語の文章です。" * 40
+    splitter = TikTokenSplitter(chunk_size=30, chunk_overlap=5)
+    chunks = splitter.split_text(text)
+
+    assert len(chunks) > 1
+    assert all("�" not in chunk for chunk in chunks)
+
+
+def test_split_documents_keeps_metadata_per_document():
+    splitter = TikTokenSplitter(chunk_size=40, chunk_overlap=0)
+    docs = splitter.split_documents(
+        [
+            Document(page_content=_paragraphs(3), metadata={"page": 1}),
+            Document(page_content="   ", metadata={"page": 2}),
+            Document(page_content="Last page.", metadata={"page": 3}),
+        ]
+    )
+
+    pages = [doc.metadata["page"] for doc in docs]
+    assert pages == sorted(pages)
+    assert 2 not in pages
+    assert docs[-1].page_content == "Last page."
+
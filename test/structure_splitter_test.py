@@ -0,0 +1,113 @@
+from core.ai_core.processor.splitter import (
+    SplitterConfig,
+    SplitterMode,
+    TikTokenSplitter,
+    build_splitter,
+)
+from core.ai_core.processor.structure_splitter import MarkdownStructureSplitter
+
+
+def _table(rows: int) -> str:
+    lines = ["| Name | Value |", "| --- | --- |"]
+    lines += [f"| item {i} | value {i} |" for i in range(rows)]
+    return "\n".join(lines)
+
+
+def test_chunks_carry_heading_path():
+    text = "\n\n".join(
+        [
+            "# Guide",
+            "Introduction text.",
+            "## Install",
+            "Run the installer and follow the steps.",
+            "## Usage",
+            "Open the app and sign in.",
+        ]
+    )
+    splitter = MarkdownStructureSplitter(chunk_size=400, chunk_overlap=0, min_section_tokens=0)
+    docs = splitter.create_documents([text], [{"source": "guide.md"}])
+
+    assert [doc.metadata["heading_path"] for doc in docs] == [
+        "Guide",
+        "Guide > Install",
+        "Guide > Usage",
+    ]
+    assert all(doc.metadata["source"] == "guide.md" for doc in docs)
+    # 見出しは本文と同じチャンクに入る
+    assert docs[1].page_content.startswith("## Install\n\nRun the installer")
+
+
+def test_heading_levels_replace_siblings():
+    text = "# A\n\nbody a\n\n## B\n\nbody b\n\n### C\n\nbody c\n\n## D\n\nbody d"
+    splitter = MarkdownStructureSplitter(chunk_size=400, chunk_overlap=0, min_section_tokens=0)
+    paths = [doc.metadata["heading_path"] for doc in splitter.create_documents([text])]
+
+    assert paths == ["A", "A > B", "A > B > C", "A > D"]
+
+
+def test_small_sections_are_merged_with_the_next_one():
+    text = "# A\n\nshort\n\n# B\n\nalso short"
+    splitter = MarkdownStructureSplitter(chunk_size=400, chunk_overlap=0, min_section_tokens=100)
+    docs = splitter.create_documents([text])
+
+    assert len(docs) == 1
+    # 共通の見出しがないため heading_path は空になる
+    assert docs[0].metadata["heading_path"] == ""
+
+
+def test_table_is_kept_whole_when_it_fits():
+    table = _table(3)
+    text = f"# Data\n\n{table}\n\nAfter the table."
+    splitter = MarkdownStructureSplitter(chunk_size=400, chunk_overlap=0)
+    docs = splitter.create_documents([text])
+
+    assert len(docs) == 1
+    assert table in docs[0].page_content
+
+
+def test_large_table_is_split_by_rows_with_header():
+    table = _table(60)
+    splitter = MarkdownStructureSplitter(chunk_size=120, chunk_overlap=50)
+    docs = splitter.create_documents([f"# Data\n\n{table}"])
+
+    assert len(docs) > 1
+    rows = []
+    for doc in docs:
+        assert doc.metadata["heading_path"] == "Data"
+        assert doc.metadata["chunk_size"] <= 120
+        lines = doc.page_content.split("\n")
+        start = lines.index("| Name | Value |")
+        assert lines[start + 1] == "| --- | --- |"
+        rows += lines[start + 2 :]
+    # 行は途中で分割されず、表は重複として引き継がれない
+    assert rows == table.split("\n")[2:]
+
+
+def test_code_block_is_not_parsed_as_headings():
+    text = "# Script\n\n```\n# not a heading\n| not | a table |\n```"
+    splitter = MarkdownStructureSplitter(chunk_size=400, chunk_overlap=0)
+    docs = splitter.create_documents([text])
+
+    assert len(docs) == 1
+    assert docs[0].metadata["heading_path"] == "Script"
+    assert "# not a heading" in docs[0].page_content
+
+
+def test_oversized_paragraph_falls_back_to_token_splitting():
+    paragraph = " ".join(f"Sentence number {i} of a long paragraph." for i in range(80))
+    splitter = MarkdownStructureSplitter(chunk_size=60, chunk_overlap=0)
+    docs = splitter.create_documents([f"# Long\n\n{paragraph}"])
+
+    assert len(docs) > 1
+    assert all(doc.metadata["chunk_size"] <= 60 for doc in docs)
+    assert all(doc.metadata["heading_path"] == "Long" for doc in docs)
+
+
+def test_build_splitter_uses_mode():
+    token = build_splitter(SplitterConfig(chunk_size=50, chunk_overlap=0))
+    structure = build_splitter(
+        SplitterConfig(chunk_size=50, chunk_overlap=0, mode=SplitterMode.structure)
+    )
+
+    assert isinstance(token, TikTokenSplitter)
+    assert isinstance(structure, MarkdownStructureSplitter)